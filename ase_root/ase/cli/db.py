@@ -49,6 +49,16 @@ class CLICommand:
             help='Long description of selected row')
         add('-i', '--insert-into', metavar='db-name',
             help='Insert selected rows into another database.')
+        add('--export', metavar='filename',
+            help='Write selected rows to one file: .xyz (extended XYZ), '
+            '.jsonl (ASE JSON-lines database) or .zip (CIF files).  Rows '
+            'are streamed, so memory use does not grow with the number '
+            'of rows.  No limit unless --limit is given.')
+        add('--bulk', action='store_true',
+            help='Use with --insert-into to build a large SQLite file '
+            'fast: indices are created at the end.  If interrupted, run '
+            'the same command again to continue (rows that were already '
+            'inserted are skipped).')
         add('-a', '--add-from-file', metavar='filename',
             help='Add configuration(s) from file.  '
             'If the file contains more than one configuration then you can '
@@ -89,10 +99,44 @@ class CLICommand:
             help='Write comma-separated-values file.')
         add('-w', '--open-web-browser', action='store_true',
             help='Open results in web-browser.')
+        add('--serve', action='store_true',
+            help='Use with -w: serve the database read-only with a '
+            'production WSGI server (gunicorn if installed) instead of '
+            'Flask\'s development server.')
+        add('--port', type=int, default=5000,
+            help='Port for the web server.  Default is 5000.')
+        add('--workers', type=int, default=1, metavar='N',
+            help='Number of worker processes when using --serve.')
+        add('--threads', type=int, default=8, metavar='N',
+            help='Number of threads per worker when using --serve.  '
+            'Default is 8.')
+        add('--sessions', metavar='FILE',
+            help='SQLite file for web sessions shared by all workers when '
+            'using --serve.  Default is a temporary file if --workers > 1, '
+            'otherwise sessions are kept in memory.')
         add('--no-lock-file', action='store_true', help="Don't use lock-files")
         add('--analyse', action='store_true',
             help='Gathers statistics about tables and indices to help make '
             'better query planning choices.')
+        add('--upgrade', action='store_true',
+            help='Bring an older SQLite file up to date (new indices and '
+            'the key catalogue).  '
+            'Otherwise this is done the first time the file is written '
+            'to; reading never changes the file.')
+        add('--compact', action='store_true',
+            help='Rebuild an SQLite file without the space left by deleted '
+            'rows.  Files are also switched to incremental auto-vacuum, '
+            'so that later deletions give back space right away.  '
+            'For a .jsonl file, old versions of rows and deleted rows '
+            'are removed.')
+        add('--materialize-keys', metavar='key1,key2,...',
+            help='Add indexed columns for the given keys to an SQLite '
+            'file (existing rows are filled in).  Filtering and sorting '
+            'on those keys becomes much faster.')
+        add('--index-fingerprints', action='store_true',
+            help='Compute and store structure fingerprints of rows that do '
+            'not have them yet (SQLite files).  Makes the first '
+            '"similar_to=<id>" query fast.')
         add('-j', '--json', action='store_true',
             help='Write json representation of selected row.')
         add('-m', '--show-metadata', action='store_true',
@@ -104,7 +148,8 @@ class CLICommand:
         add('--progress-bar', action='store_true',
             help='Show a progress bar when using --insert-into.')
         add('--show-keys', action='store_true',
-            help='Show all keys.')
+            help='Show all keys with the number of rows, type and range '
+            'of values.')
         add('--show-values', metavar='key1,key2,...',
             help='Show values for key(s).')
 
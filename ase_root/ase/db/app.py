@@ -22,16 +22,61 @@ or this::
 
     $ python3 -m ase.db.app abc.db
 
+For production, use a real WSGI server with several workers.  The
+create_app() factory opens the database files read-only and returns the
+WSGI application::
+
+    $ gunicorn --workers 1 --threads 8 \\
+          "ase.db.app:create_app('abc.db')"
+
+With more than one worker process, the sessions of the search pages must
+be stored in a file that all workers share::
+
+    $ ASE_DB_SESSIONS=/tmp/sessions.sqlite gunicorn --workers 4 \\
+          "ase.db.app:create_app('abc.db')"
+
+or let ASE start the server (gunicorn if installed, otherwise werkzeug's
+threaded server)::
+
+    $ ase db abc.db -w --serve --workers 4 --threads 8
+
+Static files and pages are sent with cache headers and ETags (see
+ase.db.httpcache).  Compressed copies of the static files are made when
+first requested or in advance with::
+
+    $ python -m ase.db.httpcache
+
+All rows of a query can be downloaded as one file from
+/export/<project>?query=...&format=xyz (or jsonl or cif for a zip file
+of CIF files).  The ASE_DB_MAX_EXPORT_ROWS environment variable sets the
+largest number of rows per download (default: 10000).
+
+Set ASE_DB_METRICS=1 to get timings of requests and SQL queries in
+Prometheus' format from /metrics (see ase.db.metrics).
+
 """
 
 import io
+import json
+import os
 import sys
+import tempfile
 from pathlib import Path
 
-from ase.db import connect
+from ase.db import connect, metrics
+from ase.db.cache import CachedDatabase
 from ase.db.core import Database
+from ase.db.export import export, formats
+from ase.db.httpcache import StaticFiles, is_fresh, page_etag, with_etag
 from ase.db.project import DatabaseProject
-from ase.db.web import Session
+from ase.db.web import (
+    API_VERSION,
+    MAX_API_LIMIT,
+    Session,
+    SQLiteSessionStore,
+    rows_json,
+    similarity_order,
+)
 
 
 class DBApp:
@@ -52,8 +97,10 @@ class DBApp:
             return flask.view_functions['search'](projectname)
 
     def add_project(self, name: str, db: Database) -> None:
+        # Counts and sorted ids of queries are cached until the file
+        # changes, so that paging only reads the rows shown:
         self.projects[name] = DatabaseProject.load_db_as_ase_project(
-            name=name, database=db)
+            name=name, database=CachedDatabase(db))
 
     @classmethod
     def run_db(cls, db):
@@ -61,10 +108,118 @@ class DBApp:
         app.add_project('default', db)
         app.flask.run(host='0.0.0.0', debug=True)
 
+    @classmethod
+    def serve_db(cls, db, host='0.0.0.0', port=5000,
+                 workers=1, threads=8, sessions=None):
+        """Serve database with a production WSGI server.
+
+        sessions: str or Path
+            File for storing sessions.  Needed when workers > 1.  Default
+            is a new file in the temporary directory in that case.
+        """
+        if sessions is None and workers > 1:
+            sessions = (Path(tempfile.gettempdir()) /
+                        f'ase-db-sessions-{os.getpid()}.sqlite')
+        if sessions is not None:
+            use_session_file(sessions)
+        app = cls()
+        app.add_project('default', db)
+        serve(app.flask, host, port, workers, threads)
+
+
+def use_session_file(filename):
+    """Store sessions in a file shared by all worker processes."""
+    Session.store = SQLiteSessionStore(filename)
+
+
+def connect_readonly(name, immutable=True, pool_size=8):
+    """Open database for serving.
+
+    SQLite files are opened read-only with a pool of connections that are
+    reused across requests.  Other database types are opened normally.
+    """
+    if isinstance(name, (str, Path)) and str(name).endswith('.db'):
+        return connect(name, readonly=True, immutable=immutable,
+                       pool_size=pool_size, use_lock_file=False)
+    return connect(name)
+
+
+def create_app(*filenames, immutable=True, pool_size=8, sessions=None,
+               max_export_rows=None):
+    """Create WSGI application for one or more database files.
+
+    Each file becomes a project named after the file (without extension);
+    the first one is shown on the front page.  Meant to be used with a
+    WSGI server::
+
+        $ gunicorn "ase.db.app:create_app('abc.db')"
+
+    If no filenames are given, the ASE_DB_FILES environment variable is
+    used (a colon-separated list of filenames).  Sessions are stored in
+    the file given by *sessions* or the ASE_DB_SESSIONS environment
+    variable; if neither is set they are kept in memory, which only
+    works with a single worker process.
+
+    At most *max_export_rows* rows (default: the ASE_DB_MAX_EXPORT_ROWS
+    environment variable or 10000) can be downloaded from /export/ in
+    one request.
+    """
+    if not filenames:
+        filenames = tuple(os.environ['ASE_DB_FILES'].split(os.pathsep))
+    sessions = sessions or os.environ.get('ASE_DB_SESSIONS')
+    if sessions:
+        use_session_file(sessions)
+    app = DBApp()
+    if max_export_rows is not None:
+        app.flask.config['MAX_EXPORT_ROWS'] = max_export_rows
+    for filename in filenames:
+        db = connect_readonly(filename, immutable, pool_size)
+        app.add_project(Path(filename).stem, db)
+    return app.flask
+
+
+def serve(wsgiapp, host='0.0.0.0', port=5000, workers=1, threads=8):
+    """Run WSGI application with gunicorn (or werkzeug if not installed).
+
+    gunicorn will use *workers* processes each with *threads* threads.
+    werkzeug can only do one of the two: several processes or one
+    threaded process.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        from werkzeug.serving import run_simple
+        run_simple(host, port, wsgiapp,
+                   threaded=workers == 1,
+                   processes=workers)
+        return
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+
+        def load(self):
+            return wsgiapp
+
+    Application().run()
+
 
 def new_app(projects):
     from flask import Flask, render_template, request
-    app = Flask(__name__, template_folder=str(DBApp.root))
+    app = Flask(__name__, template_folder=str(DBApp.root),
+                static_folder=None)
+
+    # Largest number of rows that can be exported in one request:
+    app.config['MAX_EXPORT_ROWS'] = int(
+        os.environ.get('ASE_DB_MAX_EXPORT_ROWS', 10_000))
+
+    # Static files with content hashes in their URLs, compressed copies
+    # and cache headers (see ase.db.httpcache):
+    static = StaticFiles(Path(__file__).parent / 'static')
+    app.url_defaults(static.url_defaults)
+    app.add_url_rule('/static/<path:filename>', 'static', static.response)
 
     @app.route('/<project_name>')
     @app.route('/<project_name>/')
@@ -97,33 +252,83 @@ def new_app(projects):
         session = Session.get(sid)
         project = projects[session.project_name]
         session.update(what, x, request.args, project)
+        etag = page_etag(project.database, sid, session.project_name,
+                         session.columns, session.sort, session.query,
+                         session.page, session.limit)
+        if is_fresh(etag):
+            session.save()
+            return with_etag('', etag)
         table = session.create_table(project.database,
                                      project.uid_key,
                                      keys=list(project.key_descriptions))
-        return render_template(str(project.get_table_template()),
-                               table=table,
-                               project=project,
-                               session=session)
+        session.save()
+        return with_etag(render_template(str(project.get_table_template()),
+                                         table=table,
+                                         project=project,
+                                         session=session),
+                         etag)
+
+    @app.route('/api/v1/<project_name>/rows')
+    @app.route('/api/<project_name>/rows')
+    def api_rows(project_name: str):
+        """Page of rows as column-oriented JSON for static/search.js.
+
+        Request args: query (and other inputs of the search form),
+        columns (comma-separated), sort, limit, and offset or the cursor
+        returned with the previous page.
+        """
+        project = projects[project_name]
+        args = request.args
+        query = project.handle_query(args) if 'query' in args else ''
+        columns = (args['columns'].split(',') if args.get('columns')
+                   else list(project.default_columns))
+        sort = args.get('sort') or 'id'
+        limit = max(1, min(args.get('limit', 25, type=int), MAX_API_LIMIT))
+        offset = args.get('offset', 0, type=int)
+        cursor = args.get('cursor')
+        etag = page_etag(project.database, 'api', project_name,
+                         sorted(args.items(multi=True)))
+        if is_fresh(etag):
+            return with_etag('', etag)
+        try:
+            dct = rows_json(project.database, project.uid_key, query,
+                            columns, sort, limit, offset, cursor)
+        except (ValueError, KeyError) as e:
+            error = ', '.join(['Bad query'] + [str(arg) for arg in e.args])
+            return {'version': API_VERSION, 'error': error}, 400
+        response = with_etag(json.dumps(dct, separators=(',', ':')), etag)
+        response.mimetype = 'application/json'
+        return response
 
     @app.route('/<project_name>/row/<uid>')
     def row(project_name: str, uid: str):
         """Show details for one database row."""
         project = projects[project_name]
         row = project.uid_to_row(uid)
+        etag = page_etag(project.database, project_name, uid, row.id,
+                         row.mtime)
+        if is_fresh(etag):
+            return with_etag('', etag)
         dct = project.row_to_dict(row)
-        return render_template(str(project.get_row_template()),
-                               dct=dct, row=row, project=project, uid=uid)
+        return with_etag(render_template(str(project.get_row_template()),
+                                         dct=dct, row=row, project=project,
+                                         uid=uid),
+                         etag)
 
     @app.route('/atoms/<project_name>/<int:id>/<type>')
     def atoms(project_name: str, id: int, type: str):
         """Return atomic structure as cif, xyz or json."""
         row = projects[project_name].database.get(id=id)
+        etag = page_etag(projects[project_name].database, project_name,
+                         id, type, row.mtime)
+        if is_fresh(etag):
+            return with_etag('', etag)
         a = row.toatoms()
         if type == 'cif':
             b = io.BytesIO()
             a.pbc = True
             a.write(b, 'cif', wrap=False)
-            return b.getvalue(), 200, []
+            return with_etag(b.getvalue(), etag)
 
         fd = io.StringIO()
         if type == 'xyz':
@@ -140,7 +345,47 @@ def new_app(projects):
                     'attachment; filename="{project_name}-{id}.{type}"'
                     .format(project_name=project_name, id=id, type=type))]
         txt = fd.getvalue()
-        return txt, 200, headers
+        response = with_etag(txt, etag)
+        response.headers.extend(headers)
+        return response
+
+    @app.route('/export/<project_name>')
+    def export_rows(project_name: str):
+        """Return all rows of a query as one xyz, jsonl or zip (cif) file.
+
+        The file is streamed while the rows are read.  Request args:
+        query, format (default xyz), sort (default id) and limit.
+        """
+        project = projects[project_name]
+        db = project.database
+        format = request.args.get('format', 'xyz')
+        if format not in formats:
+            return (f'Unknown format: {format}.  '
+                    f'Use one of {", ".join(formats)}\n', 400, [])
+        query = (project.handle_query(request.args)
+                 if 'query' in request.args else '')
+        _, sort = similarity_order(query, [],
+                                   request.args.get('sort', 'id'))
+        limit = request.args.get('limit', type=int)
+        try:
+            n = db.count(query)
+        except (ValueError, KeyError) as e:
+            error = ', '.join(['Bad query'] + [str(arg) for arg in e.args])
+            return error + '\n', 400, []
+        if limit:
+            n = min(n, limit)
+        maxrows = app.config['MAX_EXPORT_ROWS']
+        if n > maxrows:
+            return (f'Too many rows: {n}.  At most {maxrows} rows can be '
+                    'exported.  Use a narrower query or limit=N.\n',
+                    413, [])
+        rows = db.select(query, sort=sort, limit=n,
+                         batch_size=1000) if n else []
+        ext, mimetype = formats[format]
+        headers = [('Content-Disposition',
+                    f'attachment; filename="{project_name}.{ext}"')]
+        return app.response_class(export(rows, format, project_name),
+                                  mimetype=mimetype, headers=headers)
 
     @app.route('/gui/<int:id>')
     def gui(id: int):
@@ -169,6 +414,11 @@ def new_app(projects):
                 'Disallow: /\n',
                 200)
 
+    # Timings of requests, templates and SQL queries (see ase.db.metrics):
+    recorder = metrics.enable_from_environment()
+    if recorder is not None:
+        metrics.instrument(app, projects, recorder)
+
     return app
 
 
@@ -0,0 +1,204 @@
+"""Cache for query results.
+
+For read-only catalogues, the same queries are run over and over again
+(one count for the number of rows and one select for every page, sort
+or column toggle).  A CachedDatabase remembers the number of rows and
+the sorted list of ids for each (query, sort) combination, so that
+showing a page only needs to read the rows on that page::
+
+    db = CachedDatabase(connect('abc.db'))
+    n = db.count('H>0')  # runs COUNT(*)
+    rows = list(db.select('H>0', sort='energy', limit=25, offset=100))
+    rows = list(db.select('H>0', sort='energy', limit=25, offset=125))
+
+The second select() call reads only 25 rows by their id.  All cached
+results are dropped when the database file is modified or replaced.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+from ase.db.core import normalize_sort, parse_selection
+from ase.db.similarity import split_similar_to
+
+
+def normalize_selection(keys, cmps) -> Tuple:
+    """Hashable representation of the output of parse_selection()."""
+    return (tuple(sorted(keys)),
+            tuple(sorted((tuple(cmp) for cmp in cmps), key=repr)))
+
+
+def database_version(db) -> Optional[Tuple]:
+    """Token that changes when the database file changes.
+
+    Returns None for databases that are not files (no caching)."""
+    shards = getattr(db, 'shards', None)
+    if shards is not None:
+        versions = tuple(database_version(shard) for shard in shards)
+        return None if None in versions else versions
+    filename = getattr(db, 'filename', None)
+    if not isinstance(filename, str):
+        return None
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (filename, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def is_similarity_query(selection, kwargs) -> bool:
+    keys, cmps = parse_selection(selection, **kwargs)
+    return split_similar_to(cmps)[0] is not None
+
+
+class QueryCache:
+    """LRU cache of query results.
+
+    maxsize: int
+        Maximum number of cached results.
+    maxids: int
+        Maximum total number of cached row ids.
+    """
+
+    def __init__(self, maxsize: int = 1000, maxids: int = 10_000_000):
+        self.maxsize = maxsize
+        self.maxids = maxids
+        self._results: OrderedDict = OrderedDict()
+        self._nids = 0
+        self._version: Optional[Tuple] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._nids = 0
+
+    def check(self, version: Optional[Tuple]) -> None:
+        """Drop everything if database version has changed."""
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def get(self, key: Hashable) -> Any:
+        """Return cached value or None."""
+        with self._lock:
+            value = self._results.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = len(value) if isinstance(value, np.ndarray) else 0
+        if size > self.maxids:
+            return
+        with self._lock:
+            old = self._results.pop(key, None)
+            if isinstance(old, np.ndarray):
+                self._nids -= len(old)
+            self._results[key] = value
+            self._nids += size
+            while (len(self._results) > self.maxsize or
+                   self._nids > self.maxids):
+                _, old = self._results.popitem(last=False)
+                if isinstance(old, np.ndarray):
+                    self._nids -= len(old)
+
+
+class CachedDatabase:
+    """Database wrapper that caches counts and sorted ids of queries.
+
+    All other methods and attributes are passed on to the wrapped
+    database.
+    """
+
+    def __init__(self, db, cache: Optional[QueryCache] = None):
+        self.db = db
+        self.cache = cache or QueryCache()
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __len__(self):
+        return self.count()
+
+    def _check(self) -> bool:
+        version = database_version(self.db)
+        self.cache.check(version)
+        return version is not None
+
+    def count(self, selection=None, **kwargs) -> int:
+        if not self._check():
+            return self.db.count(selection, **kwargs)
+        keys, cmps = parse_selection(selection, **kwargs)
+        selkey = normalize_selection(keys, cmps)
+        n = self.cache.get(('count', selkey))
+        if n is None:
+            n = self.db.count(selection, **kwargs)
+            self.cache.put(('count', selkey), n)
+        return n
+
+    def ids(self, selection=None, sort=None, **kwargs) -> np.ndarray:
+        """Sorted ids of selected rows."""
+        keys, cmps = parse_selection(selection, **kwargs)
+        key = ('ids', normalize_selection(keys, cmps), sort or None)
+        ids = self.cache.get(key)
+        if ids is None:
+            ids = np.array(self.db._select_ids(keys, cmps, sort=sort),
+                           dtype=np.int64)
+            self.cache.put(key, ids)
+            self.cache.put(('count', key[1]), len(ids))
+        return ids
+
+    def select(self, selection=None, filter=None, explain=False,
+               verbosity=1, limit=None, offset=0, sort=None,
+               include_data=True, columns='all', after=None,
+               batch_size=None, data_keys=None, **kwargs):
+        if (filter is not None or explain or not self._check() or
+                is_similarity_query(selection, kwargs)):
+            # (similarity queries use the in-memory index of the database)
+            yield from self.db.select(selection, filter=filter,
+                                      explain=explain, verbosity=verbosity,
+                                      limit=limit, offset=offset, sort=sort,
+                                      include_data=include_data,
+                                      columns=columns, after=after,
+                                      batch_size=batch_size,
+                                      data_keys=data_keys, **kwargs)
+            return
+
+        sort = normalize_sort(sort)
+        ids = self.ids(selection, sort, **kwargs)
+        if after is not None:
+            # Continue after the row with the cursor's id:
+            (pos,) = np.nonzero(ids == after[1])
+            if len(pos) == 0:
+                yield from self.db.select(selection, limit=limit,
+                                          offset=offset, sort=sort,
+                                          include_data=include_data,
+                                          columns=columns, after=after,
+                                          batch_size=batch_size,
+                                          data_keys=data_keys, **kwargs)
+                return
+            ids = ids[pos[0] + 1:]
+        if limit:
+            ids = ids[offset:offset + limit]
+        else:
+            ids = ids[offset:]
+        rows = self.db._get_rows(ids.tolist(),
+                                 include_data=(include_data and
+                                               data_keys is None),
+                                 columns=columns)
+        if include_data and data_keys is not None:
+            # The cached ids do not depend on data_keys:
+            rows = self.db._add_data(rows, list(data_keys))
+        yield from rows
@@ -1,30 +1,47 @@
 # fmt: off
 
+import copy
 import json
 import sys
-from collections import defaultdict
+from collections import Counter
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Iterable, Iterator
 
+import numpy as np
+
 import ase.io
+from ase.cli.main import CLIError
 from ase.db import connect
-from ase.db.core import convert_str_to_int_float_bool_or_str
+from ase.db.core import (
+    convert_str_to_int_float_bool_or_str,
+    key_catalogue,
+    key_stats,
+)
 from ase.db.row import row2dct
 from ase.db.table import Table, all_columns
 from ase.utils import plural
 
 
 def count_keys(db, query):
-    keys = defaultdict(int)
-    for row in db.select(query):
-        for key in row._keys:
-            keys[key] += 1
+    if query:
+        keys = key_catalogue(key_stats(db.select(query, include_data=False)))
+    else:
+        # Read from the key catalogue of SQLite files:
+        keys = db.get_key_catalogue()
+    if not keys:
+        return
 
     n = max(len(key) for key in keys) + 1
-    for key, number in keys.items():
-        print('{:{}} {}'.format(key + ':', n, number))
-    return
+    m = len(str(max(stats['count'] for stats in keys.values())))
+    for key, stats in keys.items():
+        values = [int(value)
+                  if isinstance(value, float) and value.is_integer()
+                  else value
+                  for value in [stats['min'], stats['max']]]
+        print('{:{}} {:{}} {:6} [{}..{}]'
+              .format(key + ':', n, stats['count'], m, stats['type'],
+                      *values))
 
 
 def main(args):
@@ -60,34 +77,45 @@ def main(args):
         db.analyse()
         return
 
+    if args.upgrade:
+        db.upgrade()
+        out(f'{args.database} is up to date (version {db.version})')
+        return
+
+    if args.compact:
+        db.vacuum()
+        return
+
+    if args.materialize_keys:
+        added = db.materialize_keys(args.materialize_keys.split(','))
+        for key, type in added.items():
+            out(f'Added {type} column for {key}')
+        return
+
+    if args.index_fingerprints:
+        n = len(db.similarity_index())
+        out(f'Fingerprints for {plural(n, "row")}')
+        return
+
     if args.show_keys:
         count_keys(db, query)
         return
 
     if args.show_values:
         keys = args.show_values.split(',')
-        values = {key: defaultdict(int) for key in keys}
-        numbers = set()
-        for row in db.select(query):
-            kvp = row.key_value_pairs
-            for key in keys:
-                value = kvp.get(key)
-                if value is not None:
-                    values[key][value] += 1
-                    if not isinstance(value, str):
-                        numbers.add(key)
-
+        columns = db.select_columns(keys, query)
         n = max(len(key) for key in keys) + 1
         for key in keys:
-            vals = values[key]
-            if key in numbers:
+            values = columns[key].compressed()
+            if values.dtype != object and len(values) > 0:
                 print('{:{}} [{}..{}]'
-                      .format(key + ':', n, min(vals), max(vals)))
+                      .format(key + ':', n, values.min(), values.max()))
             else:
+                counts = Counter(values.tolist())
                 print('{:{}} {}'
                       .format(key + ':', n,
                               ', '.join(f'{v}({n})'
-                                        for v, n in vals.items())))
+                                        for v, n in counts.items())))
         return
 
     if args.add_from_file:
@@ -95,8 +123,7 @@ def main(args):
         configs = ase.io.read(filename)
         if not isinstance(configs, list):
             configs = [configs]
-        for atoms in configs:
-            db.write(atoms, key_value_pairs=add_key_value_pairs)
+        db.write_many(configs, key_value_pairs=add_key_value_pairs)
         out('Added ' + plural(len(configs), 'row'))
         return
 
@@ -106,6 +133,8 @@ def main(args):
         return
 
     if args.insert_into:
+        if args.bulk and Path(args.insert_into).suffix != '.db':
+            raise CLIError('--bulk only works for SQLite (.db) files')
         if args.limit == -1:
             args.limit = 0
 
@@ -123,25 +152,51 @@ def main(args):
             else:
                 length = db.count(query)
 
+        # Stream the rows from SQL databases unless we are writing to
+        # the same file:
+        batch_size = None
+        if (getattr(db, 'type', None) in ['db', 'postgresql', 'mysql'] and
+                Path(args.insert_into).resolve() !=
+                Path(args.database).resolve()):
+            batch_size = 1000
+
         nkvp = 0
         nrows = 0
+        skip = set()
+
+        def images(rows):
+            nonlocal nkvp, nrows
+            for row in rows:
+                if row.unique_id in skip:
+                    continue
+                kvp = row.get('key_value_pairs', {})
+                nkvp -= len(kvp)
+                kvp.update(add_key_value_pairs)
+                nkvp += len(kvp)
+                if args.strip_data:
+                    # Keep the unique_id so that --bulk can resume:
+                    row = copy.copy(row)
+                    row._data = {}
+                yield row, kvp
+                nrows += 1
+
+        kwargs = {'bulk': True} if args.bulk else {}
         with connect(args.insert_into,
-                     use_lock_file=not args.no_lock_file) as db2:
+                     use_lock_file=not args.no_lock_file, **kwargs) as db2:
+            if args.bulk:
+                # Continue an interrupted import:
+                skip = {row.unique_id
+                        for row in db2.select(columns=['id', 'unique_id'],
+                                              include_data=False)}
             with progressbar(db.select(query,
                                        sort=args.sort,
                                        limit=args.limit,
-                                       offset=args.offset),
+                                       offset=args.offset,
+                                       batch_size=batch_size),
                              length=length) as rows:
-                for row in rows:
-                    kvp = row.get('key_value_pairs', {})
-                    nkvp -= len(kvp)
-                    kvp.update(add_key_value_pairs)
-                    nkvp += len(kvp)
-                    if args.strip_data:
-                        db2.write(row.toatoms(), **kvp)
-                    else:
-                        db2.write(row, data=row.get('data'), **kvp)
-                    nrows += 1
+                db2.write_many(images(rows))
+        if args.bulk:
+            db2.end_bulk_load()
 
         out('Added %s (%s updated)' %
             (plural(nkvp, 'key-value pair'),
@@ -149,6 +204,10 @@ def main(args):
         out(f'Inserted {plural(nrows, "row")}')
         return
 
+    if args.export:
+        export_rows(db, query, args)
+        return
+
     if args.limit == -1:
         args.limit = 20
 
@@ -169,18 +228,12 @@ def main(args):
         return
 
     if add_key_value_pairs or delete_keys:
-        ids = [row['id'] for row in db.select(query)]
-        M = 0
-        N = 0
-        with db:
-            for id in ids:
-                m, n = db.update(id, delete_keys=delete_keys,
-                                 **add_key_value_pairs)
-                M += m
-                N += n
+        nrows = db.count(query)
+        M, N = db.update_many(query, delete_keys=delete_keys,
+                              **add_key_value_pairs)
         out('Added %s (%s updated)' %
             (plural(M, 'key-value pair'),
-             plural(len(add_key_value_pairs) * len(ids) - M, 'pair')))
+             plural(len(add_key_value_pairs) * nrows - M, 'pair')))
         out('Removed', plural(N, 'key-value pair'))
 
         return
@@ -203,27 +256,26 @@ def main(args):
             tags = []
             keys = args.plot
         keys = keys.split(',')
-        plots = defaultdict(list)
+        columns = db.select_columns(tags + keys, query, sort=args.sort)
+        x = columns[keys[0]]
+        selected = ~np.ma.getmaskarray(x)
+        x = x.data
         X = {}
-        labels = []
-        for row in db.select(query, sort=args.sort, include_data=False):
-            name = ','.join(str(row[tag]) for tag in tags)
-            x = row.get(keys[0])
-            if x is not None:
-                if isinstance(x, str):
-                    if x not in X:
-                        X[x] = len(X)
-                        labels.append(x)
-                    x = X[x]
-                plots[name].append([x] + [row.get(key) for key in keys[1:]])
+        if x.dtype == object:
+            # Strings are plotted at 0, 1, 2, ... and used as labels:
+            x = x.copy()
+            for i in np.nonzero(selected)[0]:
+                if isinstance(x[i], str):
+                    x[i] = X.setdefault(x[i], len(X))
+        names = np.array([','.join(str(columns[tag][i]) for tag in tags)
+                          for i in range(len(x))], dtype=object)
         import matplotlib.pyplot as plt
-        for name, plot in plots.items():
-            xyy = list(zip(*plot))
-            x = xyy[0]
-            for y, key in zip(xyy[1:], keys[1:]):
-                plt.plot(x, y, label=name + ':' + key)
+        for name in dict.fromkeys(names[selected]):
+            rows = selected & (names == name)
+            for key in keys[1:]:
+                plt.plot(x[rows], columns[key][rows], label=name + ':' + key)
         if X:
-            plt.xticks(range(len(labels)), labels, rotation=90)
+            plt.xticks(range(len(X)), list(X), rotation=90)
         plt.legend()
         plt.show()
         return
@@ -248,7 +300,13 @@ def main(args):
             return
         check_jsmol()
         import ase.db.app as app
-        app.DBApp().run_db(db)
+        if args.serve:
+            db = app.connect_readonly(args.database)
+            app.DBApp.serve_db(db, port=args.port,
+                               workers=args.workers, threads=args.threads,
+                               sessions=args.sessions)
+        else:
+            app.DBApp().run_db(db)
         return
 
     columns = list(all_columns)
@@ -283,6 +341,29 @@ def main(args):
         table.write(query)
 
 
+def export_rows(db, query, args):
+    from ase.db.export import export, export_format
+    format = export_format(args.export)
+    batch_size = 1000 if getattr(db, 'type', None) in ['db', 'postgresql',
+                                                       'mysql'] else None
+    rows = db.select(query, sort=args.sort,
+                     limit=max(args.limit, 0), offset=args.offset,
+                     batch_size=batch_size)
+    nrows = 0
+
+    def counted(rows):
+        nonlocal nrows
+        for row in rows:
+            nrows += 1
+            yield row
+
+    with open(args.export, 'wb') as fd:
+        for chunk in export(counted(rows), format, Path(args.export).stem):
+            fd.write(chunk)
+    if not args.quiet:
+        print(f'Exported {plural(nrows, "row")} to {args.export}')
+
+
 def row2str(row) -> str:
     t = row2dct(row, key_descriptions={})
     S = [t['formula'] + ':',
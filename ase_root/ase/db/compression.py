@@ -0,0 +1,110 @@
+"""Compressed blobs for SQLite files.
+
+A codec is a string of filters separated by "+", optionally ending with
+a compressor from the standard library:
+
+float32:
+    Store float64 arrays as float32 (lossy, but fine for forces and
+    momenta).
+shuffle:
+    Group the bytes of the array elements by significance before
+    compressing.  This makes float arrays compress much better.
+zlib, lzma:
+    Compressor.
+
+Examples: 'zlib', 'shuffle+lzma' and 'float32+shuffle+zlib'.
+
+The codecs of a file are chosen when it is created and kept in the
+information table.  All blobs of such a file start with a two byte header
+(flags and item size), so they can be decoded without knowing the codec.
+"""
+import json
+import lzma
+import zlib
+
+import numpy as np
+
+compressors = [None, 'zlib', 'lzma']
+compress_functions = {'zlib': zlib.compress, 'lzma': lzma.compress}
+decompress_functions = {'zlib': zlib.decompress, 'lzma': lzma.decompress}
+
+SHUFFLE = 16
+FLOAT32 = 32
+
+# Columns of the systems table with arrays:
+array_columns = ['numbers', 'positions', 'cell', 'initial_magmoms',
+                 'initial_charges', 'masses', 'tags', 'momenta', 'forces',
+                 'stress', 'dipole', 'magmoms', 'charges']
+
+
+def parse_codec(codec):
+    """Convert codec string to flags."""
+    if not codec:
+        return 0
+    *filters, last = codec.split('+')
+    if last in compressors:
+        flags = compressors.index(last)
+    else:
+        flags = 0
+        filters.append(last)
+    for name in filters:
+        if name == 'shuffle':
+            flags |= SHUFFLE
+        elif name == 'float32':
+            flags |= FLOAT32
+        else:
+            raise ValueError(f'Unknown codec: {codec!r}')
+    return flags
+
+
+def codec_flags(codecs):
+    """Flags for the array columns and the data column.
+
+    codecs: str or dict
+        Codec for all columns or dict mapping column names (or 'default'
+        for the rest) to codecs.
+    """
+    if isinstance(codecs, str):
+        codecs = {'default': codecs}
+    for column in codecs:
+        if column not in array_columns + ['data', 'default']:
+            raise ValueError(f'Unknown column: {column!r}')
+    default = codecs.get('default')
+    flags = {column: parse_codec(codecs.get(column, default))
+             for column in array_columns + ['data']}
+    # Data is bytes from object_to_bytes() and can only be compressed:
+    flags['data'] &= SHUFFLE - 1
+    return flags
+
+
+def normalize_codecs(codecs):
+    """JSON string for the information table."""
+    codec_flags(codecs)  # check
+    if isinstance(codecs, str):
+        codecs = {'default': codecs}
+    return json.dumps(codecs, sort_keys=True)
+
+
+def compress(buf, flags, itemsize=1):
+    """Add header to buffer and compress it."""
+    if flags & SHUFFLE and itemsize > 1:
+        buf = np.frombuffer(buf, np.uint8).reshape((-1, itemsize)).T.tobytes()
+    compressor = compressors[flags & (SHUFFLE - 1)]
+    if compressor:
+        buf = compress_functions[compressor](buf)
+    return bytes([flags, itemsize]) + bytes(buf)
+
+
+def decompress(buf):
+    """Undo compress().
+
+    Returns the bytes and whether they are float32 numbers that should be
+    converted back to float64."""
+    flags, itemsize = buf[0], buf[1]
+    buf = buf[2:]
+    compressor = compressors[flags & (SHUFFLE - 1)]
+    if compressor:
+        buf = decompress_functions[compressor](buf)
+    if flags & SHUFFLE and itemsize > 1:
+        buf = np.frombuffer(buf, np.uint8).reshape((itemsize, -1)).T.tobytes()
+    return bytes(buf), bool(flags & FLOAT32)
@@ -1,4 +1,6 @@
 import functools
+import glob
+import itertools
 import json
 import numbers
 import operator
@@ -6,6 +8,7 @@ import os
 import re
 import warnings
 from time import time
+from collections.abc import MutableMapping
 from typing import Any, Dict, List
 
 import numpy as np
@@ -13,7 +16,8 @@ import numpy as np
 from ase.atoms import Atoms
 from ase.calculators.calculator import all_changes, all_properties
 from ase.data import atomic_numbers
-from ase.db.row import AtomsRow
+from ase.db.row import AtomsRow, FancyDict
+from ase.db.similarity import split_similar_to
 from ase.formula import Formula
 from ase.io.jsonio import create_ase_object
 from ase.parallel import DummyMPI, parallel_function, parallel_generator, world
@@ -88,6 +92,9 @@ def get_key_descriptions():
             KD('magmom', 'Magnetic moment', unit='μ_B'),
             KD('unique_id', 'Unique ID', 'Random (unique) ID'),
             KD('volume', 'Volume', 'Volume of unit cell', unit='Å³'),
+            KD('similarity', 'Similarity',
+               'Similarity to the structure of row <id> in a '
+               'similar_to=<id> query'),
         ]
     }
 
@@ -157,6 +164,24 @@ reserved_keys = set(
 numeric_keys = {'id', 'energy', 'magmom', 'charge', 'natoms'}
 
 
+@functools.lru_cache(maxsize=1024)
+def check_key(key):
+    """Check key name (cached, as the same keys are used for many rows)."""
+    if not word.match(key) or key in reserved_keys:
+        raise ValueError(f'Bad key: {key}')
+    try:
+        Formula(key, strict=True)
+    except ValueError:
+        pass
+    else:
+        warnings.warn(
+            'It is best not to use keys ({0}) that are also a '
+            'chemical formula.  If you do a "db.select({0!r})",'
+            'you will not find rows with your key.  Instead, you wil get '
+            'rows containing the atoms in the formula!'.format(key)
+        )
+
+
 def check(key_value_pairs):
     for key, value in key_value_pairs.items():
         if key == 'external_tables':
@@ -164,19 +189,7 @@ def check(key_value_pairs):
             # performed
             continue
 
-        if not word.match(key) or key in reserved_keys:
-            raise ValueError(f'Bad key: {key}')
-        try:
-            Formula(key, strict=True)
-        except ValueError:
-            pass
-        else:
-            warnings.warn(
-                'It is best not to use keys ({0}) that are also a '
-                'chemical formula.  If you do a "db.select({0!r})",'
-                'you will not find rows with your key.  Instead, you wil get '
-                'rows containing the atoms in the formula!'.format(key)
-            )
+        check_key(key)
         if not isinstance(value, (numbers.Real, str, np.bool_)):
             raise ValueError(f'Bad value for {key!r}: {value}')
         if isinstance(value, str):
@@ -213,8 +226,12 @@ def connect(
     name: str
         Filename or address of database.
     type: str
-        One of 'json', 'db', 'postgresql', 'mysql', 'aselmdb'
-        (JSON, SQLite, PostgreSQL, MYSQL, ASELMDB).
+        One of 'json', 'jsonl', 'db', 'postgresql', 'mysql', 'aselmdb'
+        (JSON, append-only JSON-lines (see ase.db.jsonl), SQLite,
+        PostgreSQL, MYSQL, ASELMDB) or 'memory' (in-memory
+        query engine for the database given by name, see ase.db.memory).
+        A list of names (or databases) or a glob pattern like
+        'shards/*.db' gives a federated database (see ase.db.federated).
         Default is 'extract_from_name', which will guess the type
         from the name.
     use_lock_file: bool
@@ -231,12 +248,16 @@ def connect(
     if type == 'extract_from_name':
         if name is None:
             type = None
+        elif isinstance(name, (list, tuple)):
+            type = 'federated'
         elif not isinstance(name, str):
             type = 'json'
         elif name.startswith('postgresql://') or name.startswith('postgres://'):
             type = 'postgresql'
         elif name.startswith('mysql://') or name.startswith('mariadb://'):
             type = 'mysql'
+        elif glob.has_magic(name):
+            type = 'federated'
         else:
             type = os.path.splitext(name)[1][1:]
             if type == '':
@@ -245,6 +266,21 @@ def connect(
     if type is None:
         return Database(**db_kwargs)
 
+    if type == 'federated':
+        from ase.db.federated import FederatedDatabase
+
+        names = name
+        if isinstance(name, (str, PurePath)):
+            names = sorted(glob.glob(str(name)))
+            if not names:
+                raise ValueError(f'No databases matching {name}')
+        return FederatedDatabase(
+            [connect(name, create_indices=create_indices,
+                     use_lock_file=use_lock_file, append=append,
+                     serial=serial, **db_kwargs)
+             if not isinstance(name, Database) else name
+             for name in names])
+
     if not append and world.rank == 0:
         if isinstance(name, str) and os.path.isfile(name):
             os.remove(name)
@@ -258,6 +294,12 @@ def connect(
         return JSONDatabase(
             name, use_lock_file=use_lock_file, serial=serial, **db_kwargs
         )
+    if type == 'jsonl':
+        from ase.db.jsonl import JSONLinesDatabase
+
+        return JSONLinesDatabase(
+            name, use_lock_file=use_lock_file, serial=serial, **db_kwargs
+        )
     if type == 'db':
         from ase.db.sqlite import SQLite3Database
 
@@ -274,6 +316,13 @@ def connect(
 
         return MySQLDatabase(name, **db_kwargs)
 
+    if type == 'memory':
+        from ase.db.memory import MemoryDatabase
+
+        return MemoryDatabase(
+            name, create_indices, use_lock_file, serial=serial, **db_kwargs
+        )
+
     if type == 'aselmdb':
         from ase_db_backends.aselmdb import LMDBDatabase
 
@@ -282,6 +331,64 @@ def connect(
     raise ValueError('Unknown database type: ' + type)
 
 
+def split_image(image, key_value_pairs={}):
+    """Split item for write_many() into atoms (or row) and key-value pairs."""
+    if isinstance(image, tuple):
+        atoms, kvp = image
+        kvp = dict(kvp)
+    elif isinstance(image, AtomsRow):
+        atoms = image
+        kvp = dict(image.key_value_pairs)
+    else:
+        atoms = image
+        kvp = {}
+    if atoms is None:
+        atoms = Atoms()
+    kvp.update(key_value_pairs)
+    return atoms, kvp
+
+
+# State of the worker processes of Database.map() and Database.reduce():
+worker = {}
+
+
+def init_worker(db, func, reduce):
+    if isinstance(db, tuple):
+        name, type = db
+        db = connect(name, type=type, use_lock_file=False)
+    worker.update(db=db, func=func, reduce=reduce)
+
+
+def run_chunk(task):
+    """Apply the worker's function to the rows of a range of ids."""
+    keys, cmps, first, last, marker, include_data = task
+    db = worker['db']
+    rows = db._select(keys, cmps + [('id', '>=', first), ('id', '<=', last)],
+                      include_data=include_data)
+    if worker['reduce']:
+        return None, worker['func'](rows)
+    func = worker['func']
+    nrows = 0
+    updates = []
+    for row in rows:
+        if marker and marker in row:
+            continue
+        nrows += 1
+        kvp = dict(func(row) or {})
+        if marker:
+            kvp[marker] = True
+        if kvp:
+            check(kvp)
+            updates.append((row.id, kvp))
+    return nrows, updates
+
+
+def fold_rows(func, value, rows):
+    for row in rows:
+        value = func(value, row)
+    return value
+
+
 def lock(method):
     """Decorator for using a lock-file."""
 
@@ -308,6 +415,91 @@ def convert_str_to_int_float_bool_or_str(value):
         return value
 
 
+def normalize_sort(sort):
+    """Translate "age" and "user" sort keys to column names."""
+    if sort:
+        if sort == 'age':
+            sort = '-ctime'
+        elif sort == '-age':
+            sort = 'ctime'
+        elif sort.lstrip('-') == 'user':
+            sort += 'name'
+    return sort
+
+
+def keyset_cursor(row, sort=None):
+    """Cursor for continuing a selection after this row.
+
+    Use like this::
+
+        rows = list(db.select(query, sort=sort, limit=25))
+        after = keyset_cursor(rows[-1], sort)
+        next_page = list(db.select(query, sort=sort, limit=25, after=after))
+    """
+    key = (normalize_sort(sort) or 'id').lstrip('-')
+    if key == 'username':
+        value = row.get('user')
+    elif key == 'pbc':
+        value = int(np.dot(row.pbc, [1, 2, 4]))
+    else:
+        value = row.get(key)
+    if isinstance(value, np.generic):
+        value = value.item()
+    return (value, row.id)
+
+
+def column_array(values):
+    """Masked array from list of values with None for missing values.
+
+    Integers (and bools) give an int64 array, other numbers a float64
+    array and anything else an object array."""
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, (numbers.Integral, np.bool_))
+           for value in present):
+        dtype, fill = np.int64, 0
+    elif all(isinstance(value, numbers.Real) for value in present):
+        dtype, fill = np.float64, np.nan
+    else:
+        dtype, fill = object, None
+    mask = np.array([value is None for value in values], dtype=bool)
+    array = np.array([fill if value is None else value for value in values],
+                     dtype=dtype)
+    return np.ma.MaskedArray(array.reshape(len(values)), mask=mask)
+
+
+def key_stats(rows):
+    """(key, type, count, min, max) tuples for the key-value pairs of rows.
+
+    The type is 'number' or 'text' and a key with values of both types
+    gets a tuple for each type."""
+    stats = {}
+    for row in rows:
+        for key, value in row.key_value_pairs.items():
+            type = 'text' if isinstance(value, str) else 'number'
+            s = stats.get((key, type))
+            if s is None:
+                stats[key, type] = [1, value, value]
+            else:
+                s[0] += 1
+                s[1] = min(s[1], value)
+                s[2] = max(s[2], value)
+    return [(key, type, *s) for (key, type), s in stats.items()]
+
+
+def key_catalogue(stats):
+    """Convert (key, type, count, min, max) tuples to dict.
+
+    See Database.get_key_catalogue()."""
+    catalogue = {}
+    for key, type, count, mn, mx in sorted(stats, key=lambda s: -s[2]):
+        if key in catalogue:
+            catalogue[key]['count'] += count
+        else:
+            catalogue[key] = {'type': type, 'count': count,
+                              'min': mn, 'max': mx}
+    return dict(sorted(catalogue.items()))
+
+
 def parse_selection(selection, **kwargs):
     if selection is None or selection == '':
         expressions = []
@@ -454,6 +646,41 @@ class Database:
         check(key_value_pairs)
         return 1
 
+    @parallel_function
+    @lock
+    def write_many(self, images, key_value_pairs={}, data={},
+                   chunk_size=1000):
+        """Write many new rows to the database.
+
+        images: iterable
+            Atoms objects, AtomsRow objects or (atoms, key_value_pairs)
+            tuples.  Rows keep their own key-value pairs.
+        key_value_pairs: dict
+            Key-value pairs to add to all rows.
+        data: dict
+            Data for all rows.  If given, it replaces the data of
+            AtomsRow objects; if not, they keep their own data.
+        chunk_size: int
+            Number of rows to insert with each batch of SQL statements.
+
+        For SQLite, all rows are written in one transaction, which is much
+        faster than calling write() for each of them.
+
+        Returns list of integer ids of the new rows.
+        """
+        items = (split_image(image, key_value_pairs) for image in images)
+        return self._write_many(items, data, chunk_size)
+
+    def _write_many(self, items, data, chunk_size):
+        ids = []
+        for atoms, kvp in items:
+            if isinstance(atoms, AtomsRow) and not data:
+                ids.append(self._write(atoms, kvp, atoms.get('data', {}),
+                                       None))
+            else:
+                ids.append(self._write(atoms, kvp, data, None))
+        return ids
+
     @parallel_function
     @lock
     def reserve(self, **key_value_pairs):
@@ -544,6 +771,9 @@ class Database:
         sort=None,
         include_data=True,
         columns='all',
+        after=None,
+        batch_size=None,
+        data_keys=None,
         **kwargs,
     ):
         """Select rows.
@@ -563,6 +793,9 @@ class Database:
             * a string like 'key'
             * comma separated strings like 'key1<value1,key2=value2,key'
             * list of strings or tuples: [('charge', '=', 1)].
+
+            Add similar_to=<id> to get the rows in order of similarity
+            to the structure of row <id> (see ase.db.similarity).
         filter: function
             A function that takes as input a row and returns True or False.
         explain: bool
@@ -581,31 +814,176 @@ class Database:
             Specify which columns from the SQL table to include.
             For example, if only the row id and the energy is needed,
             queries can be speeded up by setting columns=['id', 'energy'].
+        after: tuple
+            Keyset (seek) pagination: only return rows that come after the
+            row with this (sort value, id) cursor in the sort order.
+            Unlike a large offset, this does not have to go through all
+            the skipped rows.  Use keyset_cursor(row, sort) to get the
+            cursor of the last row of a page.  Rows with the same sort
+            value are ordered by id.
+        batch_size: int
+            Stream rows from the database in batches of this size instead
+            of reading all of them before the first row is returned.
+            Memory use is then bounded also for very large selections,
+            but the database should not be written to before the
+            iteration is finished.
+        data_keys: list of str
+            Only read these entries of the data of the rows.  For SQLite
+            files, only the needed byte ranges of the data blobs are read.
         """
 
-        if sort:
-            if sort == 'age':
-                sort = '-ctime'
-            elif sort == '-age':
-                sort = 'ctime'
-            elif sort.lstrip('-') == 'user':
-                sort += 'name'
+        sort = normalize_sort(sort)
+
+        # Only pass "after" and "batch_size" on if used, so that backends
+        # without support for them keep working:
+        extra = {}
+        if after is not None:
+            extra['after'] = after
+        if batch_size is not None:
+            extra['batch_size'] = batch_size
 
         keys, cmps = parse_selection(selection, **kwargs)
-        for row in self._select(
-            keys,
-            cmps,
-            explain=explain,
-            verbosity=verbosity,
-            limit=limit,
-            offset=offset,
-            sort=sort,
-            include_data=include_data,
-            columns=columns,
-        ):
+        target, cmps = split_similar_to(cmps)
+        if target is not None and not explain:
+            rows = self._select_similar(
+                target,
+                keys,
+                cmps,
+                limit=limit,
+                offset=offset,
+                sort=sort,
+                after=after,
+                include_data=include_data and data_keys is None,
+                columns=columns,
+            )
+        else:
+            rows = self._select(
+                keys,
+                cmps,
+                explain=explain,
+                verbosity=verbosity,
+                limit=limit,
+                offset=offset,
+                sort=sort,
+                include_data=include_data and data_keys is None,
+                columns=columns,
+                **extra,
+            )
+        if include_data and data_keys is not None and not explain:
+            rows = self._add_data(rows, list(data_keys))
+        for row in rows:
             if filter is None or filter(row):
                 yield row
 
+    def _select_similar(self, target, keys, cmps, limit=None, offset=0,
+                        sort=None, after=None, include_data=True,
+                        columns='all'):
+        """Yield selected rows in order of similarity to row target."""
+        if sort and sort != '-similarity':
+            raise ValueError('Rows similar to a structure come in order of '
+                             f'similarity and can not be sorted by {sort}')
+        index = self.similarity_index()
+        vector = index.get(target)
+        if vector is None:
+            raise KeyError(f'similar_to={target}: no such row')
+        ids = None
+        if keys or cmps:
+            ids = self._select_ids(keys, cmps)
+        ids, scores = index.search(vector, ids,
+                                   limit and offset + limit, after)
+        similarity = dict(zip(ids[offset:].tolist(),
+                              scores[offset:].tolist()))
+        for row in self._get_rows(list(similarity),
+                                  include_data=include_data,
+                                  columns=columns):
+            row.similarity = similarity[row.id]
+            yield row
+
+    def similarity_index(self):
+        """Fingerprints of all rows for similar_to=<id> selections.
+
+        Missing fingerprints are computed (and stored if the backend can
+        do that).  See ase.db.similarity."""
+        from ase.db.cache import database_version
+        from ase.db.similarity import update_index
+        version = database_version(self)
+        cached = getattr(self, '_similarity_index', None)
+        if cached is None or version is None or cached[0] != version:
+            index = update_index(self, cached and cached[1])
+            cached = self._similarity_index = (version, index)
+        return cached[1]
+
+    def _read_fingerprints(self, parameters):
+        """Stored fingerprints: arrays of ids and vectors (or Nones)."""
+        return None, None
+
+    def _write_fingerprints(self, ids, vectors, parameters):
+        """Store fingerprints (not done by default)."""
+
+    def _add_data(self, rows, keys, batch_size=100):
+        """Give rows the given entries of their data."""
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return
+            data = self._read_data([row.id for row in batch], keys)
+            for row in batch:
+                row._data = data.get(row.id, {})
+                yield row
+
+    def _read_data(self, ids, keys):
+        """Read some entries of the data of rows.
+
+        Returns dict mapping ids to dicts."""
+        return {row.id: {key: row.data[key] for key in keys
+                         if key in row.data}
+                for row in self._get_rows(ids)}
+
+    def _select_ids(self, keys, cmps, sort=None, limit=None):
+        """Return list of ids of selected rows (in sorted order)."""
+        return [
+            row.id
+            for row in self._select(
+                keys, cmps, sort=sort, limit=limit, include_data=False,
+                columns=['id']
+            )
+        ]
+
+    def _get_rows(self, ids, include_data=True, columns='all'):
+        """Yield rows with the given ids in the same order as the ids."""
+        for id in ids:
+            yield from self._select(
+                [],
+                [('id', '=', int(id))],
+                include_data=include_data,
+                columns=columns,
+            )
+
+    def select_columns(self, keys, selection=None, sort=None, limit=None,
+                       offset=0, **kwargs):
+        """Read columns of values for the selected rows.
+
+        keys: list of str
+            Key-value pair keys and/or special keys like natoms, energy,
+            volume, mass, charge, fmax, ctime and user.
+
+        Returns dict mapping 'id' and the keys to NumPy masked arrays
+        with one value per row (in the same order as select() would
+        return the rows).  Missing values are masked.  Columns of
+        integers have dtype int64, other numbers float64 and strings
+        object.
+
+        See the select() method for the selection, sort, limit and offset
+        arguments.
+        """
+        keys = list(keys)
+        columns = {key: [] for key in ['id'] + keys}
+        for row in self.select(selection, sort=sort, limit=limit,
+                               offset=offset, include_data=False, **kwargs):
+            for key, values in columns.items():
+                values.append(row.get(key))
+        return {key: column_array(values) for key, values in columns.items()}
+
     def count(self, selection=None, **kwargs):
         """Count rows.
 
@@ -620,6 +998,21 @@ class Database:
     def __len__(self):
         return self.count()
 
+    def get_key_catalogue(self):
+        """Type, row count and range of all keys.
+
+        Returns dict mapping key names (sorted) to dicts with 'type'
+        ('number' or 'text'), 'count' (number of rows with the key),
+        'min' and 'max'.  A key with values of both types gets the type
+        (and range) of most of its values.
+
+        SQLite files keep these numbers in a table, so this does not
+        read the rows."""
+        return key_catalogue(self._key_stats())
+
+    def _key_stats(self):
+        return key_stats(self.select(include_data=False))
+
     @parallel_function
     @lock
     def update(
@@ -654,7 +1047,10 @@ class Database:
             raise TypeError('id must be an int')
 
         check(add_key_value_pairs)
+        return self._update_row(id, atoms, delete_keys, data,
+                                add_key_value_pairs)
 
+    def _update_row(self, id, atoms, delete_keys, data, add_key_value_pairs):
         row = self._get_row(id)
         kvp = row.key_value_pairs
 
@@ -684,16 +1080,160 @@ class Database:
             row.user = oldrow.user
             row.id = id
 
-        if atoms or os.path.splitext(self.filename)[1] == '.json':
+        if atoms or os.path.splitext(self.filename)[1] in ['.json', '.jsonl']:
             self._write(row, kvp, data, row.id)
         else:
             self._update(row.id, kvp, data)
         return m, n
 
+    @parallel_function
+    def update_many(self, selection=None, delete_keys=[],
+                    **add_key_value_pairs):
+        """Add and/or delete key-value pairs of all selected rows.
+
+        selection: int, str or list
+            See the select() method.
+        delete_keys: list of str
+            Keys to remove.
+
+        Use keyword arguments to add new key-value pairs.  For SQLite,
+        the whole selection is updated with a few SQL statements in one
+        transaction instead of one update() call per row.
+
+        Returns number of key-value pairs added and removed.
+        """
+        check(add_key_value_pairs)
+        keys, cmps = parse_selection(selection)
+        return self._update_many(keys, cmps, list(delete_keys),
+                                 add_key_value_pairs)
+
+    @lock
+    def _update_many(self, keys, cmps, delete_keys, add_key_value_pairs):
+        ids = self._select_ids(keys, cmps)
+        M = 0
+        N = 0
+        with self:
+            for id in ids:
+                m, n = self._update_row(id, None, delete_keys, None,
+                                        add_key_value_pairs)
+                M += m
+                N += n
+        return M, N
+
     def delete(self, ids):
         """Delete rows."""
         raise NotImplementedError
 
+    @lock
+    def _update_key_value_pairs(self, updates):
+        """Add key-value pairs to many rows.
+
+        updates: list of (id, dict) tuples."""
+        with self:
+            for id, kvp in updates:
+                self._update_row(id, None, [], None, kvp)
+
+    @parallel_function
+    def map(self, func, selection=None, processes=None, chunksize=1000,
+            marker=None, include_data=True, progress=None, **kwargs):
+        """Compute new key-value pairs for the selected rows.
+
+        func: callable
+            Function taking an AtomsRow and returning a dict of key-value
+            pairs to add to that row (or None to leave it as is).  Must be
+            picklable (defined at module level) if processes > 1.
+        processes: int
+            Number of worker processes (default: number of CPUs).
+        chunksize: int
+            Number of rows for each task.  The key-value pairs of a chunk
+            are written in one transaction.
+        marker: str
+            Key to add (with value True) to all rows passed to func.  Rows
+            that already have this key are skipped, so an interrupted
+            map() can be continued by running it again.
+        include_data: bool
+            Read the data part of the rows.
+        progress: callable
+            Called as progress(done, total) after each chunk.
+
+        The worker processes read the rows of their chunk (a range of
+        ids) from their own connection and send the results back to this
+        process, which is the only one writing to the database.
+
+        Returns number of updated rows.
+        """
+        keys, cmps = parse_selection(selection, **kwargs)
+        ids = self._select_ids(keys, cmps)
+        if marker:
+            done = set(self._select_ids(keys + [marker], cmps))
+            ids = [id for id in ids if id not in done]
+        tasks = [(keys, cmps, ids[i], ids[min(i + chunksize, len(ids)) - 1],
+                  marker, include_data)
+                 for i in range(0, len(ids), chunksize)]
+
+        nupdated = 0
+        ndone = 0
+        for nrows, updates in self._map_chunks(func, tasks, processes):
+            self._update_key_value_pairs(updates)
+            nupdated += len(updates)
+            ndone += nrows
+            if progress:
+                progress(ndone, len(ids))
+        return nupdated
+
+    def reduce(self, func, selection=None, initial=0, combine=operator.add,
+               processes=None, chunksize=1000, include_data=True,
+               **kwargs):
+        """Fold the selected rows into one value.
+
+        func: callable
+            Called as func(value, row) for each row.  Starts with value
+            equal to initial for each chunk of rows.
+        combine: callable
+            Function for combining the values of the chunks (default:
+            add them).
+
+        Example::
+
+            def count_hydrogens(n, row):
+                return n + row.count_atoms().get('H', 0)
+
+            nH = db.reduce(count_hydrogens)
+
+        See the map() method for the other arguments.
+        """
+        keys, cmps = parse_selection(selection, **kwargs)
+        ids = self._select_ids(keys, cmps)
+        tasks = [(keys, cmps, ids[i], ids[min(i + chunksize, len(ids)) - 1],
+                  None, include_data)
+                 for i in range(0, len(ids), chunksize)]
+        value = initial
+        for _, result in self._map_chunks(functools.partial(
+                fold_rows, func, initial), tasks, processes, reduce=True):
+            value = combine(value, result)
+        return value
+
+    def _map_chunks(self, func, tasks, processes, reduce=False):
+        """Run tasks in worker processes or (for one process) here."""
+        if processes is None:
+            processes = os.cpu_count()
+        processes = min(processes, len(tasks))
+        if (processes < 2 or not isinstance(self.filename, str) or
+                getattr(self, 'type', None) not in ['db', 'postgresql',
+                                                    'mysql']):
+            init_worker(self, func, reduce)
+            try:
+                yield from map(run_chunk, tasks)
+            finally:
+                init_worker(None, None, False)
+            return
+
+        import multiprocessing
+        with multiprocessing.Pool(
+                processes, initializer=init_worker,
+                initargs=((self.filename, self.type), func, reduce)) as pool:
+            yield from pool.imap_unordered(run_chunk, tasks)
+
 
 def time_string_to_float(s):
     if isinstance(s, (float, int)):
@@ -723,6 +1263,10 @@ def float_to_time_string(t, long=False):
 
 def object_to_bytes(obj: Any) -> bytes:
     """Serialize Python object to bytes."""
+    if isinstance(obj, LazyData):
+        if not obj.modified:
+            return obj.blob
+        obj = obj.todict()
     parts = [b'12345678']
     obj = o2b(obj, parts)
     offset = sum(len(part) for part in parts)
@@ -736,12 +1280,94 @@ def object_to_bytes(obj: Any) -> bytes:
 
 def bytes_to_object(b: bytes) -> Any:
     """Deserialize bytes to Python object."""
+    return b2o(bytes_to_index(b), b)
+
+
+def bytes_to_index(b) -> Any:
+    """Read the JSON part of bytes from object_to_bytes().
+
+    b can also be an sqlite3.Blob, in which case only the JSON part is
+    read from the database."""
     x = np.frombuffer(b[:8], np.int64)
     if not np.little_endian:
         x = x.byteswap()
     offset = x.item()
-    obj = json.loads(b[offset:].decode())
-    return b2o(obj, b)
+    return json.loads(b[offset:len(b)].decode())
+
+
+class LazyData(MutableMapping):
+    """Data dict that decodes the entries of a blob when they are used.
+
+    Only the JSON part of the blob is parsed up front.  Arrays and other
+    values are built from the blob the first time they are looked up, so
+    reading one entry of a row with large arrays is cheap.  Keys are
+    also available as attributes (like FancyDict).
+    """
+
+    def __init__(self, blob: bytes):
+        self.blob = blob
+        self._index = bytes_to_index(blob)
+        self._values: Dict[str, Any] = {}
+        self.modified = False
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            self._values[key] = b2o(self._index[key], self.blob)
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._index[key] = None
+        self._values[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._index[key]
+        self._values.pop(key, None)
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getattr__(self, key):
+        if key not in self.__dict__.get('_index', ()):
+            raise AttributeError(key)
+        value = self[key]
+        if isinstance(value, dict):
+            return FancyDict(value)
+        return value
+
+    def __dir__(self):
+        return self.keys()  # for tab-completion
+
+    def __repr__(self):
+        return repr(self.todict())
+
+    def copy(self):
+        data = LazyData.__new__(LazyData)
+        data.blob = self.blob
+        data._index = dict(self._index)
+        data._values = dict(self._values)
+        data.modified = self.modified
+        return data
+
+    def todict(self):
+        return {key: self[key] for key in self}
+
+
+def read_data(b, keys) -> Dict[str, Any]:
+    """Decode only some of the entries of data bytes.
+
+    b: bytes or sqlite3.Blob
+        Bytes from object_to_bytes().  For a Blob, only the JSON part and
+        the byte ranges of the arrays of the wanted entries are read.
+    keys: list of str
+        Entries to decode (missing ones are skipped).
+    """
+    index = bytes_to_index(b)
+    return {key: b2o(index[key], b) for key in keys if key in index}
 
 
 def o2b(obj: Any, parts: List[bytes]):
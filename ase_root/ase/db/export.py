@@ -0,0 +1,134 @@
+"""Export selected rows as a single file.
+
+The file is made piece by piece while the rows are read, so that large
+selections can be sent from the web app (/export/<project>?query=...)
+or written by "ase db --export" with bounded memory.  Formats:
+
+xyz:
+    Extended XYZ.  Key-value pairs and the row id go in the comment line.
+jsonl:
+    ASE JSON-lines database (see ase.db.jsonl), one row per line.  Can be
+    opened with ase.db.connect() or read with any NDJSON reader.
+cif:
+    Zip file with one CIF file per row (<name>-<id>.cif).
+"""
+import io
+import time
+import zipfile
+from typing import Iterable, Iterator
+
+from ase.db.core import T2000, YEAR
+from ase.db.jsonl import header_line, new_token
+from ase.db.row import AtomsRow
+from ase.io.jsonio import encode
+
+# format -> (file extension, mime type)
+formats = {'xyz': ('xyz', 'text/plain'),
+           'jsonl': ('jsonl', 'application/x-ndjson'),
+           'cif': ('zip', 'application/zip')}
+
+
+def export_format(filename: str) -> str:
+    """Export format from file extension (.xyz, .jsonl or .zip)."""
+    for format, (ext, _) in formats.items():
+        if filename.endswith('.' + ext):
+            return format
+    raise ValueError(f'Unknown export format: {filename!r}.  '
+                     'Use .xyz, .jsonl or .zip (for CIF files)')
+
+
+class Buffer:
+    """File-like object that collects bytes until they are taken."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def row_dict(row: AtomsRow) -> dict:
+    """Dict for a row as stored in a JSON(-lines) file (without the id)."""
+    dct = {key: row[key] for key in row
+           if key not in row._keys and key != 'id'}
+    if row._keys:
+        dct['key_value_pairs'] = row.key_value_pairs
+    if row.data:
+        dct['data'] = row.data
+    if row.constraints:
+        dct['constraints'] = row.constraints
+    return dct
+
+
+def write_xyz_row(buffer, row, name):
+    from ase.io.extxyz import write_xyz
+    atoms = row.toatoms()
+    atoms.info.update(row.key_value_pairs)
+    atoms.info['id'] = row.id
+    fd = io.StringIO()
+    write_xyz(fd, atoms)
+    buffer.write(fd.getvalue().encode())
+
+
+def write_jsonl_row(buffer, row, name):
+    buffer.write(f'{{"id": {row.id}, "row": {encode(row_dict(row))}}}\n'
+                 .encode())
+
+
+def write_cif_row(zf, row, name):
+    from ase.io.cif import write_cif
+    atoms = row.toatoms()
+    atoms.pbc = True
+    fd = io.BytesIO()
+    write_cif(fd, atoms, wrap=False)
+    mtime = time.localtime(T2000 + row.mtime * YEAR)
+    info = zipfile.ZipInfo(f'{name}-{row.id}.cif', date_time=mtime[:6])
+    zf.writestr(info, fd.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+
+
+def export(rows: Iterable[AtomsRow],
+           format: str,
+           name: str = 'row',
+           chunk_size: int = 2**16) -> Iterator[bytes]:
+    """Yield content of file with rows in chunks of about chunk_size bytes.
+
+    rows: iterable of AtomsRow objects
+        Typically db.select(query, batch_size=1000).
+    format: str
+        One of 'xyz', 'jsonl' or 'cif' (zip file of CIF files).
+    name: str
+        Start of file names in zip file.
+    """
+    if format not in formats:
+        raise ValueError(f'Unknown export format: {format!r}.  '
+                         f'Must be one of {", ".join(formats)}')
+    buffer = Buffer()
+    if format == 'cif':
+        # (zipfile can write to our unseekable buffer)
+        out = zipfile.ZipFile(buffer, 'w')
+    else:
+        out = buffer
+        if format == 'jsonl':
+            buffer.write(header_line(new_token(), 1))
+    write = {'xyz': write_xyz_row,
+             'jsonl': write_jsonl_row,
+             'cif': write_cif_row}[format]
+    for row in rows:
+        write(out, row, name)
+        if buffer.size >= chunk_size:
+            yield buffer.take()
+    if format == 'cif':
+        out.close()
+    yield buffer.take()
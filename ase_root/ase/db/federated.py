@@ -0,0 +1,289 @@
+"""Several databases (shards) queried as one.
+
+Give connect() a list of databases or a glob pattern::
+
+    db = connect(['lego-1.db', 'lego-2.json'])
+    db = connect('shards/lego-*.db')
+
+Selections and counts run on all shards concurrently in a thread pool.
+Sorted results are merged (NULLs last, then by id like the SQLite backend)
+and limit and offset are applied to the merged result.
+
+Row ids are namespaced by shard: row 42 of shard number 3 (counting from
+zero) gets the id 3 * id_stride + 42 = 3000000042.  The ids of the first
+shard are unchanged.
+"""
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from ase.db.core import Database, keyset_cursor, parse_selection
+from ase.db.memory import MemoryDatabase
+from ase.db.similarity import split_similar_to
+from ase.db.sqlite import SQLite3Database
+
+id_stride = 1_000_000_000
+
+
+class Reversed:
+    """Wrapper that reverses the order of values (for descending sorts)."""
+
+    __slots__ = ['value']
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def cursor_key(cursor, sort):
+    """Key for merging rows sorted by sort (NULLs last, then by id)."""
+    value, id = cursor
+    if value is None:
+        return (1, False, 0, id)
+    if sort[0] == '-':
+        return (0, isinstance(value, str), Reversed(value), id)
+    return (0, isinstance(value, str), value, id)
+
+
+def sort_key(row, sort):
+    return cursor_key(keyset_cursor(row, sort), sort)
+
+
+def split_id(id):
+    """Shard number and id in that shard."""
+    return divmod(int(id), id_stride)
+
+
+class FederatedDatabase(Database):
+    type = 'federated'
+
+    def __init__(self, shards, max_workers=None):
+        """Read from several databases as if they were one.
+
+        shards: list of Database
+            The databases.
+        max_workers: int
+            Number of threads for querying the shards (default: one
+            per shard).
+        """
+        Database.__init__(self)
+        self.shards = list(shards)
+        self.max_workers = max_workers or len(self.shards)
+        self._pool = None
+
+    def _map(self, func, items):
+        items = list(items)
+        if len(items) < 2 or self.max_workers < 2:
+            return [func(item) for item in items]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_workers)
+        return list(self._pool.map(func, items))
+
+    def _shard_cmps(self, i, cmps):
+        # Global id op value <=> local id op value - i * id_stride:
+        return [(key, op, value - i * id_stride) if key == 'id'
+                else (key, op, value)
+                for key, op, value in cmps]
+
+    def _shard_after(self, i, after, sort):
+        """Cursor for shard i (rows with same sort value come by id)."""
+        value, id = after
+        local = min(max(id - i * id_stride, 0), id_stride)
+        if value is not None and sort.lstrip('-') == 'id':
+            value = local
+        return (value, local)
+
+    def _rows(self, i, rows):
+        """Give rows of shard i their global ids."""
+        for row in rows:
+            if row.id >= id_stride:
+                raise ValueError(f'Row id {row.id} too large for shard')
+            row.id += i * id_stride
+            yield row
+
+    def _select(self, keys, cmps, explain=False, verbosity=0,
+                limit=None, offset=0, sort=None, include_data=True,
+                columns='all', after=None, batch_size=None):
+        if after is not None and not sort:
+            sort = 'id'
+        if columns != 'all' and 'id' not in columns:
+            columns = ['id'] + list(columns)
+        nmax = offset + limit if limit else None
+
+        def select(i):
+            shard = self.shards[i]
+            extra = {}
+            if batch_size is not None:
+                extra['batch_size'] = batch_size
+            skip = (after is not None and split_id(after[1])[0] != i and
+                    not isinstance(shard, (SQLite3Database, MemoryDatabase)))
+            if skip:
+                # This backend can only continue after one of its own
+                # rows.  Skip rows until the cursor instead:
+                rows = shard._select(
+                    keys, self._shard_cmps(i, cmps), sort=sort,
+                    include_data=include_data, columns=columns, **extra)
+                key = cursor_key(after, sort)
+                rows = (row for row in self._rows(i, rows)
+                        if sort_key(row, sort) > key)
+                return itertools.islice(rows, nmax)
+            if after is not None:
+                extra['after'] = self._shard_after(i, after, sort)
+            rows = shard._select(
+                keys, self._shard_cmps(i, cmps), explain=explain,
+                verbosity=verbosity, limit=nmax, sort=sort,
+                include_data=include_data, columns=columns, **extra)
+            if explain:
+                return rows
+            return self._rows(i, rows)
+
+        if explain:
+            for i in range(len(self.shards)):
+                yield from select(i)
+            return
+
+        if (offset and nmax is not None and after is None and
+                (sort or '').lstrip('-') != 'pbc'):
+            # Deep page: merge ids and sort values first and then read
+            # only the rows of the page:
+            ids = self._page_ids(keys, cmps, sort, offset, nmax)
+            yield from self._get_rows(ids, include_data=include_data,
+                                      columns=columns)
+            return
+
+        if nmax is None:
+            # Stream the rows from all shards:
+            results = [select(i) for i in range(len(self.shards))]
+        else:
+            results = self._map(lambda i: list(select(i)),
+                                range(len(self.shards)))
+
+        if sort:
+            rows = heapq.merge(*results, key=lambda row: sort_key(row, sort))
+        else:
+            rows = itertools.chain(*results)
+        yield from itertools.islice(rows, offset, nmax)
+
+    def _page_ids(self, keys, cmps, sort, offset, nmax):
+        """Ids of the rows from offset to nmax in the merged selection."""
+        name = (sort or 'id').lstrip('-')
+        key = 'user' if name == 'username' else name
+
+        def select(i):
+            columns = self.shards[i].select_columns(
+                [key], keys + self._shard_cmps(i, cmps), sort=sort,
+                limit=nmax)
+            ids = (columns['id'] + i * id_stride).tolist()
+            if not sort:
+                return [(id, id) for id in ids]
+            values = ids if key == 'id' else columns[key].tolist()
+            return [(cursor_key((value, id), sort), id)
+                    for value, id in zip(values, ids)]
+
+        results = self._map(select, range(len(self.shards)))
+        merged = heapq.merge(*results) if sort else itertools.chain(*results)
+        return [id for _, id in itertools.islice(merged, offset, nmax)]
+
+    def _get_rows(self, ids, include_data=True, columns='all'):
+        shards = {}
+        for id in ids:
+            i, local = split_id(id)
+            shards.setdefault(i, []).append(local)
+
+        def get(i):
+            return list(self._rows(i, self.shards[i]._get_rows(
+                shards[i], include_data=include_data, columns=columns)))
+
+        rows = {row.id: row
+                for rows in self._map(get, shards)
+                for row in rows}
+        for id in ids:
+            if int(id) in rows:
+                yield rows[int(id)]
+
+    def _read_data(self, ids, keys):
+        shards = {}
+        for id in ids:
+            i, local = split_id(id)
+            shards.setdefault(i, []).append(local)
+        data = {}
+        for i, local_ids in shards.items():
+            for local, dct in self.shards[i]._read_data(local_ids,
+                                                        keys).items():
+                data[local + i * id_stride] = dct
+        return data
+
+    def count(self, selection=None, **kwargs):
+        keys, cmps = parse_selection(selection, **kwargs)
+        _, cmps = split_similar_to(cmps)
+        return sum(self._map(
+            lambda i: self.shards[i].count(keys + self._shard_cmps(i, cmps)),
+            range(len(self.shards))))
+
+    def get_all_key_names(self):
+        keys = set()
+        for names in self._map(lambda shard: shard.get_all_key_names(),
+                               self.shards):
+            keys.update(names)
+        return keys
+
+    def _key_stats(self):
+        stats = {}
+        for shard_stats in self._map(lambda shard: shard._key_stats(),
+                                     self.shards):
+            for key, type, count, mn, mx in shard_stats:
+                s = stats.get((key, type))
+                if s is None:
+                    stats[key, type] = [count, mn, mx]
+                else:
+                    s[0] += count
+                    s[1] = min(s[1], mn)
+                    s[2] = max(s[2], mx)
+        return [(key, type, *s) for (key, type), s in stats.items()]
+
+    @property
+    def metadata(self):
+        return self.shards[0].metadata
+
+    def _write(self, atoms, key_value_pairs, data, id):
+        raise NotImplementedError(
+            'Can not write to a federated database.  '
+            'Write to one of its shards instead.')
+
+    def update(self, id, *args, **kwargs):
+        i, local = split_id(id)
+        return self.shards[i].update(local, *args, **kwargs)
+
+    def _update_key_value_pairs(self, updates):
+        shards = {}
+        for id, kvp in updates:
+            i, local = split_id(id)
+            shards.setdefault(i, []).append((local, kvp))
+        for i, local_updates in shards.items():
+            self.shards[i]._update_key_value_pairs(local_updates)
+
+    def update_many(self, selection=None, delete_keys=[],
+                    **add_key_value_pairs):
+        keys, cmps = parse_selection(selection)
+        M = 0
+        N = 0
+        for i, shard in enumerate(self.shards):
+            m, n = shard.update_many(keys + self._shard_cmps(i, cmps),
+                                     delete_keys=delete_keys,
+                                     **add_key_value_pairs)
+            M += m
+            N += n
+        return M, N
+
+    def delete(self, ids):
+        shards = {}
+        for id in ids:
+            i, local = split_id(id)
+            shards.setdefault(i, []).append(local)
+        for i, local_ids in shards.items():
+            self.shards[i].delete(local_ids)
@@ -0,0 +1,230 @@
+"""HTTP caching for the database web app.
+
+Static files:
+    URLs made with url_for('static', filename=...) get the content hash of
+    the file as a "v" parameter and are cached by browsers for a year
+    ("immutable").  Other static URLs (like the files JSmol loads itself)
+    may be cached for a day and are then revalidated with their ETag.
+    Text files are sent brotli (if the brotli module is installed) or gzip
+    compressed when the browser accepts that.  The compressed copies are
+    made once and stored next to the file (name.gz, name.br) or kept in
+    memory if the folder is read-only.  Use precompress() to make them
+    all in advance::
+
+        $ python -m ase.db.httpcache
+
+Pages:
+    Row pages, structure downloads and table fragments get strong ETags
+    made from the database version (see ase.db.cache.database_version())
+    and the row mtime or session state.  A browser that revalidates such
+    a page gets "304 Not Modified" without the page being rendered again.
+"""
+import functools
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+from pathlib import Path
+
+import ase
+from ase.db.cache import database_version
+
+# Cache-Control for static URLs with the right content hash:
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+compressible_types = {'application/javascript', 'application/json',
+                      'application/xml', 'image/svg+xml'}
+
+
+@functools.lru_cache()
+def get_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def encodings():
+    """Content encodings we can make, best first."""
+    return (['br'] if get_brotli() else []) + ['gzip']
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return get_brotli().compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class StaticFile:
+    def __init__(self, path, stat, data):
+        self.path = path
+        self.stat = stat
+        self.hash = hashlib.sha256(data).hexdigest()[:16]
+        self.mimetype = (mimetypes.guess_type(path.name)[0] or
+                         'application/octet-stream')
+        self.compressible = (len(data) > 1000 and
+                             (self.mimetype.startswith('text/') or
+                              self.mimetype in compressible_types))
+        self.compressed = {}  # encoding -> bytes (read-only folders)
+
+    def read(self, encoding=None):
+        """Content (compressed with encoding)."""
+        if encoding is None:
+            return self.path.read_bytes()
+        if encoding in self.compressed:
+            return self.compressed[encoding]
+        suffix = {'gzip': '.gz', 'br': '.br'}[encoding]
+        cpath = self.path.with_name(self.path.name + suffix)
+        try:
+            if cpath.stat().st_mtime_ns >= self.stat.st_mtime_ns:
+                return cpath.read_bytes()
+        except OSError:
+            pass
+        data = compress(self.path.read_bytes(), encoding)
+        try:
+            tmp = cpath.with_name(f'{cpath.name}.{os.getpid()}.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, cpath)
+        except OSError:
+            self.compressed[encoding] = data
+        return data
+
+
+class StaticFiles:
+    """Static files with content hashes and compressed copies."""
+
+    def __init__(self, folder, max_age=24 * 3600):
+        self.folder = Path(folder)
+        self.max_age = max_age
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """StaticFile object.  Raises KeyError for missing files."""
+        from werkzeug.security import safe_join
+        name = safe_join(str(self.folder), filename)
+        if name is None:
+            raise KeyError(filename)
+        path = Path(name)
+        try:
+            stat = path.stat()
+        except OSError:
+            raise KeyError(filename)
+        if not path.is_file():
+            raise KeyError(filename)
+        with self._lock:
+            file = self._files.get(filename)
+            if (file is None or
+                    (file.stat.st_mtime_ns, file.stat.st_size) !=
+                    (stat.st_mtime_ns, stat.st_size)):
+                file = StaticFile(path, stat, path.read_bytes())
+                self._files[filename] = file
+        return file
+
+    def url_defaults(self, endpoint, values):
+        """Add content hash to url_for('static', filename=...)."""
+        if endpoint == 'static' and 'filename' in values:
+            try:
+                values['v'] = self.get(values['filename']).hash
+            except KeyError:
+                pass
+
+    def response(self, filename):
+        """Flask response for a static file."""
+        from flask import abort, make_response, request
+
+        try:
+            file = self.get(filename)
+        except KeyError:
+            abort(404)
+
+        encoding = None
+        if file.compressible:
+            for encoding in encodings():
+                if encoding in request.accept_encodings:
+                    break
+            else:
+                encoding = None
+
+        etag = file.hash if encoding is None else f'{file.hash}-{encoding}'
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(file.read(encoding))
+            response.mimetype = file.mimetype
+            if encoding:
+                response.content_encoding = encoding
+        response.set_etag(etag)
+        if file.compressible:
+            response.vary.add('Accept-Encoding')
+        if request.args.get('v') == file.hash:
+            response.headers['Cache-Control'] = IMMUTABLE
+        else:
+            response.headers['Cache-Control'] = \
+                f'public, max-age={self.max_age}'
+        return response
+
+
+def page_etag(db, *parts):
+    """Strong ETag for a page made from rows of db.
+
+    Returns None for databases that are not files."""
+    version = database_version(db)
+    if version is None:
+        return None
+    txt = repr((ase.__version__, version, parts))
+    return hashlib.sha256(txt.encode()).hexdigest()[:32]
+
+
+def is_fresh(etag):
+    """Does the browser already have the page with this ETag?"""
+    from flask import request
+    return etag is not None and request.if_none_match.contains(etag)
+
+
+def with_etag(response, etag):
+    """Make response (or 304 if etag is fresh) that must be revalidated."""
+    from flask import make_response
+    if is_fresh(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(response)
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def precompress(folder):
+    """Make compressed copies of all compressible files in folder."""
+    static = StaticFiles(folder)
+    n = 0
+    # (jsmol is usually a soft-link, so we can't use Path.rglob())
+    for dirpath, dirnames, filenames in os.walk(folder, followlinks=True):
+        for name in filenames:
+            path = Path(dirpath) / name
+            if path.suffix in ['.gz', '.br', '.tmp']:
+                continue
+            try:
+                file = static.get(str(path.relative_to(folder)))
+            except KeyError:
+                continue  # broken link
+            if file.compressible:
+                for encoding in encodings():
+                    file.read(encoding)
+                n += 1
+    return n
+
+
+def main():
+    folder = (sys.argv[1] if len(sys.argv) > 1 else
+              Path(__file__).parent / 'static')
+    n = precompress(folder)
+    print(f'Compressed {n} files in {folder} ({", ".join(encodings())})')
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,21 @@ class JSONDatabase(Database):
             except (SyntaxError, ValueError):
                 pass
 
+        dct = self._row_dict(atoms, key_value_pairs, data)
+
+        if id is None:
+            id = nextid
+            ids.append(id)
+            nextid += 1
+        else:
+            assert id in bigdct
+
+        bigdct[id] = dct
+        self._write_json(bigdct, ids, nextid)
+        return id
+
+    def _row_dict(self, atoms, key_value_pairs, data):
+        """Dict for a row as stored in the file (without the id)."""
         mtime = now()
 
         if isinstance(atoms, AtomsRow):
@@ -59,17 +74,7 @@ class JSONDatabase(Database):
         constraints = row.get('constraints')
         if constraints:
             dct['constraints'] = constraints
-
-        if id is None:
-            id = nextid
-            ids.append(id)
-            nextid += 1
-        else:
-            assert id in bigdct
-
-        bigdct[id] = dct
-        self._write_json(bigdct, ids, nextid)
-        return id
+        return dct
 
     def _read_json(self):
         if isinstance(self.filename, str):
@@ -134,11 +139,15 @@ class JSONDatabase(Database):
 
     def _select(self, keys, cmps, explain=False, verbosity=0,
                 limit=None, offset=0, sort=None, include_data=True,
-                columns='all'):
+                columns='all', after=None, batch_size=None):
+        # (batch_size is ignored: the whole file is read anyway)
         if explain:
             yield {'explain': (0, 0, 0, 'scan table')}
             return
 
+        if after is not None and not sort:
+            sort = 'id'
+
         if sort:
             if sort[0] == '-':
                 reverse = True
@@ -161,6 +170,14 @@ class JSONDatabase(Database):
             rows.sort(reverse=reverse, key=lambda x: x[0])
             rows += missing
 
+            if after is not None:
+                for i, (key, row) in enumerate(rows):
+                    if row.id == after[1]:
+                        rows = rows[i + 1:]
+                        break
+                else:
+                    rows = []
+
             if limit:
                 rows = rows[offset:offset + limit]
             for key, row in rows:
@@ -168,7 +185,7 @@ class JSONDatabase(Database):
             return
 
         try:
-            bigdct, ids, _nextid = self._read_json()
+            bigdct, ids = self._read_candidates(cmps)
         except OSError:
             return
 
@@ -204,6 +221,11 @@ class JSONDatabase(Database):
                         yield row
                     n += 1
 
+    def _read_candidates(self, cmps):
+        """Rows (dict and list of ids) that may match cmps."""
+        bigdct, ids, _nextid = self._read_json()
+        return bigdct, ids
+
     @property
     def metadata(self):
         if self._metadata is None:
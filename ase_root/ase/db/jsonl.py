@@ -0,0 +1,368 @@
+"""Append-only JSON-lines database.
+
+Every line of a .jsonl file is one JSON object::
+
+    {"ase_jsonl": 1, "token": 1234, "nextid": 1}   first line
+    {"id": 7, "row": {...}}                         row 7 (new or updated)
+    {"id": 7, "deleted": true}                      row 7 was deleted
+    {"metadata": {...}}                             metadata
+
+Writes, updates and deletes only append lines and the last line for a row
+wins, so writing a row does not depend on the size of the file.
+
+The byte offsets of the lines are kept in an index file (name + '.index')
+of 64 bit integer pairs (id, offset), where a negative id is a deleted row
+and id 0 is metadata.  The first pair holds the token of the data file.
+With the index, get(id) reads only a single line.  The index is only a
+cache: lines after the last indexed line are read when the file is opened
+(so files written by other programs or interrupted writes are fine) and
+it is rebuilt if the token does not match.
+
+Use db.vacuum() (or ase db --compact) to rewrite the file without old
+versions of rows and deleted rows.
+"""
+import itertools
+import json
+import os
+import re
+
+import numpy as np
+
+from ase.db.core import Database, lock
+from ase.db.jsondb import JSONDatabase
+from ase.db.row import AtomsRow
+from ase.io.jsonio import decode, encode
+from ase.parallel import parallel_function
+
+VERSION = 1
+
+line_pattern = re.compile(rb'{"id": (\d+), "(row|deleted)"')
+
+
+def new_token():
+    return int.from_bytes(os.urandom(7), 'big')
+
+
+def header_line(token, nextid):
+    return (f'{{"ase_jsonl": {VERSION}, "token": {token}, '
+            f'"nextid": {nextid}}}\n').encode()
+
+
+def parse_header(line):
+    """Token and next id from first line of file."""
+    try:
+        dct = json.loads(line)
+        return dct['token'], dct['nextid']
+    except (ValueError, TypeError, KeyError):
+        from ase.io.formats import UnknownFileTypeError
+        raise UnknownFileTypeError(
+            'Does not resemble ASE JSON-lines database')
+
+
+def parse_line(line):
+    """Index code of line: id of row, -id for deleted row, 0 for metadata.
+
+    Returns None for unknown or incomplete lines."""
+    if not line.endswith(b'\n'):
+        return None
+    match = line_pattern.match(line)
+    if match:
+        id = int(match.group(1))
+        return id if match.group(2) == b'row' else -id
+    if line.startswith(b'{"metadata"'):
+        return 0
+    try:
+        dct = json.loads(line)
+    except ValueError:
+        return None
+    if 'metadata' in dct:
+        return 0
+    if 'id' in dct:
+        return -dct['id'] if dct.get('deleted') else dct['id']
+    return None
+
+
+class JSONLinesDatabase(JSONDatabase):
+    type = 'jsonl'
+
+    def __init__(self, filename, **kwargs):
+        JSONDatabase.__init__(self, filename, **kwargs)
+        if not isinstance(self.filename, str):
+            raise ValueError('JSON-lines databases must be files')
+        self.indexname = self.filename + '.index'
+        self._reset()
+
+    def _reset(self):
+        self._offsets = {}  # id -> offset of line of current row
+        self._metadata_offset = None
+        self._nextid = 1
+        self._token = None
+        self._size = 0  # end of last complete line
+        self._stat = None  # (inode, size) of file when last read
+
+    def _sync(self):
+        """Bring the offsets up to date with the file."""
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            self._reset()
+            return
+        if self._stat == (st.st_ino, st.st_size):
+            return
+        if (self._stat is not None and st.st_ino == self._stat[0] and
+                st.st_size >= self._size):
+            with open(self.filename, 'rb') as fd:
+                self._scan(fd, self._size)
+        else:
+            self._load()
+
+    def _load(self):
+        self._reset()
+        with open(self.filename, 'rb') as fd:
+            header = fd.readline()
+            if not header:
+                return
+            self._token, self._nextid = parse_header(header)
+            records, end = self._read_index(fd)
+            if records is None:
+                records = np.zeros((0, 2), np.int64)
+                end = len(header)
+                self._write_index([(self._token, 0)], 'wb')
+            self._apply(records)
+            self._scan(fd, end)
+
+    def _read_index(self, fd):
+        """Read and check index.
+
+        Returns records and end of last indexed line or (None, None)."""
+        try:
+            records = np.fromfile(self.indexname, np.int64)
+        except (OSError, ValueError):
+            return None, None
+        if len(records) < 2 or len(records) % 2:
+            return None, None
+        records = records.reshape((-1, 2))
+        if records[0, 0] != self._token:
+            return None, None
+        records = records[1:]
+        if len(records) == 0:
+            fd.seek(0)
+            return records, len(fd.readline())
+        code, offset = records[-1].tolist()
+        fd.seek(offset)
+        line = fd.readline()
+        if parse_line(line) != code:
+            return None, None
+        return records, offset + len(line)
+
+    def _write_index(self, records, mode='ab'):
+        try:
+            with open(self.indexname, mode) as fd:
+                fd.write(np.array(records, np.int64).tobytes())
+        except OSError:
+            pass  # the index is only a cache
+
+    def _apply(self, records):
+        for code, offset in np.asarray(records).tolist():
+            if code > 0:
+                self._offsets[code] = offset
+                self._nextid = max(self._nextid, code + 1)
+            elif code < 0:
+                self._offsets.pop(-code, None)
+                self._nextid = max(self._nextid, 1 - code)
+            else:
+                self._metadata_offset = offset
+
+    def _scan(self, fd, start):
+        """Index lines from start to the end of the file."""
+        fd.seek(start)
+        records = []
+        offset = start
+        for line in fd:
+            if not line.endswith(b'\n'):
+                break  # being written (or interrupted)
+            code = parse_line(line)
+            if code is not None:
+                records.append((code, offset))
+            offset += len(line)
+        if records:
+            self._write_index(records)
+            self._apply(records)
+        self._size = offset
+        st = os.fstat(fd.fileno())
+        self._stat = (st.st_ino, st.st_size)
+
+    def _append(self, lines):
+        """Append lines (list of (code, bytes)) to file."""
+        self._sync()
+        if self._token is None:
+            self._token = new_token()
+            with open(self.filename, 'wb') as fd:
+                fd.write(header_line(self._token, self._nextid))
+                self._size = fd.tell()
+            self._write_index([(self._token, 0)], 'wb')
+        records = []
+        with open(self.filename, 'r+b') as fd:
+            fd.seek(self._size)
+            offset = self._size
+            for code, line in lines:
+                fd.write(line)
+                records.append((code, offset))
+                offset += len(line)
+            fd.truncate()  # remove interrupted line
+            fd.flush()
+            self._size = offset
+            st = os.fstat(fd.fileno())
+            self._stat = (st.st_ino, st.st_size)
+        self._write_index(records)
+        self._apply(records)
+
+    def _append_rows(self, rows):
+        """Append rows (list of (dct, id)) and return their ids."""
+        self._sync()
+        lines = []
+        ids = []
+        nextid = self._nextid
+        for dct, id in rows:
+            if id is None:
+                id = nextid
+                nextid += 1
+            else:
+                assert id in self._offsets
+            lines.append((id, f'{{"id": {id}, "row": {encode(dct)}}}\n'
+                          .encode()))
+            ids.append(id)
+        self._append(lines)
+        return ids
+
+    def _write(self, atoms, key_value_pairs, data, id):
+        Database._write(self, atoms, key_value_pairs, data)
+        dct = self._row_dict(atoms, key_value_pairs, data)
+        return self._append_rows([(dct, id)])[0]
+
+    def _write_many(self, items, data, chunk_size):
+        items = iter(items)
+        ids = []
+        while True:
+            rows = []
+            for atoms, kvp in itertools.islice(items, chunk_size):
+                if isinstance(atoms, AtomsRow) and not data:
+                    rowdata = atoms.get('data', {})
+                else:
+                    rowdata = data
+                Database._write(self, atoms, kvp, rowdata)
+                rows.append((self._row_dict(atoms, kvp, rowdata), None))
+            if not rows:
+                return ids
+            ids += self._append_rows(rows)
+
+    def _read_line(self, fd, offset):
+        fd.seek(offset)
+        return decode(fd.readline().decode())
+
+    def _read_json(self):
+        self._sync()
+        bigdct = {}
+        ids = sorted(self._offsets)
+        if self._token is None:
+            return bigdct, ids, self._nextid
+        lines = {offset: id for id, offset in self._offsets.items()}
+        if self._metadata_offset is not None:
+            lines[self._metadata_offset] = 'metadata'
+        with open(self.filename, 'rb') as fd:
+            offset = 0
+            for line in fd:
+                key = lines.get(offset)
+                offset += len(line)
+                if key is None:
+                    continue
+                dct = decode(line.decode())
+                if key == 'metadata':
+                    bigdct[key] = dct['metadata']
+                else:
+                    bigdct[key] = dct['row']
+                if offset >= self._size:
+                    break
+        return bigdct, ids, self._nextid
+
+    def _read_candidates(self, cmps):
+        ids = {value for key, op, value in cmps if key == 'id' and op == '='}
+        if not ids:
+            return JSONDatabase._read_candidates(self, cmps)
+        # Read only the rows with the given id:
+        self._sync()
+        ids = sorted(id for id in ids if id in self._offsets)
+        bigdct = {}
+        with open(self.filename, 'rb') as fd:
+            for id in ids:
+                bigdct[id] = self._read_line(fd, self._offsets[id])['row']
+        return bigdct, ids
+
+    def _get_row(self, id):
+        self._sync()
+        if id is None:
+            assert len(self._offsets) == 1
+            id, = self._offsets
+        offset = self._offsets[id]
+        with open(self.filename, 'rb') as fd:
+            dct = self._read_line(fd, offset)['row']
+        dct['id'] = id
+        return AtomsRow(dct)
+
+    def count(self, selection=None, **kwargs):
+        if selection is None and not kwargs:
+            self._sync()
+            return len(self._offsets)
+        return Database.count(self, selection, **kwargs)
+
+    @parallel_function
+    @lock
+    def delete(self, ids):
+        self._sync()
+        for id in ids:
+            if id not in self._offsets:
+                raise KeyError(id)
+        self._append([(-id, f'{{"id": {id}, "deleted": true}}\n'.encode())
+                      for id in ids])
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._sync()
+            self._metadata = {}
+            if self._metadata_offset is not None:
+                with open(self.filename, 'rb') as fd:
+                    self._metadata = self._read_line(
+                        fd, self._metadata_offset)['metadata']
+        return self._metadata.copy()
+
+    @metadata.setter
+    def metadata(self, dct):
+        self._metadata = dct
+        self._append([(0, f'{{"metadata": {encode(dct)}}}\n'.encode())])
+
+    @parallel_function
+    @lock
+    def vacuum(self):
+        """Rewrite file without old versions of rows and deleted rows."""
+        self._sync()
+        if self._token is None:
+            return
+        lines = [(id, offset) for id, offset in self._offsets.items()]
+        if self._metadata_offset is not None:
+            lines.append((0, self._metadata_offset))
+        lines.sort(key=lambda line: line[1])
+
+        token = new_token()
+        tmpname = self.filename + '.tmp'
+        records = [(token, 0)]
+        with open(self.filename, 'rb') as fd, open(tmpname, 'wb') as out:
+            out.write(header_line(token, self._nextid))
+            for code, offset in lines:
+                fd.seek(offset)
+                records.append((code, out.tell()))
+                out.write(fd.readline())
+        os.replace(tmpname, self.filename)
+        self._write_index(records, 'wb')
+        self._reset()
+        self._sync()
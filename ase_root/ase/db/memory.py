@@ -0,0 +1,587 @@
+"""In-memory query engine for read-only catalogues.
+
+The searchable values of all rows (the scalar columns of the systems
+table, the key-value pairs and the number of atoms of each element) are
+loaded into NumPy arrays once.  Selections are then evaluated as
+vectorized boolean masks and sorted with NumPy instead of running SQL
+subqueries::
+
+    db = connect('lego.db', type='memory')
+    rows = list(db.select('mace_energy<-8', sort='topology', limit=25))
+
+Only the rows that are returned are read from the underlying database.
+Selections, sorting and keyset pagination give the same results as the
+SQLite backend.  Writes go to the underlying database and the arrays are
+reloaded when the database file changes.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ase.db.cache import database_version
+from ase.db.core import (
+    Database,
+    invop,
+    normalize_sort,
+    ops,
+    parse_selection,
+    reserved_keys,
+)
+from ase.db.similarity import split_similar_to
+from ase.db.sqlite import SQLite3Database, systems_columns
+
+# Scalar columns (SQL names) that can be filtered and sorted on:
+text_columns = ['username', 'calculator', 'unique_id']
+number_columns = ['id', 'natoms', 'energy', 'free_energy', 'magmom',
+                  'charge', 'volume', 'mass', 'fmax', 'smax', 'ctime',
+                  'mtime', 'pbc']
+
+# Keys of parse_selection() comparisons that are systems columns:
+column_keys = ['id', 'energy', 'magmom', 'ctime', 'user', 'calculator',
+               'natoms', 'pbc', 'unique_id', 'fmax', 'smax', 'volume',
+               'mass', 'charge']
+
+# Sort keys that are systems columns:
+sort_columns = ['id', 'energy', 'username', 'calculator', 'ctime', 'mtime',
+                'magmom', 'pbc', 'fmax', 'smax', 'volume', 'mass', 'charge',
+                'natoms']
+
+
+class Snapshot:
+    """Searchable values of all rows as NumPy arrays.
+
+    All arrays have one entry per row, in the order of the ids.  Missing
+    numbers are NaN and missing strings are None.
+
+    ids: ndarray of int
+        Sorted row ids.
+    columns: dict
+        Scalar columns of the systems table.
+    constraints: ndarray of bool
+        Rows with constraints.
+    numbers, texts: dict
+        Numeric and string values of the key-value pairs.
+    species: ndarray of int
+        Number of atoms of element Z (column zindex[Z]) for each row.
+    """
+
+    def __init__(self, ids, columns, constraints, numbers, texts, species,
+                 zindex):
+        self.ids = ids
+        self.columns = columns
+        self.constraints = constraints
+        self.numbers = numbers
+        self.texts = texts
+        self.species = species
+        self.zindex = zindex
+        self._codes: Dict[Tuple[str, str], Tuple] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def codes(self, table, key):
+        """Sort codes for string values (and the sorted strings).
+
+        Missing values are NaN."""
+        codes = self._codes.get((table, key))
+        if codes is None:
+            values = (self.columns[key] if table == 'systems'
+                      else self.texts[key])
+            present = values != None  # noqa: E711
+            strings, inverse = np.unique(values[present].astype(str),
+                                         return_inverse=True)
+            code = np.full(len(values), np.nan)
+            code[present] = inverse
+            codes = (code, strings)
+            self._codes[(table, key)] = codes
+        return codes
+
+    def text_position(self, table, key, value):
+        """Position of a string among the sort codes of a text column.
+
+        Strings that are not in the column get a position half way
+        between the codes of their neighbours."""
+        _, strings = self.codes(table, key)
+        i = np.searchsorted(strings, value)
+        if i < len(strings) and strings[i] == value:
+            return float(i)
+        return i - 0.5
+
+
+def snapshot_from_sqlite(db: SQLite3Database) -> Snapshot:
+    """Read arrays straight from the tables of an SQLite database."""
+    names = number_columns + text_columns
+    with db.managed_connection() as con:
+        n = con.execute('SELECT COUNT(*) FROM systems').fetchone()[0]
+        columns = {name: np.full(n, np.nan) for name in number_columns}
+        columns.update({name: np.empty(n, object) for name in text_columns})
+        constraints = np.zeros(n, bool)
+        cur = con.execute(
+            f'SELECT {", ".join(names)}, constraints IS NOT NULL '
+            'FROM systems ORDER BY id')
+        i = 0
+        while True:
+            results = cur.fetchmany(100_000)
+            if not results:
+                break
+            values = list(zip(*results))
+            m = len(results)
+            for name, column in zip(names, values):
+                if name in text_columns:
+                    columns[name][i:i + m] = column
+                else:
+                    columns[name][i:i + m] = np.array(column, dtype=float)
+            constraints[i:i + m] = values[-1]
+            i += m
+        ids = columns['id'].astype(np.int64)
+
+        def positions(table, key):
+            results = con.execute(
+                f'SELECT id, value FROM {table} WHERE key=?',
+                [key]).fetchall()
+            found = np.fromiter((id for id, _ in results), np.int64,
+                                len(results))
+            return np.searchsorted(ids, found), results
+
+        numbers = {}
+        texts = {}
+        for key, in con.execute(
+                'SELECT DISTINCT key FROM number_key_values').fetchall():
+            where, results = positions('number_key_values', key)
+            values = np.full(n, np.nan)
+            values[where] = [value for _, value in results]
+            numbers[key] = values
+        for key, in con.execute(
+                'SELECT DISTINCT key FROM text_key_values').fetchall():
+            where, results = positions('text_key_values', key)
+            values = np.empty(n, object)
+            values[where] = [value for _, value in results]
+            texts[key] = values
+
+        counts = np.array(con.execute('SELECT id, Z, n FROM species')
+                          .fetchall(), dtype=np.int64).reshape((-1, 3))
+
+    Z = np.unique(counts[:, 1])
+    species = np.zeros((n, len(Z)), np.int32)
+    species[np.searchsorted(ids, counts[:, 0]),
+            np.searchsorted(Z, counts[:, 1])] = counts[:, 2]
+    zindex = {int(z): j for j, z in enumerate(Z)}
+    return Snapshot(ids, columns, constraints, numbers, texts, species,
+                    zindex)
+
+
+def snapshot_from_rows(db: Database) -> Snapshot:
+    """Collect arrays from the rows of any database."""
+    rows = sorted(db.select(include_data=False), key=lambda row: row.id)
+    n = len(rows)
+    columns = {}
+    for name in number_columns + text_columns:
+        if name == 'pbc':
+            values = [int(np.dot(row.pbc, [1, 2, 4])) for row in rows]
+        else:
+            key = 'user' if name == 'username' else name
+            values = [row.get(key) for row in rows]
+        if name in text_columns:
+            columns[name] = np.array(values + [None], dtype=object)[:-1]
+        else:
+            columns[name] = np.array(values, dtype=float).reshape(n)
+    constraints = np.array([bool(row._constraints) for row in rows],
+                           dtype=bool).reshape(n)
+    numbers: Dict[str, np.ndarray] = {}
+    texts: Dict[str, np.ndarray] = {}
+    counts = {}
+    for i, row in enumerate(rows):
+        for key, value in row.key_value_pairs.items():
+            if isinstance(value, str):
+                if key not in texts:
+                    texts[key] = np.empty(n, object)
+                texts[key][i] = value
+            else:
+                if key not in numbers:
+                    numbers[key] = np.full(n, np.nan)
+                numbers[key][i] = float(value)
+        for z, m in zip(*np.unique(row.numbers, return_counts=True)):
+            counts.setdefault(int(z), np.zeros(n, np.int32))[i] = m
+    zindex = {z: j for j, z in enumerate(sorted(counts))}
+    species = np.zeros((n, len(zindex)), np.int32)
+    for z, j in zindex.items():
+        species[:, j] = counts[z]
+    ids = columns['id'].astype(np.int64)
+    return Snapshot(ids, columns, constraints, numbers, texts, species,
+                    zindex)
+
+
+def kv_column(numbers, texts):
+    """Masked array of numbers and strings (missing: NaN and None)."""
+    mask = np.isnan(numbers)
+    if texts is not None:
+        mask &= texts == None  # noqa: E711
+    present = numbers[~np.isnan(numbers)]
+    # All numbers are stored as REAL:
+    integers = (np.isfinite(present).all() and
+                (present == np.round(present)).all())
+    if texts is not None and (texts != None).any():  # noqa: E711
+        values = texts.copy()
+        ok = ~np.isnan(numbers)
+        values[ok] = (numbers[ok].astype(np.int64) if integers
+                      else numbers[ok]).tolist()
+    elif integers:
+        values = np.where(mask, 0, numbers).astype(np.int64)
+    else:
+        values = numbers
+    return np.ma.MaskedArray(values, mask=mask)
+
+
+class MemoryDatabase(Database):
+    type = 'memory'
+
+    def __init__(self, filename, create_indices=True, use_lock_file=True,
+                 serial=False, **kwargs):
+        """In-memory query engine on top of another database.
+
+        filename: str or Database
+            Database (file) to load.  The type is guessed from the name.
+        """
+        if isinstance(filename, Database):
+            source = filename
+        else:
+            from ase.db import connect
+            source = connect(filename, create_indices=create_indices,
+                             use_lock_file=use_lock_file, serial=serial,
+                             **kwargs)
+        Database.__init__(self, source.filename, serial=serial)
+        self.source = source
+        self._snapshot: Optional[Snapshot] = None
+        self._version: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Backend specific methods of the underlying database:
+        if name == 'source':
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def __enter__(self):
+        self.source.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.source.__exit__(exc_type, exc_value, tb)
+        self._snapshot = None
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """Arrays for the current contents of the database."""
+        version = database_version(self.source)
+        snapshot = self._snapshot
+        if snapshot is None or version is None or version != self._version:
+            with self._lock:
+                if (self._snapshot is None or version is None or
+                        version != self._version):
+                    self._snapshot = self.load()
+                    self._version = version
+                snapshot = self._snapshot
+        return snapshot
+
+    def load(self) -> Snapshot:
+        if (isinstance(self.source, SQLite3Database) and
+                self.source.type == 'db'):
+            return snapshot_from_sqlite(self.source)
+        return snapshot_from_rows(self.source)
+
+    # Writing goes to the underlying database:
+
+    def write(self, *args, **kwargs):
+        self._snapshot = None
+        return self.source.write(*args, **kwargs)
+
+    def write_many(self, *args, **kwargs):
+        self._snapshot = None
+        return self.source.write_many(*args, **kwargs)
+
+    def reserve(self, **key_value_pairs):
+        self._snapshot = None
+        return self.source.reserve(**key_value_pairs)
+
+    def update(self, *args, **kwargs):
+        self._snapshot = None
+        return self.source.update(*args, **kwargs)
+
+    def _update_key_value_pairs(self, updates):
+        self._snapshot = None
+        self.source._update_key_value_pairs(updates)
+
+    def update_many(self, *args, **kwargs):
+        self._snapshot = None
+        return self.source.update_many(*args, **kwargs)
+
+    def delete(self, ids):
+        self._snapshot = None
+        self.source.delete(ids)
+
+    @property
+    def metadata(self):
+        return self.source.metadata
+
+    @metadata.setter
+    def metadata(self, dct):
+        self.source.metadata = dct
+
+    def get_all_key_names(self):
+        snapshot = self.snapshot
+        return set(snapshot.numbers) | set(snapshot.texts)
+
+    def _key_stats(self):
+        return self.source._key_stats()
+
+    def _read_fingerprints(self, parameters):
+        return self.source._read_fingerprints(parameters)
+
+    def _write_fingerprints(self, ids, vectors, parameters):
+        self.source._write_fingerprints(ids, vectors, parameters)
+
+    def _mask(self, snapshot, keys, cmps):
+        """Boolean mask of the selected rows."""
+        n = len(snapshot)
+        columns = snapshot.columns
+        mask = np.ones(n, bool)
+
+        def present(key):
+            values = snapshot.numbers.get(key)
+            found = (np.zeros(n, bool) if values is None
+                     else ~np.isnan(values))
+            values = snapshot.texts.get(key)
+            if values is not None:
+                found |= values != None  # noqa: E711
+            return found
+
+        for key in keys:
+            if key == 'forces':
+                mask &= ~np.isnan(columns['fmax'])
+            elif key == 'strain':
+                mask &= ~np.isnan(columns['smax'])
+            elif key in ['energy', 'fmax', 'smax']:
+                mask &= ~np.isnan(columns[key])
+            elif key == 'calculator':
+                mask &= columns[key] != None  # noqa: E711
+            elif key == 'constraints':
+                mask &= snapshot.constraints
+            elif '-' in key:
+                mask &= ~present(key.replace('-', ''))
+            else:
+                mask &= present(key)
+
+        # Special handling of "H=0" and "H<2" type of selections:
+        bad = {}
+        for key, op, value in cmps:
+            if isinstance(key, int):
+                bad[key] = bad.get(key, True) and ops[op](0, value)
+
+        for key, op, value in cmps:
+            if key in column_keys:
+                if key == 'user':
+                    key = 'username'
+                elif key == 'pbc':
+                    assert op in ['=', '!=']
+                    value = int(np.dot([x == 'T' for x in value], [1, 2, 4]))
+                if key in text_columns and isinstance(value, str):
+                    mask &= compare_text(snapshot, 'systems', key, op, value)
+                else:
+                    mask &= compare(columns[key], op, value)
+            elif isinstance(key, int):
+                j = snapshot.zindex.get(key)
+                counts = (np.zeros(n, np.int32) if j is None
+                          else snapshot.species[:, j])
+                if bad[key]:
+                    mask &= ~((counts > 0) & ops[invop[op]](counts, value))
+                else:
+                    mask &= (counts > 0) & ops[op](counts, value)
+            elif isinstance(value, str):
+                if key in snapshot.texts:
+                    mask &= compare_text(snapshot, 'text_key_values', key,
+                                         op, value)
+                else:
+                    mask[:] = False
+            else:
+                values = snapshot.numbers.get(key)
+                if values is None:
+                    mask[:] = False
+                else:
+                    mask &= compare(values, op, float(value))
+        return mask
+
+    def _sort_values(self, snapshot, mask, keys, sort):
+        """Sort values, table name and rows that come after sorted rows.
+
+        Returns float array of sort values (NaN for rows that do not have
+        a value), 'systems' or the name of the key-value table and a
+        mask of the rows that have no value but are still selected."""
+        columns = snapshot.columns
+        if sort in sort_columns:
+            table = 'systems'
+            if sort in text_columns:
+                values, _ = snapshot.codes(table, sort)
+            else:
+                values = columns[sort]
+            return values, table, np.isnan(values) & mask
+
+        numbers = snapshot.numbers.get(sort)
+        texts = snapshot.texts.get(sort)
+        # Use the type of the value in the first row that has the key:
+        rows = self._mask(snapshot, keys + [sort], [])
+        table = 'number_key_values'
+        if rows.any() and texts is not None:
+            first = np.argmax(rows)
+            if texts[first] is not None:
+                table = 'text_key_values'
+        if table == 'text_key_values':
+            values, _ = snapshot.codes(table, sort)
+        elif numbers is not None:
+            values = numbers
+        else:
+            values = np.full(len(snapshot), np.nan)
+        missing = mask & ~self._mask(snapshot, [sort], [])
+        return values, table, missing
+
+    def _cursor_value(self, snapshot, table, sort, value):
+        """Position of a cursor value among the sort values."""
+        if table == 'number_key_values' or (table == 'systems' and
+                                            sort not in text_columns):
+            return float(value)
+        return snapshot.text_position(table, sort, value)
+
+    def _ordered_positions(self, keys, cmps, sort=None, after=None,
+                           nmax=None):
+        """Indices into the snapshot arrays of the selected rows in order.
+
+        Only the first nmax are guaranteed to be correct."""
+        snapshot = self.snapshot
+        mask = self._mask(snapshot, keys, cmps)
+        if after is not None and not sort:
+            sort = 'id'
+        if not sort:
+            return np.nonzero(mask)[0]
+
+        descending = sort[0] == '-'
+        sort = sort.lstrip('-')
+        values, table, missing = self._sort_values(snapshot, mask, keys, sort)
+        # (Rows with a value of the other type are left out like in the
+        # SQLite backend)
+        ranked = mask & ~np.isnan(values)
+
+        ids = snapshot.ids
+        if after is not None:
+            value, id = after
+            if value is None:
+                ranked[:] = False
+                missing &= ids > id
+            else:
+                x = self._cursor_value(snapshot, table, sort, value)
+                op = np.less if descending else np.greater
+                ranked &= op(values, x) | ((values == x) & (ids > id))
+
+        candidates = np.nonzero(ranked)[0]
+        x = -values[candidates] if descending else values[candidates]
+        if nmax is not None and nmax < len(candidates):
+            # Keep the nmax smallest (and all that are equal to the last):
+            last = np.partition(x, nmax - 1)[nmax - 1]
+            keep = x <= last
+            candidates = candidates[keep]
+            x = x[keep]
+        # Stable sort, so that rows with the same value are ordered by id:
+        order = candidates[np.argsort(x, kind='stable')]
+        return np.concatenate([order, np.nonzero(missing)[0]])
+
+    def _select(self, keys, cmps, explain=False, verbosity=0,
+                limit=None, offset=0, sort=None, include_data=True,
+                columns='all', after=None, batch_size=None):
+        if explain:
+            yield {'explain': (0, 0, 0,
+                               f'SCAN {len(self.snapshot)} ROWS IN MEMORY')}
+            return
+        nmax = offset + limit if limit else None
+        positions = self._ordered_positions(keys, cmps, sort, after, nmax)
+        positions = (positions[offset:offset + limit] if limit
+                     else positions[offset:])
+        ids = self.snapshot.ids[positions]
+        yield from self.source._get_rows(ids.tolist(),
+                                         include_data=include_data,
+                                         columns=columns)
+
+    def _select_ids(self, keys, cmps, sort=None, limit=None):
+        positions = self._ordered_positions(keys, cmps, sort, nmax=limit)
+        return self.snapshot.ids[positions[:limit]].tolist()
+
+    def _read_data(self, ids, keys):
+        return self.source._read_data(ids, keys)
+
+    def _get_rows(self, ids, include_data=True, columns='all'):
+        return self.source._get_rows(ids, include_data=include_data,
+                                     columns=columns)
+
+    def count(self, selection=None, **kwargs):
+        keys, cmps = parse_selection(selection, **kwargs)
+        _, cmps = split_similar_to(cmps)
+        return int(self._mask(self.snapshot, keys, cmps).sum())
+
+    def select_columns(self, keys, selection=None, sort=None, limit=None,
+                       offset=0, **kwargs):
+        keys = list(keys)
+        if any(key in reserved_keys and key not in systems_columns
+               for key in keys):
+            return Database.select_columns(self, keys, selection, sort=sort,
+                                           limit=limit, offset=offset,
+                                           **kwargs)
+        selkeys, cmps = parse_selection(selection, **kwargs)
+        if split_similar_to(cmps)[0] is not None:
+            return Database.select_columns(self, keys, selection, sort=sort,
+                                           limit=limit, offset=offset,
+                                           **kwargs)
+        nmax = offset + limit if limit else None
+        positions = self._ordered_positions(selkeys, cmps,
+                                            normalize_sort(sort),
+                                            nmax=nmax)
+        positions = (positions[offset:offset + limit] if limit
+                     else positions[offset:])
+        snapshot = self.snapshot
+        result = {}
+        for key in ['id'] + keys:
+            if key in systems_columns:
+                name, dtype = systems_columns[key]
+                values = snapshot.columns[name][positions]
+                if dtype is object:
+                    mask = values == None  # noqa: E711
+                else:
+                    mask = np.isnan(values)
+                    if dtype == np.int64:
+                        values = np.where(mask, 0, values).astype(np.int64)
+                result[key] = np.ma.MaskedArray(values, mask=mask)
+            else:
+                numbers = snapshot.numbers.get(key)
+                if numbers is None:
+                    numbers = np.full(len(snapshot), np.nan)
+                texts = snapshot.texts.get(key)
+                result[key] = kv_column(
+                    numbers[positions],
+                    None if texts is None else texts[positions])
+        return result
+
+
+def compare(values, op, value):
+    """Vectorized "values op value" that is False for missing values."""
+    if values.dtype == object:
+        present = values != None  # noqa: E711
+        result = np.zeros(len(values), bool)
+        result[present] = ops[op](values[present], value)
+        return result
+    if isinstance(value, str):
+        return np.zeros(len(values), bool)
+    with np.errstate(invalid='ignore'):
+        return ops[op](values, value) & ~np.isnan(values)
+
+
+def compare_text(snapshot, table, key, op, value):
+    """Compare strings using their sort codes."""
+    codes, _ = snapshot.codes(table, key)
+    return compare(codes, op, snapshot.text_position(table, key, value))
@@ -0,0 +1,327 @@
+"""Timing of requests and SQL queries for the database web app.
+
+Metrics are off by default.  Turn them on with enable() or by setting the
+ASE_DB_METRICS environment variable before the app is created::
+
+    $ ASE_DB_METRICS=1 ASE_DB_SLOW_QUERY_TIME=0.1 \\
+          ASE_DB_SLOW_QUERY_LOG=/tmp/slow.log \\
+          gunicorn "ase.db.app:create_app('abc.db')"
+
+The app then has a /metrics page in Prometheus' text format with:
+
+* latency histograms for each route (Flask endpoint) and for rendering
+  each template
+* number of responses for each route and status code (304's are
+  responses served from the browser's cache)
+* number of SQL queries, time spent and rows returned for each query of
+  the SQLite backend with numbers taken out (LIMIT 25 -> LIMIT ?) and a
+  latency histogram for all queries
+* hits and misses of the query caches (see ase.db.cache) and number of
+  open sessions
+
+Queries that take longer than slow_query_time are written to the slow
+query log together with their EXPLAIN QUERY PLAN output.
+
+Each worker process has its own numbers.  Streamed responses (/export/)
+are timed until the response starts.
+
+When metrics are off, the only cost is a check of the module variable
+"recorder" for each SQL query.
+"""
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# The Metrics object that is collecting (None means off):
+recorder: Optional['Metrics'] = None
+
+# Upper bounds of histogram buckets in seconds:
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Largest number of different SQL statements to keep numbers for:
+MAX_STATEMENTS = 500
+
+
+def normalize_sql(sql: str) -> str:
+    """Take numbers and lists of placeholders out of SQL statement."""
+    sql = re.sub(r'\b(LIMIT|OFFSET) -?\d+', r'\1 ?', sql)
+    sql = re.sub(r'\?(, \?)+', '...', sql)
+    return ' '.join(sql.split())
+
+
+def escape(value) -> str:
+    """Label value for text format."""
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def labels(names, values, le=None) -> str:
+    """Labels in curly brackets (empty string if there are none)."""
+    items = [f'{name}="{escape(value)}"'
+             for name, value in zip(names, values)]
+    if le is not None:
+        items.append(f'le="{le}"')
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values: Dict[Tuple, list] = {}  # labels -> [counts, sum]
+
+    def observe(self, labelvalues, seconds):
+        counts, total = self.values.get(labelvalues, (None, 0.0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self.values[labelvalues] = [counts, total + seconds]
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labelvalues, (counts, total) in sorted(self.values.items()):
+            n = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                n += count
+                lbl = labels(self.labelnames, labelvalues, bound)
+                yield f'{self.name}_bucket{lbl} {n}'
+            lbl = labels(self.labelnames, labelvalues)
+            yield f'{self.name}_sum{lbl} {total:.6f}'
+            yield f'{self.name}_count{lbl} {n}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames, type='counter'):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.type = type
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, labelvalues, amount=1):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.type}'
+        for labelvalues, value in sorted(self.values.items()):
+            lbl = labels(self.labelnames, labelvalues)
+            if isinstance(value, float):
+                value = f'{value:.6f}'
+            yield f'{self.name}{lbl} {value}'
+
+
+class Metrics:
+    """Collection of request, template and query metrics.
+
+    slow_query_time: float
+        Queries that take longer than this (in seconds) are written to
+        slow_query_log.  Default is to not log queries.
+    slow_query_log: str, Path or file object
+        Default is sys.stderr.
+    """
+
+    def __init__(self, slow_query_time=None, slow_query_log=None):
+        self.slow_query_time = slow_query_time
+        self.slow_query_log = slow_query_log
+        self.lock = threading.Lock()
+        self.requests = Histogram('ase_db_request_seconds',
+                                  'Time spent handling requests.',
+                                  ('route',))
+        self.responses = Counter('ase_db_responses_total',
+                                 'Responses sent.', ('route', 'status'))
+        self.renders = Histogram('ase_db_render_seconds',
+                                 'Time spent rendering templates.',
+                                 ('template',))
+        self.query_latency = Histogram('ase_db_query_seconds',
+                                       'Time spent in SQL queries.', ())
+        self.queries = Counter('ase_db_sql_queries_total',
+                               'SQL queries executed.', ('sql',))
+        self.query_time = Counter('ase_db_sql_seconds_total',
+                                  'Time spent executing and fetching.',
+                                  ('sql',))
+        self.query_rows = Counter('ase_db_sql_rows_total',
+                                  'Rows returned.', ('sql',))
+        self.statements: Dict[str, str] = {}  # SQL -> normalized SQL
+
+    def observe_request(self, route, status, seconds):
+        with self.lock:
+            self.requests.observe((route,), seconds)
+            self.responses.inc((route, str(status)))
+
+    def observe_render(self, template, seconds):
+        with self.lock:
+            self.renders.observe((template,), seconds)
+
+    def query(self, cur, sql, args, fetch):
+        """Execute query and yield batches of results from fetch().
+
+        Time spent in SQLite and the number of rows are recorded when the
+        iteration stops."""
+        t0 = time.perf_counter()
+        cur.execute(sql, args)
+        seconds = time.perf_counter() - t0
+        nrows = 0
+        try:
+            batches = fetch()
+            while True:
+                t0 = time.perf_counter()
+                results = next(batches, None)
+                seconds += time.perf_counter() - t0
+                if results is None:
+                    break
+                nrows += len(results)
+                yield results
+        finally:
+            self.observe_query(cur.connection, sql, args, seconds, nrows)
+
+    def observe_query(self, con, sql, args, seconds, nrows):
+        with self.lock:
+            key = self.statements.get(sql)
+            if key is None:
+                key = normalize_sql(sql)
+                if len(self.statements) < MAX_STATEMENTS:
+                    self.statements[sql] = key
+                elif (key,) not in self.queries.values:
+                    key = 'other'
+            self.query_latency.observe((), seconds)
+            self.queries.inc((key,))
+            self.query_time.inc((key,), seconds)
+            self.query_rows.inc((key,), nrows)
+        if (self.slow_query_time is not None and
+                seconds >= self.slow_query_time):
+            self.log_slow_query(con, sql, args, seconds, nrows)
+
+    def log_slow_query(self, con, sql, args, seconds, nrows):
+        try:
+            plan = [detail for _, _, _, detail in
+                    con.execute('EXPLAIN QUERY PLAN ' + sql, args)]
+        except sqlite3.Error as ex:
+            plan = [f'({ex})']
+        lines = [time.strftime('# %Y-%m-%d %H:%M:%S ') +
+                 f'{seconds:.3f} s, {nrows} rows',
+                 sql.strip(),
+                 f'args: {list(args)}',
+                 'plan:',
+                 *('    ' + detail for detail in plan),
+                 '']
+        txt = '\n'.join(lines) + '\n'
+        log = self.slow_query_log
+        with self.lock:
+            if log is None:
+                sys.stderr.write(txt)
+            elif isinstance(log, (str, Path)):
+                with open(log, 'a') as fd:
+                    fd.write(txt)
+            else:
+                log.write(txt)
+                log.flush()
+
+    def text(self, projects=None, sessions=None) -> str:
+        """Metrics in Prometheus' text format.
+
+        projects: dict
+            Projects of the app (for the query cache numbers).
+        sessions: int
+            Number of open sessions."""
+        gauges = []
+        if projects:
+            hits = Counter('ase_db_query_cache_hits_total',
+                           'Queries answered from the query cache.',
+                           ('project',))
+            misses = Counter('ase_db_query_cache_misses_total',
+                             'Queries not in the query cache.',
+                             ('project',))
+            for name, project in projects.items():
+                cache = getattr(project.database, 'cache', None)
+                if cache is not None:
+                    hits.inc((name,), cache.hits)
+                    misses.inc((name,), cache.misses)
+            gauges += [hits, misses]
+        if sessions is not None:
+            gauge = Counter('ase_db_sessions', 'Open sessions.', (),
+                            type='gauge')
+            gauge.inc((), sessions)
+            gauges.append(gauge)
+        with self.lock:
+            lines = [line
+                     for metric in [self.requests, self.responses,
+                                    self.renders, self.query_latency,
+                                    self.queries, self.query_time,
+                                    self.query_rows, *gauges]
+                     for line in metric.lines()]
+        return '\n'.join(lines) + '\n'
+
+
+def enable(slow_query_time=None, slow_query_log=None) -> Metrics:
+    """Start collecting metrics."""
+    global recorder
+    recorder = Metrics(slow_query_time, slow_query_log)
+    return recorder
+
+
+def disable() -> None:
+    global recorder
+    recorder = None
+
+
+def enable_from_environment() -> Optional[Metrics]:
+    """Enable metrics if ASE_DB_METRICS is set (and not already on)."""
+    if recorder is None and os.environ.get('ASE_DB_METRICS'):
+        slow = os.environ.get('ASE_DB_SLOW_QUERY_TIME')
+        enable(None if slow is None else float(slow),
+               os.environ.get('ASE_DB_SLOW_QUERY_LOG'))
+    return recorder
+
+
+def instrument(app, projects, metrics: Metrics) -> None:
+    """Time requests and templates of Flask app and add /metrics route."""
+    from flask import before_render_template, g, request, template_rendered
+
+    from ase.db.web import Session
+
+    @app.before_request
+    def start_timer():
+        g.ase_db_t0 = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        t0 = g.pop('ase_db_t0', None)
+        if t0 is not None:
+            metrics.observe_request(request.endpoint or 'none',
+                                    response.status_code,
+                                    time.perf_counter() - t0)
+        return response
+
+    def start_render(sender, template, context, **kwargs):
+        g.ase_db_render_t0 = time.perf_counter()
+
+    def stop_render(sender, template, context, **kwargs):
+        t0 = g.pop('ase_db_render_t0', None)
+        if t0 is not None:
+            metrics.observe_render(template.name or 'string',
+                                   time.perf_counter() - t0)
+
+    # (weak=False: the functions above would be garbage collected)
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(stop_render, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics_page():
+        txt = metrics.text(projects, len(Session.store))
+        return txt, 200, [('Content-Type',
+                           'text/plain; version=0.0.4; charset=utf-8')]
@@ -91,6 +91,9 @@ class MySQLCursor:
     def fetchall(self):
         return self.cur.fetchall()
 
+    def fetchmany(self, size):
+        return self.cur.fetchmany(size)
+
     def _replace_nan_inf_kvp(self, values):
         for item in values:
             if not np.isfinite(item[1]):
@@ -227,9 +230,9 @@ class MySQLDatabase(SQLite3Database):
 
     def create_select_statement(self, keys, cmps,
                                 sort=None, order=None, sort_table=None,
-                                what='systems.*'):
+                                what='systems.*', after=None):
         sql, value = super().create_select_statement(
-            keys, cmps, sort, order, sort_table, what)
+            keys, cmps, sort, order, sort_table, what, after)
 
         for subst in MySQLCursor.sql_replace:
             sql = sql.replace(subst[0], subst[1])
@@ -154,11 +154,20 @@ class AtomsRow:
     @property
     def data(self):
         """Data dict."""
+        from ase.db.core import LazyData
         if isinstance(self._data, str):
             self._data = decode(self._data)  # lazy decoding
         elif isinstance(self._data, bytes):
-            from ase.db.core import bytes_to_object
-            self._data = bytes_to_object(self._data)  # lazy decoding
+            # Entries are decoded one at a time when used:
+            self._data = LazyData(self._data)
+        if isinstance(self._data, LazyData):
+            # One copy per row, so that each entry is decoded only once
+            # (changes to the copy do not change what db.write(row) writes):
+            data, copy = self.__dict__.get('_data_copy', (None, None))
+            if data is not self._data:
+                copy = self._data.copy()
+                self._data_copy = (self._data, copy)
+            return copy
         return FancyDict(self._data)
 
     @property
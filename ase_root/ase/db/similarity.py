@@ -0,0 +1,221 @@
+"""Search for structures that are similar to a given one.
+
+Add similar_to=<id> to a selection to get the selected rows in order of
+decreasing similarity to the structure of row <id>.  The rows get a
+"similarity" value (1 for identical fingerprints)::
+
+    for row in db.select('similar_to=42,natoms<10', limit=10):
+        print(row.id, row.similarity)
+
+Use sort='-similarity' (or no sort) and keyset_cursor(row, '-similarity')
+for paging.  Other sort orders are not allowed with similar_to.
+
+Similarity is the cosine of the angle between fingerprints.  The
+fingerprint is Oganov's fingerprint function (as in
+ase.ga.ofp_comparator.OFPComparator) for all pairs of elements together,
+weighted by the number of atoms.  That is the same as g(R) - 1, where g
+is the Gaussian-smeared radial distribution function on a fixed grid of
+R values.  It does not see which element an atom is, so add formula or
+element criteria to the selection to compare only like compositions.
+
+The fingerprints of all rows are kept in memory as one matrix
+(SimilarityIndex).  A query is then a matrix-vector product and a partial
+sort, and never needs the Atoms objects.  SQLite files store the
+fingerprints in a "fingerprints" table, so they are only computed once::
+
+    $ ase db abc.db --index-fingerprints
+
+Triggers remove a row's fingerprint when the row is deleted or its
+structure changes.  Read-only files without the table, and the other
+backends, compute the fingerprints in memory for the first similarity
+query.
+"""
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Cutoff radius (Angstrom), number of bins and Gaussian smearing (Angstrom)
+# of the fingerprints:
+parameters = {'rmax': 6.0, 'nbins': 60, 'sigma': 0.1}
+
+# Distances are put on a grid this fine (Angstrom) before smearing:
+FINE = 0.01
+
+
+def split_similar_to(cmps) -> Tuple[Optional[int], list]:
+    """Take similar_to=<id> out of comparisons from parse_selection().
+
+    Returns the id (None if not there) and the other comparisons."""
+    target = None
+    rest = []
+    for key, op, value in cmps:
+        if key == 'similar_to':
+            if op != '=' or not isinstance(value, int):
+                raise ValueError('Use similar_to=<id>')
+            target = value
+        else:
+            rest.append((key, op, value))
+    return target, rest
+
+
+def pair_distances(atoms, cutoff: float) -> np.ndarray:
+    """Distances (< cutoff) between all pairs of atoms, both ways.
+
+    Small structures are done with all lattice translations in one go,
+    which is much faster than ase.neighborlist when the cutoff is larger
+    than the cell."""
+    from ase.neighborlist import neighbor_list
+
+    positions = atoms.positions
+    cell = atoms.cell.complete()
+    repeats = np.where(atoms.pbc,
+                       np.ceil(cutoff * np.linalg.norm(
+                           np.linalg.inv(cell), axis=0)), 0).astype(int)
+    ntranslations = np.prod(2 * repeats + 1)
+    if len(atoms)**2 * ntranslations > 2_000_000:
+        return neighbor_list('d', atoms, cutoff)
+    ranges = [np.arange(-n, n + 1) for n in repeats]
+    translations = np.array(np.meshgrid(*ranges, indexing='ij'))
+    translations = translations.reshape(3, -1).T @ cell
+    vectors = (positions[np.newaxis, :, np.newaxis] -
+               positions[:, np.newaxis, np.newaxis] + translations)
+    d = np.sqrt((vectors**2).sum(axis=-1))
+    # Remove each atom's distance to itself:
+    d[np.arange(len(atoms)), np.arange(len(atoms)), ntranslations // 2] = 0
+    return d[(d > 0) & (d < cutoff)]
+
+
+@lru_cache()
+def smearing(rmax: float, nbins: int, sigma: float) -> np.ndarray:
+    """Matrix that turns a histogram of distances on a fine grid into the
+    Gaussian-smeared histogram with nbins bins up to rmax."""
+    from scipy.special import erf
+
+    edges = np.linspace(0.0, rmax, nbins + 1)
+    fine = np.arange(0.0, rmax + 4 * sigma, FINE) + 0.5 * FINE
+    cdf = erf((edges - fine[:, np.newaxis]) / (sigma * 2**0.5))
+    return 0.5 * (cdf[:, 1:] - cdf[:, :-1])
+
+
+def fingerprint(atoms, rmax=6.0, nbins=60, sigma=0.1) -> np.ndarray:
+    """Fingerprint of structure as unit vector (float32) of length nbins."""
+    natoms = len(atoms)
+    matrix = smearing(rmax, nbins, sigma)
+    hist = np.zeros(nbins)
+    if natoms > 0:
+        distances = pair_distances(atoms, rmax + 4 * sigma)
+        counts = np.bincount((distances / FINE).astype(int),
+                             minlength=len(matrix))
+        hist = counts[:len(matrix)] @ matrix
+    edges = np.linspace(0.0, rmax, nbins + 1)
+    r = 0.5 * (edges[1:] + edges[:-1])
+    shell = 4 * np.pi * r**2 * (rmax / nbins)
+    volume = abs(np.linalg.det(atoms.cell)) if atoms.pbc.all() else 0.0
+    if volume > 0:
+        fp = hist * volume / (shell * natoms**2) - 1
+    else:
+        # No density to compare with:
+        fp = hist / (shell * max(natoms, 1))
+    norm = np.linalg.norm(fp)
+    if norm > 0:
+        fp /= norm
+    return fp.astype(np.float32)
+
+
+class SimilarityIndex:
+    """Fingerprints of rows for nearest-neighbour searches.
+
+    ids: ndarray of int
+        Sorted row ids.
+    vectors: ndarray of float32
+        One fingerprint (unit vector) per id.
+    """
+
+    def __init__(self, ids=None, vectors=None, nbins=parameters['nbins']):
+        if ids is None:
+            ids = np.zeros(0, np.int64)
+            vectors = np.zeros((0, nbins), np.float32)
+        self.ids = np.asarray(ids, np.int64)
+        self.vectors = np.asarray(vectors, np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, id: int) -> Optional[np.ndarray]:
+        """Fingerprint of row (None if not indexed)."""
+        i = np.searchsorted(self.ids, id)
+        if i < len(self.ids) and self.ids[i] == id:
+            return self.vectors[i]
+        return None
+
+    def search(self, vector: np.ndarray, ids=None, limit=None,
+               after=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Find rows most similar to fingerprint.
+
+        ids: array of int
+            Only consider these rows (default: all).
+        limit: int
+            Number of rows to return (default: all).
+        after: tuple
+            Keyset cursor (similarity, id): only rows that come after it.
+
+        Returns ids and similarities of rows in order of decreasing
+        similarity (same similarity: increasing id).  Similarities are
+        rounded to 6 decimals so that float32 rounding errors do not
+        decide the order of equal structures."""
+        found = self.ids
+        scores = (self.vectors @ vector).round(6)
+        if ids is not None and len(found) > 0:
+            ids = np.asarray(ids, np.int64)
+            positions = np.searchsorted(found, ids).clip(max=len(found) - 1)
+            positions = positions[found[positions] == ids]
+            found = found[positions]
+            scores = scores[positions]
+        if after is not None:
+            score, id = after
+            mask = (scores < score) | ((scores == score) & (found > id))
+            found = found[mask]
+            scores = scores[mask]
+        if limit is not None and limit < len(found):
+            # Keep all rows that tie with the last one, so that the order
+            # is the same as for a full sort:
+            kth = len(found) - limit
+            mask = scores >= np.partition(scores, kth)[kth]
+            found = found[mask]
+            scores = scores[mask]
+        order = np.lexsort((found, -scores))[:limit]
+        return found[order], scores[order]
+
+
+def update_index(db, index: Optional[SimilarityIndex] = None,
+                 batch_size: int = 1000) -> SimilarityIndex:
+    """Index with fingerprints of all rows of db.
+
+    Fingerprints are taken from those stored in the database (SQLite),
+    from index (an older index for db) or computed (and stored if the
+    database can do that)."""
+    ids = np.sort(np.array(db._select_ids([], []), dtype=np.int64))
+    stored, vectors = db._read_fingerprints(parameters)
+    if stored is not None:
+        index = SimilarityIndex(stored, vectors)
+    elif index is None:
+        index = SimilarityIndex()
+    known = np.isin(index.ids, ids)
+    allids = [index.ids[known]]
+    allvectors = [index.vectors[known]]
+    missing = ids[~np.isin(ids, index.ids)]
+    for i in range(0, len(missing), batch_size):
+        new: Dict[int, np.ndarray] = {
+            row.id: fingerprint(row.toatoms(), **parameters)
+            for row in db._get_rows(missing[i:i + batch_size].tolist(),
+                                    include_data=False)}
+        if new:
+            newids = np.array(list(new), np.int64)
+            newvectors = np.array(list(new.values()))
+            db._write_fingerprints(newids, newvectors, parameters)
+            allids.append(newids)
+            allvectors.append(newvectors)
+    ids = np.concatenate(allids)
+    order = np.argsort(ids)
+    return SimilarityIndex(ids[order], np.concatenate(allvectors)[order])
@@ -14,34 +14,63 @@ Versions:
 7) Volume can be None
 8) Added name='metadata' row to "information" table
 9) Row data is now stored in binary format.
+10) Covering (key, value, id) and (Z, n, id) indices and indices on id for
+    the keys, species and key-value tables.
+11) Optional compression of blobs (see ase.db.compression).  Files without
+    compression are still written as version 10.
+
+The key_catalogue table (type, row count and range of every key) is added
+to files of any version the first time they are written to (or by
+"ase db --upgrade"); opening a file to read from it never changes it.
+The catalogue is kept up to date by triggers, so older versions of ASE
+also maintain it.  Triggers also remove stale rows from the fingerprints
+table (see ase.db.similarity).
 """
 
 import json
 import numbers
 import os
+import queue
 import sqlite3
 import sys
 from contextlib import contextmanager
+from pathlib import Path
 
 import numpy as np
 
 import ase.io.jsonio
 from ase.calculators.calculator import all_properties
 from ase.data import atomic_numbers
+from ase.db import metrics
+from ase.db.compression import (
+    FLOAT32,
+    codec_flags,
+    compress,
+    decompress,
+    normalize_codecs,
+)
 from ase.db.core import (
     Database,
     bytes_to_object,
     invop,
     lock,
+    normalize_sort,
     now,
     object_to_bytes,
     ops,
     parse_selection,
+    read_data,
+    reserved_keys,
+    word,
 )
 from ase.db.row import AtomsRow
+from ase.db.similarity import split_similar_to
 from ase.parallel import parallel_function
 
-VERSION = 9
+VERSION = 11
+
+# Version of files without compressed blobs (can be read by older ASE):
+UNCOMPRESSED_VERSION = 10
 
 init_statements = [
     """CREATE TABLE systems (
@@ -113,21 +142,232 @@ index_statements = [
     'CREATE INDEX ctime_index ON systems(ctime)',
     'CREATE INDEX username_index ON systems(username)',
     'CREATE INDEX calculator_index ON systems(calculator)',
-    'CREATE INDEX species_index ON species(Z)',
-    'CREATE INDEX key_index ON keys(key)',
-    'CREATE INDEX text_index ON text_key_values(key)',
-    'CREATE INDEX number_index ON number_key_values(key)']
+    'CREATE INDEX species_index ON species(Z, n, id)',
+    'CREATE INDEX species_id_index ON species(id)',
+    'CREATE INDEX key_index ON keys(key, id)',
+    'CREATE INDEX key_id_index ON keys(id)',
+    'CREATE INDEX text_index ON text_key_values(key, value, id)',
+    'CREATE INDEX text_id_index ON text_key_values(id)',
+    'CREATE INDEX number_index ON number_key_values(key, value, id)',
+    'CREATE INDEX number_id_index ON number_key_values(id)']
+
+# Settings for bulk load mode (not crash safe, but an exception still
+# rolls back the transaction because the journal is kept in memory):
+bulk_pragmas = ['PRAGMA synchronous=OFF',
+                'PRAGMA journal_mode=MEMORY',
+                'PRAGMA cache_size=-262144',  # 256 MB
+                'PRAGMA temp_store=MEMORY']
+
+# ORDER BY ... NULLS LAST (needs SQLite 3.30) lets SQLite walk the
+# (key, value, id) indices when sorting on a key:
+nulls_last = sqlite3.sqlite_version_info >= (3, 30, 0)
+
+# Connection.blobopen() (incremental blob I/O) needs Python 3.11:
+incremental_blobs = hasattr(sqlite3.Connection, 'blobopen')
+
+# Indices from version 9 and earlier that are replaced in version 10:
+old_indices = ['species_index', 'key_index', 'text_index', 'number_index']
 
 all_tables = ['systems', 'species', 'keys',
               'text_key_values', 'number_key_values']
 
 
+def key_catalogue_statements(type):
+    """SQL for triggers that keep the key catalogue up to date.
+
+    type: 'number' or 'text'.  The last statement fills in the catalogue
+    from the existing rows.  Deleting the smallest or largest value of a
+    key marks its range as stale."""
+    table = f'{type}_key_values'
+    return [
+        # (INSERT OR IGNORE + UPDATE instead of an UPSERT, which would
+        # need SQLite 3.24 for anyone writing to the file)
+        f"""CREATE TRIGGER {type}_key_insert AFTER INSERT ON {table} BEGIN
+    INSERT OR IGNORE INTO key_catalogue
+    VALUES (NEW.key, '{type}', 0, NEW.value, NEW.value, 0);
+    UPDATE key_catalogue SET
+    count = count + 1,
+    min_value = min(ifnull(min_value, NEW.value),
+                    ifnull(NEW.value, min_value)),
+    max_value = max(ifnull(max_value, NEW.value),
+                    ifnull(NEW.value, max_value))
+    WHERE key = NEW.key AND type = '{type}';
+    END""",
+
+        f"""CREATE TRIGGER {type}_key_delete AFTER DELETE ON {table} BEGIN
+    UPDATE key_catalogue SET
+    count = count - 1,
+    stale = stale OR ifnull(OLD.value IN (min_value, max_value), 1)
+    WHERE key = OLD.key AND type = '{type}';
+    DELETE FROM key_catalogue
+    WHERE key = OLD.key AND type = '{type}' AND count = 0;
+    END""",
+
+        f"""INSERT INTO key_catalogue
+    SELECT key, '{type}', COUNT(*), MIN(value), MAX(value), 0
+    FROM {table} GROUP BY key"""]
+
+
+catalogue_statements = [
+    """CREATE TABLE key_catalogue (
+    key TEXT,
+    type TEXT,  -- 'number' or 'text'
+    count INTEGER,  -- number of rows with the key
+    min_value,
+    max_value,
+    stale INTEGER,  -- min_value and max_value must be recomputed
+    PRIMARY KEY (key, type))""",
+    *key_catalogue_statements('number'),
+    *key_catalogue_statements('text')]
+
+# Structure fingerprints for similar_to=<id> selections (see
+# ase.db.similarity).  Created by the first similarity query on a
+# writable file:
+fingerprint_statements = [
+    """CREATE TABLE fingerprints (
+    id INTEGER PRIMARY KEY,
+    fingerprint BLOB)  -- float32 unit vector""",
+
+    """CREATE TRIGGER fingerprints_delete AFTER DELETE ON systems BEGIN
+    DELETE FROM fingerprints WHERE id = OLD.id;
+    END""",
+
+    """CREATE TRIGGER fingerprints_update
+    AFTER UPDATE OF numbers, positions, cell, pbc ON systems BEGIN
+    DELETE FROM fingerprints WHERE id = OLD.id;
+    END"""]
+
+# JSON types of values stored in number_key_values and text_key_values:
+json_types = {'REAL': "'integer', 'real', 'true', 'false'",
+              'TEXT': "'text'"}
+
+
+def materialized_column_statements(key, type):
+    """SQL for adding a generated column and indices for a key.
+
+    The column is computed from the key_value_pairs JSON and is NULL for
+    rows that do not have the key (or have a value of the other type).
+    The composite (column IS NULL, column, id) indices match the
+    "NULLs last, then by id" ordering used by create_select_statement().
+    """
+    path = f"'$.{key}'"
+    expression = (
+        'CASE WHEN json_valid(key_value_pairs) THEN '
+        f'CASE WHEN json_type(key_value_pairs, {path}) IN ({json_types[type]}) '
+        f'THEN json_extract(key_value_pairs, {path}) END END')
+    column = f'kv_{key}'
+    return [
+        f'ALTER TABLE systems ADD COLUMN {column} {type} '
+        f'GENERATED ALWAYS AS ({expression}) VIRTUAL',
+        f'CREATE INDEX {column}_index ON '
+        f'systems({column} IS NULL, {column}, id)',
+        f'CREATE INDEX {column}_desc_index ON '
+        f'systems({column} IS NULL, {column} DESC, id)']
+
+
+# Special keys for select_columns() that can be read directly from the
+# systems table (key: (column, dtype)):
+systems_columns = {'id': ('id', np.int64),
+                   'natoms': ('natoms', np.int64),
+                   'energy': ('energy', np.float64),
+                   'free_energy': ('free_energy', np.float64),
+                   'magmom': ('magmom', np.float64),
+                   'charge': ('charge', np.float64),
+                   'volume': ('volume', np.float64),
+                   'mass': ('mass', np.float64),
+                   'fmax': ('fmax', np.float64),
+                   'smax': ('smax', np.float64),
+                   'ctime': ('ctime', np.float64),
+                   'mtime': ('mtime', np.float64),
+                   'user': ('username', object),
+                   'calculator': ('calculator', object),
+                   'unique_id': ('unique_id', object)}
+
+# select_columns() reads whole columns when selecting more rows than this:
+max_lookup_ids = 50_000
+
+
+def fetch_batches(cur, batch_size=None):
+    """Yield lists of results from cursor.
+
+    All results come in one list if batch_size is None."""
+    if not batch_size:
+        yield cur.fetchall()
+        return
+    while True:
+        results = cur.fetchmany(batch_size)
+        if not results:
+            return
+        yield results
+
+
+def execute(cur, sql, args, batch_size=None):
+    """Execute query and return iterator over batches of results.
+
+    The query is timed if metrics are enabled (see ase.db.metrics)."""
+    recorder = metrics.recorder
+    if recorder is None:
+        cur.execute(sql, args)
+        return fetch_batches(cur, batch_size)
+    return recorder.query(cur, sql, args,
+                          lambda: fetch_batches(cur, batch_size))
+
+
 def float_if_not_none(x):
     """Convert numpy.float64 to float - old db-interfaces need that."""
     if x is not None:
         return float(x)
 
 
+class SQLiteConnection(sqlite3.Connection):
+    """SQLite connection that remembers the names of external tables."""
+    external_table_names = None
+
+
+class ConnectionPool:
+    """Pool of read-only SQLite connections that can be shared by threads.
+
+    Connections are handed out with acquire() and given back with
+    release().  At most *size* idle connections are kept open.  A pool
+    is never shared between processes: after a fork (as done by
+    pre-forking WSGI servers), the child process starts with an empty
+    pool.
+    """
+
+    def __init__(self, connect, size=8):
+        self._connect = connect
+        self.size = size
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+    def acquire(self):
+        if self._pid != os.getpid():
+            self._reset()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, con):
+        if self._pid != os.getpid():
+            return
+        try:
+            self._idle.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+    def close(self):
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            con.close()
+
+
 class SQLite3Database(Database):
     type = 'db'
     initialized = False
@@ -135,15 +375,66 @@ class SQLite3Database(Database):
     default = 'NULL'  # used for autoincrement id
     connection = None
     version = None
+    codecs = None  # column -> flags for files with compressed blobs
+    _has_key_catalogue = False
+    _upgraded = False  # existing files are upgraded before first write
+    _materialized_keys: dict = {}  # key -> 'REAL' or 'TEXT'
     columnnames = [line.split()[0].lstrip()
                    for line in init_statements[0].splitlines()[1:]]
 
+    def __init__(self, filename=None, create_indices=True,
+                 use_lock_file=False, serial=False,
+                 readonly=False, immutable=False, pool_size=8, bulk=False,
+                 compression=None):
+        """SQLite3 database.
+
+        readonly: bool
+            Open the file with mode=ro.  Connections are then kept in a
+            pool and reused across calls instead of being opened and
+            closed for every select() or count().
+        immutable: bool
+            Also tell SQLite that the file will not change while it is
+            open (immutable=1), which skips all file locking.  Implies
+            readonly.
+        pool_size: int
+            Maximum number of idle read-only connections to keep open.
+        bulk: bool
+            Bulk load mode for building large databases: indices are
+            dropped (or not created for a new file) and SQLite is told to
+            trade safety for speed (synchronous=OFF, journal kept in
+            memory, large page cache).  Call end_bulk_load() when done.
+            If that never happens (the import was interrupted), the
+            indices are rebuilt the next time the file is opened for
+            writing without bulk=True.
+        compression: str or dict
+            Codec for the blobs of a new file (arrays and data), like
+            'shuffle+zlib', or a dict mapping column names ('positions',
+            'forces', 'momenta', 'data', ...) and 'default' to codecs.
+            See ase.db.compression.  The codecs are stored in the file and
+            used by all later connections.
+        """
+        Database.__init__(self, filename, create_indices, use_lock_file,
+                          serial)
+        self.immutable = immutable
+        self.readonly = readonly or immutable
+        if bulk and self.readonly:
+            raise ValueError('Can not bulk load a read-only database')
+        self.bulk = bulk
+        self.compression = None
+        if compression:
+            self.compression = normalize_codecs(compression)
+        self.pool = None
+        if self.readonly:
+            self.pool = ConnectionPool(self._connect, pool_size)
+
     def encode(self, obj, binary=False):
         if binary:
             return object_to_bytes(obj)
         return ase.io.jsonio.encode(obj)
 
     def decode(self, txt, lazy=False):
+        if self.codecs is not None and isinstance(txt, bytes):
+            txt, _ = decompress(txt)
         if lazy:
             return txt
         if isinstance(txt, str):
@@ -169,18 +460,58 @@ class SQLite3Database(Database):
         (without creating an extra view)."""
         if buf is None:
             return None
+        stored = dtype
+        if self.codecs is not None:
+            buf, float32 = decompress(buf)
+            if float32:
+                stored = np.float32
         if len(buf) == 0:
             array = np.zeros(0, dtype)
         else:
-            array = np.frombuffer(buf, dtype)
+            array = np.frombuffer(buf, stored)
             if not np.little_endian:
                 array = array.byteswap()
+            if stored is not dtype:
+                array = array.astype(dtype)
         if shape is not None:
             array.shape = shape
         return array
 
+    def _blob(self, array, column):
+        """Convert array to blob using the codec of the column."""
+        if self.codecs is None or array is None:
+            return self.blob(array)
+        flags = self.codecs[column]
+        array = np.asarray(array)
+        if flags & FLOAT32 and array.dtype == np.float64:
+            array = array.astype(np.float32)
+        else:
+            flags &= ~FLOAT32
+        buf = self.blob(array)
+        return compress(buf, flags, buf.itemsize)
+
+    def _data_blob(self, data):
+        """Encode data for the data column."""
+        if not isinstance(data, (str, bytes)):
+            data = self.encode(data, binary=self.version >= 9)
+        if self.codecs is not None and isinstance(data, bytes):
+            data = compress(data, self.codecs['data'])
+        return data
+
     def _connect(self):
-        return sqlite3.connect(self.filename, timeout=20)
+        if self.readonly:
+            uri = Path(self.filename).as_uri() + '?mode=ro'
+            if self.immutable:
+                uri += '&immutable=1'
+            return sqlite3.connect(uri, uri=True, timeout=20,
+                                   check_same_thread=False,
+                                   factory=SQLiteConnection)
+        con = sqlite3.connect(self.filename, timeout=20,
+                              factory=SQLiteConnection)
+        if self.bulk:
+            for pragma in bulk_pragmas:
+                con.execute(pragma)
+        return con
 
     def __enter__(self):
         assert self.connection is None
@@ -198,6 +529,15 @@ class SQLite3Database(Database):
 
     @contextmanager
     def managed_connection(self, commit_frequency=5000):
+        if self.connection is None and self.pool is not None:
+            con = self.pool.acquire()
+            try:
+                self._initialize(con)
+                yield con
+            finally:
+                self.pool.release(con)
+            return
+
         try:
             con = self.connection or self._connect()
             self._initialize(con)
@@ -225,13 +565,32 @@ class SQLite3Database(Database):
             'SELECT COUNT(*) FROM sqlite_master WHERE name="systems"')
 
         if cur.fetchone()[0] == 0:
+            # Let delete() give space back to the file system without
+            # rewriting the whole file (must come before the first table):
+            con.execute('PRAGMA auto_vacuum=INCREMENTAL')
             for statement in init_statements:
                 con.execute(statement)
-            if self.create_indices:
-                for statement in index_statements:
+            if self.compression:
+                con.execute('INSERT INTO information VALUES (?, ?)',
+                            ('codecs', self.compression))
+                self.codecs = codec_flags(json.loads(self.compression))
+                self.version = VERSION
+            else:
+                con.execute('UPDATE information SET value=? '
+                            'WHERE name="version"',
+                            [str(UNCOMPRESSED_VERSION)])
+                self.version = UNCOMPRESSED_VERSION
+            if self.type == 'db':
+                for statement in catalogue_statements:
                     con.execute(statement)
+                self._has_key_catalogue = True
+            if self.create_indices:
+                if self.bulk:
+                    self._set_pending_indices(con, index_statements)
+                else:
+                    for statement in index_statements:
+                        con.execute(statement)
             con.commit()
-            self.version = VERSION
         else:
             cur = con.execute(
                 'SELECT COUNT(*) FROM sqlite_master WHERE name="user_index"')
@@ -253,6 +612,21 @@ class SQLite3Database(Database):
                 if results:
                     self._metadata = json.loads(results[0][0])
 
+                if self.version >= 11:
+                    self._read_codecs(con)
+
+                if self.type == 'db':
+                    self._materialized_keys = \
+                        self._get_materialized_keys(con)
+                    cur = con.execute('SELECT COUNT(*) FROM sqlite_master '
+                                      'WHERE name="key_catalogue"')
+                    self._has_key_catalogue = cur.fetchone()[0] == 1
+                    if self.bulk:
+                        self._drop_indices(con)
+
+        if self.compression and self.codecs is None:
+            raise ValueError(f'{self.filename} was created without '
+                             'compression')
         if self.version > VERSION:
             raise OSError('Can not read new ase.db format '
                           '(version {}).  Please update to latest ASE.'
@@ -263,15 +637,145 @@ class SQLite3Database(Database):
 
         self.initialized = True
 
+    def _get_pending_indices(self, con):
+        """SQL for indices that were left out in bulk mode."""
+        cur = con.execute(
+            'SELECT value FROM information WHERE name="pending_indices"')
+        results = cur.fetchall()
+        if results:
+            return json.loads(results[0][0])
+        return []
+
+    def _set_pending_indices(self, con, statements):
+        con.execute('DELETE FROM information WHERE name="pending_indices"')
+        if statements:
+            con.execute('INSERT INTO information VALUES (?, ?)',
+                        ('pending_indices', json.dumps(statements)))
+
+    def _drop_indices(self, con):
+        """Drop all indices and remember them for end_bulk_load()."""
+        statements = self._get_pending_indices(con)
+        cur = con.execute('SELECT name, sql FROM sqlite_master '
+                          'WHERE type="index" AND sql IS NOT NULL')
+        for name, sql in cur.fetchall():
+            con.execute(f'DROP INDEX {name}')
+            statements.append(sql)
+        self._set_pending_indices(con, statements)
+        con.commit()
+
+    def _create_pending_indices(self, con):
+        statements = self._get_pending_indices(con)
+        if not statements:
+            return
+        for statement in statements:
+            con.execute(statement.replace('CREATE INDEX',
+                                          'CREATE INDEX IF NOT EXISTS', 1))
+        self._set_pending_indices(con, [])
+        con.execute('ANALYZE')
+        con.commit()
+
+    def end_bulk_load(self):
+        """Create the indices left out in bulk mode and run ANALYZE."""
+        with self.managed_connection() as con:
+            con.commit()
+            # Back to safe settings before building the indices:
+            con.execute('PRAGMA synchronous=FULL')
+            con.execute('PRAGMA journal_mode=DELETE')
+            self._create_pending_indices(con)
+        self.bulk = False
+
+    def _read_codecs(self, con):
+        cur = con.execute('SELECT value FROM information WHERE name="codecs"')
+        codecs = cur.fetchone()[0]
+        if self.compression and self.compression != codecs:
+            raise ValueError(f'{self.filename} uses the codecs {codecs}')
+        self.codecs = codec_flags(json.loads(codecs))
+
+    def _create_key_catalogue(self, con):
+        for statement in catalogue_statements:
+            con.execute(statement)
+        con.commit()
+        self._has_key_catalogue = True
+
+    def upgrade(self):
+        """Bring an existing file up to date with this version of ASE.
+
+        Replaces version 9 indices, adds the key catalogue and creates
+        indices left out by an interrupted bulk load.  This is done
+        before the first write to the file, so that opening a file only
+        to read from it never changes it."""
+        with self.managed_connection() as con:
+            self._upgrade(con)
+
+    def _upgrade(self, con):
+        if self._upgraded or self.readonly:
+            return
+        if self.type == 'db':
+            if self.version == 9:
+                self._upgrade_to_version_10(con)
+            if not self._has_key_catalogue:
+                self._create_key_catalogue(con)
+            if not self.bulk:
+                # Finish an interrupted bulk load:
+                self._create_pending_indices(con)
+        self._upgraded = True
+
+    def _upgrade_to_version_10(self, con):
+        """Replace indices on key and Z with covering ones."""
+        cur = con.execute(
+            'SELECT COUNT(*) FROM sqlite_master WHERE name="number_index"')
+        if cur.fetchone()[0]:
+            for name in old_indices:
+                con.execute(f'DROP INDEX IF EXISTS {name}')
+            for statement in index_statements:
+                con.execute(statement.replace('CREATE INDEX',
+                                              'CREATE INDEX IF NOT EXISTS'))
+        con.execute('UPDATE information SET value=? WHERE name="version"',
+                    [str(UNCOMPRESSED_VERSION)])
+        con.commit()
+        self.version = UNCOMPRESSED_VERSION
+
     def _write(self, atoms, key_value_pairs, data, id):
         ext_tables = key_value_pairs.pop("external_tables", {})
         Database._write(self, atoms, key_value_pairs, data)
 
         mtime = now()
+        row, key_value_pairs, ext_tables = self._prepare_row(
+            atoms, key_value_pairs, ext_tables, mtime, id)
 
-        encode = self.encode
-        blob = self.blob
+        with self.managed_connection() as con:
+            self._upgrade(con)
+            values = self._systems_values(row, key_value_pairs, data, mtime)
+
+            cur = con.cursor()
+            if id is None:
+                q = self.default + ', ' + ', '.join('?' * len(values))
+                cur.execute(f'INSERT INTO systems VALUES ({q})',
+                            values)
+                id = self.get_last_id(cur)
+            else:
+                self._delete(cur, [id], ['keys', 'text_key_values',
+                                         'number_key_values', 'species'])
+                q = ', '.join(name + '=?' for name in self.columnnames[1:])
+                cur.execute(f'UPDATE systems SET {q} WHERE id=?',
+                            values + (id,))
+
+            self._insert_searchable(cur, [(id, row, key_value_pairs)])
+
+            # Insert entries in the valid tables
+            for tabname in ext_tables.keys():
+                entries = ext_tables[tabname]
+                entries['id'] = id
+                self._insert_in_external_table(
+                    cur, name=tabname, entries=ext_tables[tabname])
+
+        return id
 
+    def _prepare_row(self, atoms, key_value_pairs, ext_tables, mtime,
+                     id=None):
+        """Get AtomsRow, key-value pairs and external tables to write.
+
+        External tables that don't exist yet are created."""
         if not isinstance(atoms, AtomsRow):
             row = AtomsRow(atoms)
             row.ctime = mtime
@@ -292,6 +796,13 @@ class SQLite3Database(Database):
             dtype = self._guess_type(v)
             self._create_table_if_not_exists(k, dtype)
 
+        return row, key_value_pairs, ext_tables
+
+    def _systems_values(self, row, key_value_pairs, data, mtime):
+        """Values for all columns of the systems table except id."""
+        encode = self.encode
+        blob = self._blob
+
         constraints = row._constraints
         if constraints:
             if isinstance(constraints, list):
@@ -303,15 +814,15 @@ class SQLite3Database(Database):
                   row.ctime,
                   mtime,
                   row.user,
-                  blob(row.numbers),
-                  blob(row.positions),
-                  blob(row.cell),
+                  blob(row.numbers, 'numbers'),
+                  blob(row.positions, 'positions'),
+                  blob(row.cell, 'cell'),
                   int(np.dot(row.pbc, [1, 2, 4])),
-                  blob(row.get('initial_magmoms')),
-                  blob(row.get('initial_charges')),
-                  blob(row.get('masses')),
-                  blob(row.get('tags')),
-                  blob(row.get('momenta')),
+                  blob(row.get('initial_magmoms'), 'initial_magmoms'),
+                  blob(row.get('initial_charges'), 'initial_charges'),
+                  blob(row.get('masses'), 'masses'),
+                  blob(row.get('tags'), 'tags'),
+                  blob(row.get('momenta'), 'momenta'),
                   constraints)
 
         if 'calculator' in row:
@@ -322,71 +833,114 @@ class SQLite3Database(Database):
         if not data:
             data = row._data
 
-        with self.managed_connection() as con:
-            if not isinstance(data, (str, bytes)):
-                data = encode(data, binary=self.version >= 9)
-
-            values += (float_if_not_none(row.get('energy')),
-                       float_if_not_none(row.get('free_energy')),
-                       blob(row.get('forces')),
-                       blob(row.get('stress')),
-                       blob(row.get('dipole')),
-                       blob(row.get('magmoms')),
-                       row.get('magmom'),
-                       blob(row.get('charges')),
-                       encode(key_value_pairs),
-                       data,
-                       len(row.numbers),
-                       float_if_not_none(row.get('fmax')),
-                       float_if_not_none(row.get('smax')),
-                       float_if_not_none(row.get('volume')),
-                       float(row.mass),
-                       float(row.charge))
+        data = self._data_blob(data)
+
+        values += (float_if_not_none(row.get('energy')),
+                   float_if_not_none(row.get('free_energy')),
+                   blob(row.get('forces'), 'forces'),
+                   blob(row.get('stress'), 'stress'),
+                   blob(row.get('dipole'), 'dipole'),
+                   blob(row.get('magmoms'), 'magmoms'),
+                   row.get('magmom'),
+                   blob(row.get('charges'), 'charges'),
+                   encode(key_value_pairs),
+                   data,
+                   len(row.numbers),
+                   float_if_not_none(row.get('fmax')),
+                   float_if_not_none(row.get('smax')),
+                   float_if_not_none(row.get('volume')),
+                   float(row.mass),
+                   float(row.charge))
+        return values
 
-            cur = con.cursor()
-            if id is None:
-                q = self.default + ', ' + ', '.join('?' * len(values))
-                cur.execute(f'INSERT INTO systems VALUES ({q})',
-                            values)
-                id = self.get_last_id(cur)
-            else:
-                self._delete(cur, [id], ['keys', 'text_key_values',
-                                         'number_key_values', 'species'])
-                q = ', '.join(name + '=?' for name in self.columnnames[1:])
-                cur.execute(f'UPDATE systems SET {q} WHERE id=?',
-                            values + (id,))
+    def _insert_searchable(self, cur, rows):
+        """Fill species, keys and key-value tables.
 
+        rows: list of (id, AtomsRow, key-value pairs) tuples."""
+        species = []
+        text_key_values = []
+        number_key_values = []
+        keys = []
+        for id, row, key_value_pairs in rows:
             count = row.count_atoms()
-            if count:
-                species = [(atomic_numbers[symbol], n, id)
-                           for symbol, n in count.items()]
-                cur.executemany('INSERT INTO species VALUES (?, ?, ?)',
-                                species)
-
-            text_key_values = []
-            number_key_values = []
+            species += [(atomic_numbers[symbol], n, id)
+                        for symbol, n in count.items()]
             for key, value in key_value_pairs.items():
                 if isinstance(value, (numbers.Real, np.bool_)):
                     number_key_values.append([key, float(value), id])
                 else:
                     assert isinstance(value, str)
                     text_key_values.append([key, value, id])
+                keys.append((key, id))
+
+        if species:
+            cur.executemany('INSERT INTO species VALUES (?, ?, ?)',
+                            species)
+        cur.executemany('INSERT INTO text_key_values VALUES (?, ?, ?)',
+                        text_key_values)
+        cur.executemany('INSERT INTO number_key_values VALUES (?, ?, ?)',
+                        number_key_values)
+        cur.executemany('INSERT INTO keys VALUES (?, ?)', keys)
+
+    def _write_many(self, items, data, chunk_size):
+        if self.type != 'db':
+            # Ids of new rows come from cursor.lastrowid, which only
+            # SQLite has:
+            return Database._write_many(self, items, data, chunk_size)
+
+        if self.connection is None:
+            # One transaction for everything:
+            with self:
+                return self._write_many(items, data, chunk_size)
+
+        ids = []
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                ids += self._write_chunk(chunk, data)
+                chunk = []
+                if self.bulk:
+                    # Keep what we have if the import is interrupted:
+                    self.connection.commit()
+        if chunk:
+            ids += self._write_chunk(chunk, data)
+        return ids
+
+    def _write_chunk(self, chunk, data):
+        """Insert new rows with one executemany() call per table.
+
+        (Except for systems: one insert per row gives the new ids.)"""
+        mtime = now()
+        rows = []
+        for atoms, key_value_pairs in chunk:
+            ext_tables = key_value_pairs.pop('external_tables', {})
+            Database._write(self, atoms, key_value_pairs, data)
+            rows.append(self._prepare_row(atoms, key_value_pairs,
+                                          ext_tables, mtime))
 
-            cur.executemany('INSERT INTO text_key_values VALUES (?, ?, ?)',
-                            text_key_values)
-            cur.executemany('INSERT INTO number_key_values VALUES (?, ?, ?)',
-                            number_key_values)
-            cur.executemany('INSERT INTO keys VALUES (?, ?)',
-                            [(key, id) for key in key_value_pairs])
-
-            # Insert entries in the valid tables
-            for tabname in ext_tables.keys():
-                entries = ext_tables[tabname]
-                entries['id'] = id
-                self._insert_in_external_table(
-                    cur, name=tabname, entries=ext_tables[tabname])
-
-        return id
+        with self.managed_connection() as con:
+            self._upgrade(con)
+            cur = con.cursor()
+            values = [self._systems_values(row, key_value_pairs, data, mtime)
+                      for row, key_value_pairs, _ in rows]
+            q = self.default + ', ' + ', '.join('?' * len(values[0]))
+            sql = f'INSERT INTO systems VALUES ({q})'
+            ids = []
+            for row_values in values:
+                cur.execute(sql, row_values)
+                ids.append(cur.lastrowid)
+
+            self._insert_searchable(
+                cur, [(id, row, key_value_pairs)
+                      for id, (row, key_value_pairs, _) in zip(ids, rows)])
+
+            for id, (_, _, ext_tables) in zip(ids, rows):
+                for tabname, entries in ext_tables.items():
+                    entries['id'] = id
+                    self._insert_in_external_table(
+                        cur, name=tabname, entries=entries)
+        return ids
 
     def _update(self, id, key_value_pairs, data=None):
         """Update key_value_pairs and data for a single row """
@@ -399,13 +953,13 @@ class SQLite3Database(Database):
 
         mtime = now()
         with self.managed_connection() as con:
+            self._upgrade(con)
             cur = con.cursor()
             cur.execute(
                 'UPDATE systems SET mtime=?, key_value_pairs=? WHERE id=?',
                 (mtime, encode(key_value_pairs), id))
             if data:
-                if not isinstance(data, (str, bytes)):
-                    data = encode(data, binary=self.version >= 9)
+                data = self._data_blob(data)
                 cur.execute('UPDATE systems set data=? where id=?', (data, id))
 
             self._delete(cur, [id], ['keys', 'text_key_values',
@@ -436,6 +990,142 @@ class SQLite3Database(Database):
 
         return id
 
+    @lock
+    def _update_key_value_pairs(self, updates):
+        """Add key-value pairs to many rows in one transaction.
+
+        Only the changed keys are deleted from and inserted into the
+        keys, text_key_values and number_key_values tables."""
+        updates = [(id, kvp) for id, kvp in updates if kvp]
+        if not updates:
+            return
+        encode = self.encode
+        decode = self.decode
+        mtime = now()
+        with self.managed_connection() as con:
+            self._upgrade(con)
+            cur = con.cursor()
+            old = {}
+            for i in range(0, len(updates), 500):
+                chunk = [id for id, _ in updates[i:i + 500]]
+                q = ', '.join('?' * len(chunk))
+                cur.execute('SELECT id, key_value_pairs FROM systems '
+                            f'WHERE id IN ({q})', chunk)
+                old.update(cur.fetchall())
+
+            systems = []
+            delete = []
+            keys = []
+            text_key_values = []
+            number_key_values = []
+            for id, kvp in updates:
+                if id not in old:
+                    raise KeyError(f'no match for id={id}')
+                key_value_pairs = decode(old[id])
+                for key, value in kvp.items():
+                    if key in key_value_pairs:
+                        delete.append((id, key))
+                    else:
+                        keys.append((key, id))
+                    if isinstance(value, (numbers.Real, np.bool_)):
+                        number_key_values.append((key, float(value), id))
+                    else:
+                        assert isinstance(value, str)
+                        text_key_values.append((key, value, id))
+                key_value_pairs.update(kvp)
+                systems.append((mtime, encode(key_value_pairs), id))
+
+            cur.executemany(
+                'UPDATE systems SET mtime=?, key_value_pairs=? WHERE id=?',
+                systems)
+            for table in ['text_key_values', 'number_key_values']:
+                cur.executemany(f'DELETE FROM {table} WHERE id=? AND key=?',
+                                delete)
+            cur.executemany('INSERT INTO keys VALUES (?, ?)', keys)
+            cur.executemany('INSERT INTO text_key_values VALUES (?, ?, ?)',
+                            text_key_values)
+            cur.executemany('INSERT INTO number_key_values VALUES (?, ?, ?)',
+                            number_key_values)
+
+    def _update_many(self, keys, cmps, delete_keys, add_key_value_pairs):
+        if self.type != 'db':
+            # The SQL below (temporary tables, plain JSON text in
+            # key_value_pairs) has only been tested with SQLite:
+            return Database._update_many(self, keys, cmps, delete_keys,
+                                         add_key_value_pairs)
+        return self._update_selection(keys, cmps, delete_keys,
+                                      add_key_value_pairs)
+
+    @lock
+    def _update_selection(self, keys, cmps, delete_keys, add_key_value_pairs):
+        """Set-based update_many().
+
+        The ids of the selected rows go into a temporary table.  The
+        searchable key-value tables are then changed with one DELETE and
+        one INSERT ... SELECT per table and key, and the key_value_pairs
+        column is patched in batches."""
+        changed = list(dict.fromkeys(delete_keys + list(add_key_value_pairs)))
+        added = [key for key in add_key_value_pairs if key not in delete_keys]
+        if not changed:
+            return 0, 0
+
+        sql, args = self.create_select_statement(keys, cmps, what='systems.id')
+        ids = 'SELECT id FROM update_ids'
+        mtime = now()
+        with self.managed_connection() as con:
+            self._upgrade(con)
+            cur = con.cursor()
+            cur.execute('DROP TABLE IF EXISTS update_ids')
+            cur.execute(f'CREATE TEMPORARY TABLE update_ids AS {sql}', args)
+            cur.execute('SELECT COUNT(*) FROM update_ids')
+            nrows = cur.fetchone()[0]
+
+            def count(keys):
+                if not keys:
+                    return 0
+                q = ', '.join('?' * len(keys))
+                cur.execute('SELECT COUNT(*) FROM keys '
+                            f'WHERE key IN ({q}) AND id IN ({ids})', keys)
+                return cur.fetchone()[0]
+
+            N = count(delete_keys)
+            M = len(add_key_value_pairs) * nrows - count(added)
+
+            q = ', '.join('?' * len(changed))
+            for table in ['keys', 'text_key_values', 'number_key_values']:
+                cur.execute(f'DELETE FROM {table} '
+                            f'WHERE key IN ({q}) AND id IN ({ids})', changed)
+            for key, value in add_key_value_pairs.items():
+                cur.execute('INSERT INTO keys SELECT ?, id FROM update_ids',
+                            [key])
+                if isinstance(value, (numbers.Real, np.bool_)):
+                    cur.execute('INSERT INTO number_key_values '
+                                'SELECT ?, ?, id FROM update_ids',
+                                [key, float(value)])
+                else:
+                    assert isinstance(value, str)
+                    cur.execute('INSERT INTO text_key_values '
+                                'SELECT ?, ?, id FROM update_ids',
+                                [key, value])
+
+            cur.execute('SELECT id, key_value_pairs FROM systems '
+                        f'WHERE id IN ({ids})')
+            rows = cur.fetchall()
+            for i in range(0, len(rows), 1000):
+                systems = []
+                for id, txt in rows[i:i + 1000]:
+                    # Flat dict of numbers and strings, so plain JSON is
+                    # enough (and much faster than self.decode()):
+                    kvp = json.loads(txt)
+                    for key in delete_keys:
+                        kvp.pop(key, None)
+                    kvp.update(add_key_value_pairs)
+                    systems.append((mtime, self.encode(kvp), id))
+                cur.executemany('UPDATE systems SET mtime=?, '
+                                'key_value_pairs=? WHERE id=?', systems)
+            cur.execute('DROP TABLE update_ids')
+        return M, N
+
     def get_last_id(self, cur):
         cur.execute('SELECT seq FROM sqlite_sequence WHERE name="systems"')
         result = cur.fetchone()
@@ -458,7 +1148,29 @@ class SQLite3Database(Database):
 
         return self._convert_tuple_to_row(values)
 
-    def _convert_tuple_to_row(self, values):
+    def _convert_tuples_to_rows(self, con, values, columnindex, results):
+        """Convert a batch of selected rows to AtomsRow objects.
+
+        values and columnindex are from _column_selection().  The
+        external tables are read with one query per table for the whole
+        batch."""
+        names = self._get_external_table_names(con)
+        tables = {}
+        if names:
+            ids = []
+            if columnindex[0] == 0:
+                ids = [shortvalues[0] for shortvalues in results]
+            tables = self._read_external_tables(con, names, ids)
+        for shortvalues in results:
+            values[columnindex] = shortvalues
+            yield self._convert_tuple_to_row(tuple(values), tables)
+
+    def _convert_tuple_to_row(self, values, external_tables=None):
+        """Convert values from the systems table to an AtomsRow.
+
+        external_tables: dict
+            Rows of the external tables from _read_external_tables().
+            If not given, they are read for this row."""
         deblob = self.deblob
         decode = self.decode
 
@@ -512,11 +1224,15 @@ class SQLite3Database(Database):
             dct['data'] = decode(values[26], lazy=True)
 
         # Now we need to update with info from the external tables
-        external_tab = self._get_external_table_names()
-        tables = {}
-        for tab in external_tab:
-            row = self._read_external_table(tab, dct["id"])
-            tables[tab] = row
+        if external_tables is None:
+            external_tab = self._get_external_table_names()
+            tables = {}
+            for tab in external_tab:
+                row = self._read_external_table(tab, dct["id"])
+                tables[tab] = row
+        else:
+            tables = {tab: rows.get(dct['id'], {})
+                      for tab, rows in external_tables.items()}
 
         dct.update(tables)
         return AtomsRow(dct)
@@ -536,7 +1252,7 @@ class SQLite3Database(Database):
 
     def create_select_statement(self, keys, cmps,
                                 sort=None, order=None, sort_table=None,
-                                what='systems.*'):
+                                what='systems.*', after=None):
         tables = ['systems']
         where = []
         args = []
@@ -593,6 +1309,13 @@ class SQLite3Database(Database):
                                      f'where Z=? and n{op}?)')
                         args += [key, value]
 
+            elif (key in self.materialized_keys and
+                  isinstance(value, str) ==
+                  (self.materialized_keys[key] == 'TEXT')):
+                where.append(f'systems.kv_{key}{op}?')
+                args.append(value if isinstance(value, str)
+                            else float(value))
+
             elif self.type == 'postgresql':
                 jsonop = '->'
                 if isinstance(value, str):
@@ -623,20 +1346,49 @@ class SQLite3Database(Database):
                 sort_table = 'sort_table'
                 sort = 'value'
 
+            if after is not None:
+                # Keyset pagination: rows after (value, id) in the
+                # order "NULLs last, then by value, then by id":
+                value, id = after
+                column = f'{sort_table}.{sort}'
+                if value is None:
+                    where.append(f'{column} IS NULL AND systems.id>?')
+                    args.append(id)
+                else:
+                    op = '>' if order == 'ASC' else '<'
+                    where.append(f'({column}{op}? OR '
+                                 f'({column}=? AND systems.id>?) OR '
+                                 f'{column} IS NULL)')
+                    args += [value, value, id]
+
         sql = f'SELECT {what} FROM\n  ' + ', '.join(tables)
         if where:
             sql += '\n  WHERE\n  ' + ' AND\n  '.join(where)
         if sort:
-            # XXX use "?" instead of "{}"
-            sql += '\nORDER BY {0}.{1} IS NULL, {0}.{1} {2}'.format(
-                sort_table, sort, order)
+            if sort_table == 'sort_table' and self.type == 'db':
+                if nulls_last:
+                    # Same order, but SQLite can walk the (key, value, id)
+                    # index instead of sorting:
+                    sql += (f'\nORDER BY sort_table.value {order} '
+                            'NULLS LAST, sort_table.id')
+                else:
+                    sql += ('\nORDER BY sort_table.value IS NULL, '
+                            f'sort_table.value {order}, sort_table.id')
+            else:
+                # XXX use "?" instead of "{}"
+                sql += '\nORDER BY {0}.{1} IS NULL, {0}.{1} {2}'.format(
+                    sort_table, sort, order)
+                if sort_table != 'systems' or sort != 'id':
+                    sql += ', systems.id'
 
         return sql, args
 
-    def _select(self, keys, cmps, explain=False, verbosity=0,
-                limit=None, offset=0, sort=None, include_data=True,
-                columns='all'):
+    def _column_selection(self, include_data=True, columns='all'):
+        """Prepare reading of a subset of the columns of systems.
 
+        Returns template array of values for _convert_tuple_to_row(),
+        indices of the selected columns and the SQL for selecting them.
+        """
         values = np.array([None for _ in range(27)])
         values[25] = '{}'
         values[26] = 'null'
@@ -649,39 +1401,77 @@ class SQLite3Database(Database):
         if include_data:
             columnindex.append(26)
 
-        if sort:
-            if sort[0] == '-':
-                order = 'DESC'
-                sort = sort[1:]
-            else:
-                order = 'ASC'
-            if sort in ['id', 'energy', 'username', 'calculator',
-                        'ctime', 'mtime', 'magmom', 'pbc',
-                        'fmax', 'smax', 'volume', 'mass', 'charge', 'natoms']:
-                sort_table = 'systems'
-            else:
-                for dct in self._select(keys + [sort], cmps=[], limit=1,
-                                        include_data=False,
-                                        columns=['key_value_pairs']):
-                    if isinstance(dct['key_value_pairs'][sort], str):
-                        sort_table = 'text_key_values'
-                    else:
-                        sort_table = 'number_key_values'
-                    break
-                else:
-                    # No rows.  Just pick a table:
-                    sort_table = 'number_key_values'
-
-        else:
-            order = None
-            sort_table = None
-
         what = ', '.join('systems.' + name
                          for name in
                          np.array(self.columnnames)[np.array(columnindex)])
+        return values, columnindex, what
+
+    def _sort_table(self, keys, sort):
+        """Find table to sort in.
+
+        Returns sort key, order ('ASC' or 'DESC') and table name."""
+        if not sort:
+            return None, None, None
+
+        if sort[0] == '-':
+            order = 'DESC'
+            sort = sort[1:]
+        else:
+            order = 'ASC'
+        if sort in ['id', 'energy', 'username', 'calculator',
+                    'ctime', 'mtime', 'magmom', 'pbc',
+                    'fmax', 'smax', 'volume', 'mass', 'charge', 'natoms']:
+            sort_table = 'systems'
+        elif sort in self.materialized_keys:
+            sort_table = 'systems'
+            sort = 'kv_' + sort
+        else:
+            sort_table = self._key_table(keys, sort)
+        return sort, order, sort_table
+
+    def _key_table(self, keys, key):
+        """Table with the values of a key.
+
+        For keys with values of both types, this is the type of the value
+        in the first selected row."""
+        with self.managed_connection() as con:
+            if self._has_key_catalogue:
+                types = [type for type, in con.execute(
+                    'SELECT type FROM key_catalogue WHERE key=?', [key])]
+                if len(types) < 2:
+                    return f'{types[0] if types else "number"}_key_values'
+        for dct in self._select(keys + [key], cmps=[], limit=1,
+                                include_data=False,
+                                columns=['key_value_pairs']):
+            if isinstance(dct['key_value_pairs'][key], str):
+                return 'text_key_values'
+            break
+        # Numbers (or no rows):
+        return 'number_key_values'
+
+    def _select(self, keys, cmps, explain=False, verbosity=0,
+                limit=None, offset=0, sort=None, include_data=True,
+                columns='all', after=None, batch_size=None):
+
+        values, columnindex, what = self._column_selection(include_data,
+                                                           columns)
+        if after is not None and not sort:
+            sort = 'id'
+        sort, order, sort_table = self._sort_table(keys, sort)
+
+        if (after is not None and after[0] is None and
+                sort_table != 'systems'):
+            # Cursor is already in the part without the sort key:
+            yield from self._select(keys + ['-' + sort], cmps,
+                                    limit=limit, offset=offset,
+                                    include_data=include_data,
+                                    columns=columns, sort='id',
+                                    after=(after[1], after[1]),
+                                    batch_size=batch_size)
+            return
 
         sql, args = self.create_select_statement(keys, cmps, sort, order,
-                                                 sort_table, what)
+                                                 sort_table, what, after)
 
         if explain:
             sql = 'EXPLAIN QUERY PLAN ' + sql
@@ -697,16 +1487,17 @@ class SQLite3Database(Database):
 
         with self.managed_connection() as con:
             cur = con.cursor()
-            cur.execute(sql, args)
             if explain:
+                cur.execute(sql, args)
                 for row in cur.fetchall():
                     yield {'explain': row}
             else:
                 n = 0
-                for shortvalues in cur.fetchall():
-                    values[columnindex] = shortvalues
-                    yield self._convert_tuple_to_row(tuple(values))
-                    n += 1
+                for results in execute(cur, sql, args, batch_size):
+                    for row in self._convert_tuples_to_rows(
+                            con, values, columnindex, results):
+                        yield row
+                        n += 1
 
                 if sort and sort_table != 'systems':
                     # Yield rows without sort key last:
@@ -714,12 +1505,201 @@ class SQLite3Database(Database):
                         if n == limit:
                             return
                         limit -= n
+                    if n > 0:
+                        offset = 0
+                    elif offset:
+                        # Skip the rows that have the sort key:
+                        sql, args = self.create_select_statement(
+                            keys, cmps, sort, order, sort_table,
+                            'COUNT(*)', after)
+                        cur.execute(sql, args)
+                        offset = max(offset - cur.fetchone()[0], 0)
+                    extra = {}
+                    if after is not None:
+                        extra = dict(sort='id', after=(0, 0))
                     for row in self._select(keys + ['-' + sort], cmps,
                                             limit=limit, offset=offset,
                                             include_data=include_data,
-                                            columns=columns):
+                                            columns=columns,
+                                            batch_size=batch_size, **extra):
                         yield row
 
+    def _select_ids(self, keys, cmps, sort=None, limit=None):
+        sort, order, sort_table = self._sort_table(keys, sort)
+        sql, args = self.create_select_statement(keys, cmps, sort, order,
+                                                 sort_table, 'systems.id')
+        if limit:
+            sql += f'\nLIMIT {limit}'
+        with self.managed_connection() as con:
+            cur = con.cursor()
+            ids = [id for results in execute(cur, sql, args)
+                   for id, in results]
+        if sort and sort_table != 'systems' and (not limit or
+                                                 len(ids) < limit):
+            # Rows without sort key last:
+            ids += self._select_ids(keys + ['-' + sort], cmps,
+                                    limit=limit and limit - len(ids))
+        return ids
+
+    def _get_rows(self, ids, include_data=True, columns='all'):
+        values, columnindex, what = self._column_selection(include_data,
+                                                           columns)
+        if 0 not in columnindex:
+            columnindex.insert(0, 0)
+            what = 'systems.id, ' + what
+        with self.managed_connection() as con:
+            cur = con.cursor()
+            for i in range(0, len(ids), 500):
+                chunk = [int(id) for id in ids[i:i + 500]]
+                q = ', '.join('?' * len(chunk))
+                results, = execute(
+                    cur, f'SELECT {what} FROM systems WHERE id IN ({q})',
+                    chunk)
+                rows = {row.id: row
+                        for row in self._convert_tuples_to_rows(
+                            con, values, columnindex, results)}
+                for id in chunk:
+                    if id in rows:
+                        yield rows[id]
+
+    def _read_data(self, ids, keys):
+        if self.type != 'db' or self.version < 9:
+            return Database._read_data(self, ids, keys)
+        data = {}
+        other = []
+        with self.managed_connection() as con:
+            for id in ids:
+                if incremental_blobs and self.codecs is None:
+                    # Incremental blob I/O: read only the JSON index and
+                    # the byte ranges of the wanted arrays:
+                    try:
+                        blob = con.blobopen('systems', 'data', int(id),
+                                            readonly=True)
+                    except sqlite3.OperationalError:
+                        other.append(id)  # no such row or not a blob
+                        continue
+                    with blob:
+                        data[id] = read_data(blob, keys)
+                    continue
+                # Compressed (must read everything) or no blobopen():
+                cur = con.execute('SELECT data FROM systems WHERE id=?',
+                                  [int(id)])
+                result = cur.fetchone()
+                if result is None or not isinstance(result[0], bytes):
+                    other.append(id)
+                    continue
+                data[id] = read_data(self.decode(result[0], lazy=True), keys)
+        if other:
+            data.update(Database._read_data(self, other, keys))
+        return data
+
+    def select_columns(self, keys, selection=None, sort=None, limit=None,
+                       offset=0, **kwargs):
+        keys = list(keys)
+        if self.type != 'db' or any(key in reserved_keys and
+                                    key not in systems_columns
+                                    for key in keys):
+            return Database.select_columns(self, keys, selection, sort=sort,
+                                           limit=limit, offset=offset,
+                                           **kwargs)
+
+        selkeys, cmps = parse_selection(selection, **kwargs)
+        if split_similar_to(cmps)[0] is not None:
+            return Database.select_columns(self, keys, selection, sort=sort,
+                                           limit=limit, offset=offset,
+                                           **kwargs)
+        ids = np.array(self._select_ids(selkeys, cmps, normalize_sort(sort),
+                                        limit=offset + limit if limit
+                                        else None),
+                       dtype=np.int64)
+        ids = ids[offset:offset + limit] if limit else ids[offset:]
+        n = len(ids)
+        # Look up a few rows by id.  For many rows, it is faster to read
+        # the whole column and drop the values of the rows not selected:
+        subset = ids if n <= max_lookup_ids else None
+
+        # Position of each id in the result:
+        order = np.argsort(ids)
+        sorted_ids = ids[order]
+
+        def positions(found):
+            i = np.searchsorted(sorted_ids, found).clip(max=max(n - 1, 0))
+            ok = sorted_ids[i] == found if n else np.zeros(len(found), bool)
+            return order[i[ok]], ok
+
+        columns = {}
+        syskeys = [key for key in keys if key in systems_columns]
+        kvkeys = [key for key in keys if key not in systems_columns]
+
+        with self.managed_connection() as con:
+            what = ', '.join(['id'] + [systems_columns[key][0]
+                                       for key in syskeys])
+            results = self._fetch_for_ids(
+                con, f'SELECT {what} FROM systems', [], subset)
+            found = np.fromiter((result[0] for result in results),
+                                np.int64, len(results))
+            where, ok = positions(found)
+            results = [result for result, o in zip(results, ok) if o]
+            for j, key in enumerate(['id'] + syskeys):
+                dtype = systems_columns[key][1]
+                values = np.empty(n, dtype)
+                values[where] = [result[j] for result in results]
+                if dtype is object:
+                    mask = values == None  # noqa: E711
+                elif dtype == np.float64:
+                    mask = np.isnan(values)
+                else:
+                    mask = np.zeros(n, bool)
+                columns[key] = np.ma.MaskedArray(values, mask=mask)
+
+            for key in kvkeys:
+                numbers = self._fetch_for_ids(
+                    con, 'SELECT id, value FROM number_key_values '
+                    'WHERE key=?', [key], subset)
+                texts = self._fetch_for_ids(
+                    con, 'SELECT id, value FROM text_key_values '
+                    'WHERE key=?', [key], subset)
+                numbers = np.array(numbers, dtype=np.float64).reshape((-1, 2))
+                where1, ok1 = positions(numbers[:, 0].astype(np.int64))
+                numbers = numbers[ok1, 1]
+                # All numbers are stored as REAL:
+                integers = (np.isfinite(numbers).all() and
+                            (numbers == np.round(numbers)).all())
+                if texts:
+                    values = np.empty(n, object)
+                    values[where1] = (numbers.astype(np.int64) if integers
+                                      else numbers).tolist()
+                    found = np.array([id for id, _ in texts], np.int64)
+                    where2, ok2 = positions(found)
+                    values[where2] = [text for (_, text), o
+                                      in zip(texts, ok2) if o]
+                elif integers:
+                    values = np.zeros(n, np.int64)
+                    values[where1] = numbers
+                else:
+                    values = np.full(n, np.nan)
+                    values[where1] = numbers
+                mask = np.ones(n, bool)
+                mask[where1] = False
+                if texts:
+                    mask[where2] = False
+                columns[key] = np.ma.MaskedArray(values, mask=mask)
+
+        return {key: columns[key] for key in ['id'] + keys}
+
+    def _fetch_for_ids(self, con, sql, args, subset):
+        """Run query for the ids in subset (all rows if subset is None)."""
+        if subset is None:
+            return con.execute(sql, args).fetchall()
+        glue = ' AND ' if 'WHERE' in sql else ' WHERE '
+        results = []
+        for i in range(0, len(subset), 500):
+            chunk = subset[i:i + 500].tolist()
+            q = ', '.join('?' * len(chunk))
+            results += con.execute(f'{sql}{glue}id IN ({q})',
+                                   args + chunk).fetchall()
+        return results
+
     def get_offset_string(self, offset, limit=None):
         sql = ''
         if not limit:
@@ -732,41 +1712,190 @@ class SQLite3Database(Database):
     @parallel_function
     def count(self, selection=None, **kwargs):
         keys, cmps = parse_selection(selection, **kwargs)
+        _, cmps = split_similar_to(cmps)  # does not change the count
         sql, args = self.create_select_statement(keys, cmps, what='COUNT(*)')
 
         with self.managed_connection() as con:
             cur = con.cursor()
-            cur.execute(sql, args)
-            return cur.fetchone()[0]
+            results, = execute(cur, sql, args)
+            return results[0][0]
+
+    def _read_fingerprints(self, parameters):
+        with self.managed_connection() as con:
+            cur = con.execute('SELECT value FROM information '
+                              'WHERE name="fingerprint_parameters"')
+            results = cur.fetchall()
+            if not results or json.loads(results[0][0]) != parameters:
+                return None, None
+            cur = con.execute('SELECT id, fingerprint FROM fingerprints '
+                              'ORDER BY id')
+            ids = []
+            blobs = []
+            for id, blob in cur:
+                ids.append(id)
+                blobs.append(blob)
+        vectors = np.frombuffer(b''.join(blobs), np.float32)
+        return (np.array(ids, np.int64),
+                vectors.reshape((len(ids), parameters['nbins'])))
+
+    def _write_fingerprints(self, ids, vectors, parameters):
+        if self.readonly or self.type != 'db':
+            return
+        txt = json.dumps(parameters)
+        with self.managed_connection() as con:
+            cur = con.execute('SELECT value FROM information '
+                              'WHERE name="fingerprint_parameters"')
+            results = cur.fetchall()
+            if not results:
+                for statement in fingerprint_statements:
+                    con.execute(statement)
+                con.execute('INSERT INTO information VALUES (?, ?)',
+                            ('fingerprint_parameters', txt))
+            elif json.loads(results[0][0]) != parameters:
+                # Made with other parameters:
+                con.execute('DELETE FROM fingerprints')
+                con.execute('UPDATE information SET value=? '
+                            'WHERE name="fingerprint_parameters"', [txt])
+            con.executemany('INSERT OR REPLACE INTO fingerprints '
+                            'VALUES (?, ?)',
+                            [(int(id), vector.tobytes())
+                             for id, vector in zip(ids, vectors)])
 
     def analyse(self):
         with self.managed_connection() as con:
             con.execute('ANALYZE')
 
+    def materialize_keys(self, keys):
+        """Promote key-value pairs to indexed columns of the systems table.
+
+        keys: list of str or dict
+            Names of the keys or a dict mapping names to their type
+            (float or str).  Types not given are guessed from the values
+            already in the database.
+
+        Each key gets a virtual column computed from the key-value pairs,
+        so existing rows are filled in when its indices are built and
+        later writes are kept up to date by SQLite itself.  Filtering and
+        sorting on the key will then use the indices instead of looking
+        up ids in the number_key_values and text_key_values tables.
+
+        Returns dict of the keys that were added and their SQL types.
+        """
+        if self.type != 'db':
+            raise NotImplementedError(
+                'Materialized keys are only supported for SQLite')
+        if not isinstance(keys, dict):
+            keys = dict.fromkeys(keys)
+
+        with self.managed_connection() as con:
+            self._upgrade(con)
+            added = {}
+            for key, type in keys.items():
+                if not word.match(key) or key in reserved_keys:
+                    raise ValueError(f'Bad key: {key}')
+                if key in self.materialized_keys:
+                    continue
+                if type is None:
+                    type = self._guess_key_type(con, key)
+                elif type in [str, 'TEXT']:
+                    type = 'TEXT'
+                elif type in [float, int, bool, 'REAL']:
+                    type = 'REAL'
+                else:
+                    raise ValueError(f'Bad type for {key}: {type}')
+                for statement in materialized_column_statements(key, type):
+                    con.execute(statement)
+                added[key] = type
+            if added:
+                # The planner needs statistics to use the indices for
+                # filtering (their first column is "column IS NULL"):
+                con.execute('ANALYZE')
+            self._materialized_keys = self._get_materialized_keys(con)
+        return added
+
+    @property
+    def materialized_keys(self):
+        """Dict mapping materialized keys to 'REAL' or 'TEXT'."""
+        if self.type != 'db':
+            return {}
+        if not self.initialized:
+            with self.managed_connection():
+                pass
+        return self._materialized_keys
+
+    def _guess_key_type(self, con, key):
+        """Most common type ('REAL' or 'TEXT') of the values of a key."""
+        if self._has_key_catalogue:
+            cur = con.execute(
+                'SELECT type FROM key_catalogue WHERE key=? '
+                'ORDER BY count DESC LIMIT 1', [key])
+            result = cur.fetchone()
+            return 'TEXT' if result and result[0] == 'text' else 'REAL'
+        cur = con.execute(
+            'SELECT (SELECT COUNT(*) FROM text_key_values WHERE key=?) > '
+            '(SELECT COUNT(*) FROM number_key_values WHERE key=?)',
+            [key, key])
+        return 'TEXT' if cur.fetchone()[0] else 'REAL'
+
+    def _get_materialized_keys(self, con):
+        """Find generated kv_<key> columns of the systems table."""
+        cur = con.execute('PRAGMA table_xinfo(systems)')
+        return {name[3:]: type.upper()
+                for _, name, type, _, _, _, hidden in cur.fetchall()
+                if name.startswith('kv_') and hidden in [2, 3]}
+
     @parallel_function
     @lock
     def delete(self, ids):
+        """Delete rows.
+
+        The freed pages are given back to the file system right away if
+        the file uses incremental auto-vacuum (all files created by this
+        version of ASE do).  Use vacuum() to shrink older files."""
         if len(ids) == 0:
             return
         table_names = self._get_external_table_names() + all_tables[::-1]
         with self.managed_connection() as con:
-            self._delete(con.cursor(), ids,
-                         tables=table_names)
-        self.vacuum()
+            self._upgrade(con)
+            cur = con.cursor()
+            self._delete(cur, ids, tables=table_names)
+            if self.type == 'db':
+                cur.execute('PRAGMA auto_vacuum')
+                if cur.fetchone()[0] == 2:  # INCREMENTAL
+                    cur.execute('PRAGMA incremental_vacuum').fetchall()
 
     def _delete(self, cur, ids, tables=None):
         tables = tables or all_tables[::-1]
+        if len(ids) == 1:
+            for table in tables:
+                cur.execute(f'DELETE FROM {table} WHERE id=?', (int(ids[0]),))
+            return
+
+        # Bind the ids through a temporary table (works for any number):
+        cur.execute('CREATE TEMPORARY TABLE IF NOT EXISTS delete_ids '
+                    '(id INTEGER PRIMARY KEY)')
+        cur.execute('DELETE FROM delete_ids')
+        cur.executemany('INSERT INTO delete_ids VALUES (?)',
+                        [(id,) for id in sorted({int(id) for id in ids})])
         for table in tables:
-            cur.execute('DELETE FROM {} WHERE id in ({});'.
-                        format(table, ', '.join([str(id) for id in ids])))
+            cur.execute(f'DELETE FROM {table} '
+                        'WHERE id IN (SELECT id FROM delete_ids)')
+        cur.execute('DELETE FROM delete_ids')
 
     def vacuum(self):
+        """Rebuild the file without unused space.
+
+        This rewrites the whole file.  The file is also switched to
+        incremental auto-vacuum, so that delete() gives back space from
+        then on."""
         if self.type != 'db':
             return
 
         with self.managed_connection() as con:
             con.commit()
-            con.cursor().execute("VACUUM")
+            cur = con.cursor()
+            cur.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            cur.execute('VACUUM')
 
     @property
     def metadata(self):
@@ -779,6 +1908,7 @@ class SQLite3Database(Database):
         self._metadata = dct
         md = json.dumps(dct)
         with self.managed_connection() as con:
+            self._upgrade(con)
             cur = con.cursor()
             cur.execute(
                 "SELECT COUNT(*) FROM information WHERE name='metadata'")
@@ -792,13 +1922,28 @@ class SQLite3Database(Database):
                             ('metadata', md))
 
     def _get_external_table_names(self, db_con=None):
-        """Return a list with the external table names."""
-        sql = "SELECT value FROM information WHERE name='external_table_name'"
-        with self.managed_connection() as con:
-            cur = con.cursor()
+        """Return a list with the external table names.
+
+        The list is cached on the connection (db_con or a managed one)."""
+        if db_con is None:
+            with self.managed_connection() as con:
+                return self._get_external_table_names(con)
+
+        names = getattr(db_con, 'external_table_names', None)
+        if names is None:
+            sql = ("SELECT value FROM information "
+                   "WHERE name='external_table_name'")
+            cur = db_con.cursor()
             cur.execute(sql)
-            ext_tab_names = [x[0] for x in cur.fetchall()]
-        return ext_tab_names
+            names = [x[0] for x in cur.fetchall()]
+            self._cache_external_table_names(db_con, names)
+        return list(names)
+
+    def _cache_external_table_names(self, con, names):
+        try:
+            con.external_table_names = names
+        except AttributeError:
+            pass  # connection type does not allow attributes
 
     def _external_table_exists(self, name):
         """Return True if an external table name exists."""
@@ -830,10 +1975,14 @@ class SQLite3Database(Database):
         with self.managed_connection() as con:
             cur = con.cursor()
             cur.execute(sql)
+            if self.create_indices:
+                cur.execute(f'CREATE INDEX IF NOT EXISTS {name}_id_index '
+                            f'ON {name}(id)')
             # Insert an entry saying that there is a new external table
             # present and an entry with the datatype
             cur.execute(sql2, ("external_table_name", name))
             cur.execute(sql2, (name + "_dtype", dtype))
+            self._cache_external_table_names(con, None)
 
     def delete_external_table(self, name):
         """Delete an external table."""
@@ -850,6 +1999,7 @@ class SQLite3Database(Database):
             cur.execute(sql, (name,))
             sql = "DELETE FROM information WHERE name=?"
             cur.execute(sql, (name + "_dtype",))
+            self._cache_external_table_names(con, None)
 
     def _convert_to_recognized_types(self, value):
         """Convert Numpy types to python types."""
@@ -930,14 +2080,63 @@ class SQLite3Database(Database):
 
         return dictionary
 
+    def _read_external_tables(self, con, names, ids):
+        """Read the rows with the given ids from external tables.
+
+        Returns dict mapping table names to dicts mapping ids to rows."""
+        tables = {}
+        cur = con.cursor()
+        for name in names:
+            rows = tables[name] = {}
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                q = ', '.join('?' * len(chunk))
+                # (SELECT * because "key" is a reserved word in MySQL)
+                cur.execute(f'SELECT * FROM {name} WHERE id IN ({q})',
+                            chunk)
+                for key, value, id in cur.fetchall():
+                    rows.setdefault(id, {})[key] = value
+        return tables
+
     def get_all_key_names(self):
         """Create set of all key names."""
         with self.managed_connection() as con:
             cur = con.cursor()
-            cur.execute('SELECT DISTINCT key FROM keys;')
+            if self._has_key_catalogue:
+                cur.execute('SELECT key FROM key_catalogue')
+            else:
+                cur.execute('SELECT DISTINCT key FROM keys;')
             all_keys = {row[0] for row in cur.fetchall()}
         return all_keys
 
+    def _key_stats(self):
+        if self.type != 'db':
+            return Database._key_stats(self)
+        with self.managed_connection() as con:
+            if not self._has_key_catalogue:
+                # Read-only file from before the catalogue:
+                return [(key, type, count, mn, mx)
+                        for type in ['number', 'text']
+                        for key, count, mn, mx in con.execute(
+                            'SELECT key, COUNT(*), MIN(value), MAX(value) '
+                            f'FROM {type}_key_values GROUP BY key')]
+            cur = con.execute('SELECT key, type, count, min_value, '
+                              'max_value, stale FROM key_catalogue')
+            stats = []
+            for key, type, count, mn, mx, stale in cur.fetchall():
+                if stale:
+                    mn, mx = con.execute(
+                        'SELECT MIN(value), MAX(value) '
+                        f'FROM {type}_key_values WHERE key=?',
+                        [key]).fetchone()
+                    if not self.readonly:
+                        con.execute(
+                            'UPDATE key_catalogue '
+                            'SET min_value=?, max_value=?, stale=0 '
+                            'WHERE key=? AND type=?', [mn, mx, key, type])
+                stats.append((key, type, count, mn, mx))
+        return stats
+
 
 if __name__ == '__main__':
     from ase.db import connect
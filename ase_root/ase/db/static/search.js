@@ -1,3 +1,289 @@
+// Table of rows rendered in the browser from the JSON API
+// (/api/v1/<project>/rows).  See init_table() in search.html.
+
+var ase_table = null;
+
+function init_table(project, columns, keys)
+{
+    // keys: {key: [shortdesc, longdesc, unit], ...}
+    ase_table = {project: project,
+                 columns: columns,
+                 default_columns: columns.slice(),
+                 keys: keys,
+                 args: [],
+                 sort: 'id',
+                 limit: 25,
+                 page: 0,
+                 cursors: {}};  // page -> cursor for start of page
+    search_rows();
+}
+
+function search_rows()
+{
+    ase_table.args = [];
+    var inputs = document.getElementsByClassName('ase-input');
+    for (var i = 0; i < inputs.length; i++) {
+        ase_table.args.push(encodeURIComponent(inputs[i].name) + '=' +
+                            encodeURIComponent(inputs[i].value));
+    }
+    goto_page(0, true);
+}
+
+function goto_page(page, reset)
+{
+    if (reset) {
+        // Order or selection changed:
+        ase_table.cursors = {};
+    }
+    ase_table.page = page;
+    var args = ase_table.args.concat(
+        ['columns=' + encodeURIComponent(ase_table.columns.join(',')),
+         'sort=' + encodeURIComponent(ase_table.sort),
+         'limit=' + ase_table.limit]);
+    var addr = '/api/v1/' + encodeURIComponent(ase_table.project) +
+        '/rows?' + args.join('&');
+    var cursor = ase_table.cursors[page];
+    if (cursor) {
+        addr += '&cursor=' + encodeURIComponent(cursor);
+    } else {
+        addr += '&offset=' + page * ase_table.limit;
+    }
+    var request = new XMLHttpRequest();
+    request.open('GET', addr, true);
+    request.onload = function() {
+        var data = JSON.parse(request.responseText);
+        var div = document.getElementById('database1');
+        if (data.error) {
+            div.innerHTML = '<ul class="list-group"><li class="' +
+                'list-group-item list-group-item-warning">' +
+                escape_html(data.error) + '</li></ul>';
+            return;
+        }
+        if (data.cursor) {
+            ase_table.cursors[page + 1] = data.cursor;
+        }
+        div.innerHTML = render_table(data);
+    }
+    request.send();
+}
+
+function sort_rows(column)
+{
+    if (ase_table.sort == column) {
+        ase_table.sort = '-' + column;
+    } else if (ase_table.sort == '-' + column) {
+        ase_table.sort = 'id';
+    } else {
+        ase_table.sort = column;
+    }
+    goto_page(0, true);
+}
+
+function toggle_column(column)
+{
+    var i = ase_table.columns.indexOf(column);
+    if (column == 'reset') {
+        ase_table.columns = ase_table.default_columns.slice();
+    } else if (i >= 0) {
+        ase_table.columns.splice(i, 1);
+        if (ase_table.sort.replace('-', '') == column) {
+            ase_table.sort = 'id';
+            goto_page(0, true);
+            return;
+        }
+    } else {
+        ase_table.columns.push(column);
+    }
+    goto_page(ase_table.page, false);
+}
+
+function set_limit(limit)
+{
+    ase_table.limit = limit;
+    goto_page(0, true);
+}
+
+function escape_html(txt)
+{
+    // Safe for text and for attribute values in single or double quotes
+    return String(txt).replace(/&/g, '&amp;').replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;').replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+function column_link(action, column, title, text, cls)
+{
+    // Link that calls action(column).  The column name goes into a
+    // data attribute, never into JavaScript source.
+    return '<a href="#"' + (cls ? ' class="' + cls + '"' : '') +
+        ' data-column="' + escape_html(column) +
+        '" onclick="' + action + '(this.dataset.column); return false;"' +
+        ' title="' + escape_html(title) + '">' + text + '</a>';
+}
+
+function format_value(value, column)
+{
+    // Same as Row.format() in ase/db/table.py
+    if (value === null) {
+        return '-';
+    }
+    if (column == 'formula') {
+        return escape_html(value).replace(/(\d+)/g, '<sub>$1</sub>');
+    }
+    if (typeof value == 'number' && !Number.isInteger(value)) {
+        return value.toFixed(3);
+    }
+    if (typeof value == 'object') {
+        return escape_html(JSON.stringify(value));
+    }
+    return escape_html(value);
+}
+
+function describe(column)
+{
+    return ase_table.keys[column] || [column, column, ''];
+}
+
+function pages(nrows)
+{
+    // Same as Session.paginate() in ase/db/web.py
+    var page = ase_table.page;
+    var limit = ase_table.limit;
+    var npages = Math.floor((nrows + limit - 1) / limit);
+    var p1 = Math.min(5, npages);
+    var p2 = Math.max(page - 4, p1);
+    var p3 = Math.min(page + 5, npages);
+    var p4 = Math.max(npages - 4, p3);
+    var pgs = [];
+    var p;
+    for (p = 0; p < p1; p++) pgs.push(p);
+    if (p1 < p2) pgs.push(-1);
+    for (p = p2; p < p3; p++) pgs.push(p);
+    if (p3 < p4) pgs.push(-1);
+    for (p = p4; p < npages; p++) pgs.push(p);
+    var result = [[page - 1, '&laquo;']];
+    for (var i = 0; i < pgs.length; i++) {
+        p = pgs[i];
+        if (p == -1) {
+            result.push([-1, '...']);
+        } else if (p == page) {
+            result.push([-1, String(p + 1), 'active']);
+        } else {
+            result.push([p, String(p + 1)]);
+        }
+    }
+    var nxt = Math.min(page + 1, npages - 1);
+    result.push([nxt == page ? -1 : nxt, '&raquo;']);
+    return result;
+}
+
+function render_table(data)
+{
+    var nrows = data.uids.length;
+    var row1 = ase_table.page * ase_table.limit + 1;
+    var html = ['<div class="row mt-2"><div class="col"><b>Displaying rows ',
+                row1, '-', Math.min(row1 + ase_table.limit - 1, data.nrows),
+                ' out of ', data.nrows, ' (total # or rows: ',
+                data.nrows_total, ')</b></div>'];
+
+    // Toolbar:
+    html.push('<div class="col"><div class="btn-toolbar justify-content-end">',
+              '<div class="dropdown"><button type="button" ',
+              'class="btn btn-secondary btn-sm dropdown-toggle" ',
+              'data-bs-toggle="dropdown">Add Column</button>',
+              '<ul class="dropdown-menu">');
+    var keys = Object.keys(ase_table.keys).sort(function(a, b) {
+        return describe(a)[1].localeCompare(describe(b)[1]);
+    });
+    for (var i = 0; i < keys.length; i++) {
+        if (ase_table.columns.indexOf(keys[i]) < 0) {
+            html.push('<li>',
+                      column_link('toggle_column', keys[i], keys[i],
+                                  escape_html(describe(keys[i])[1]) +
+                                  ' (' + escape_html(keys[i]) + ')',
+                                  'dropdown-item'),
+                      '</li>');
+        }
+    }
+    html.push('</ul></div><div class="dropdown"><button type="button" ',
+              'class="btn btn-secondary btn-sm dropdown-toggle" ',
+              'data-bs-toggle="dropdown">Rows: ', ase_table.limit,
+              '</button><ul class="dropdown-menu">');
+    var limits = [10, 25, 50, 100, 200];
+    for (i = 0; i < limits.length; i++) {
+        html.push('<li><a class="dropdown-item" href="javascript:set_limit(',
+                  limits[i], ')">', limits[i], '</a></li>');
+    }
+    var query = ase_table.args.join('&');
+    var project = escape_html(encodeURIComponent(ase_table.project));
+    html.push('</ul></div><div class="dropdown"><button type="button" ',
+              'class="btn btn-secondary btn-sm dropdown-toggle" ',
+              'data-bs-toggle="dropdown">Download</button>',
+              '<ul class="dropdown-menu">');
+    var formats = [['xyz', 'Extended XYZ'], ['cif', 'CIF files (zip)'],
+                   ['jsonl', 'ASE database (jsonl)']];
+    for (i = 0; i < formats.length; i++) {
+        html.push('<li><a class="dropdown-item" href="/export/',
+                  project, '?', escape_html(query),
+                  '&amp;sort=',
+                  escape_html(encodeURIComponent(ase_table.sort)),
+                  '&amp;format=', formats[i][0], '">', formats[i][1],
+                  '</a></li>');
+    }
+    html.push('</ul></div></div></div></div>');
+
+    // Table:
+    html.push('<div class="table-responsive mt-2">',
+              '<table id="rows" class="table table-hover table-striped"><tr>');
+    for (var c = 0; c < data.columns.length; c++) {
+        var column = data.columns[c];
+        var desc = describe(column);
+        var unit = desc[2] ? ' [' + desc[2] + ']' : '';
+        html.push('<th class="text-center">');
+        if (ase_table.sort == column) {
+            html.push('&#x2193; ');
+        } else if (ase_table.sort == '-' + column) {
+            html.push('&#x2191; ');
+        }
+        if (column == 'formula') {
+            html.push('<span title="key: formula">Formula</span>');
+        } else {
+            html.push(column_link('sort_rows', column,
+                                  'key: ' + column + unit,
+                                  escape_html(desc[0])));
+        }
+        html.push(' ', column_link('toggle_column', column, 'Remove column',
+                                   '&#x2715;'), '</th>');
+    }
+    html.push('</tr>');
+    for (var r = 0; r < nrows; r++) {
+        var link = '<a href="/' + project + '/row/' +
+            escape_html(encodeURIComponent(data.uids[r])) + '">';
+        html.push('<tr class="rowentry">');
+        for (c = 0; c < data.columns.length; c++) {
+            html.push('<td class="text-center">', link,
+                      format_value(data.values[c][r], data.columns[c]),
+                      '</a></td>');
+        }
+        html.push('</tr>');
+    }
+    html.push('</table></div>');
+
+    // Pagination:
+    html.push('<div class="text-center"><nav aria-label="Page navigation">',
+              '<ul class="pagination pagination-sm">');
+    var links = pages(data.nrows);
+    for (i = 0; i < links.length; i++) {
+        var href = links[i][0] >= 0 ?
+            'javascript:goto_page(' + links[i][0] + ')' : '#';
+        html.push('<li', links[i][2] ? ' class="active"' : '',
+                  '><a href="', href, '">', links[i][1], '</a></li>');
+    }
+    html.push('</ul></nav></div>');
+    return html.join('');
+}
+
+// Old version: table rendered on the server (/update/ and table.html).
 function update_table(sid, what, x)
 {
     request = new XMLHttpRequest();
@@ -4,7 +4,7 @@ from typing import List, Optional
 
 import numpy as np
 
-from ase.db.core import float_to_time_string, now
+from ase.db.core import float_to_time_string, normalize_sort, now
 
 all_columns = ['id', 'formula', 'space_group_number', 'pearson_symbol', 'mace_energy', 'ff_energy', 'vasp_energy', 'topology', 'remark']  
 
@@ -70,16 +70,24 @@ class Table:
         self.addcolumns: Optional[List[str]] = None
 
     def select(self, query, columns, sort, limit, offset,
-               show_empty_columns=False):
-        """Query datatbase and create rows."""
+               show_empty_columns=False, after=None):
+        """Query datatbase and create rows.
+
+        Use *after* instead of *offset* for keyset pagination
+        (see Database.select())."""
         sql_columns = get_sql_columns(columns)
         self.limit = limit
         self.offset = offset
+        if sort:
+            # Make sure the sort value is there for keyset_cursor():
+            sql_columns.append(normalize_sort(sort).lstrip('-'))
+        kwargs = {} if after is None else {'after': after}
         self.rows = [Row(row, columns, self.unique_key)
                      for row in self.connection.select(
                          query, verbosity=self.verbosity,
                          limit=limit, offset=offset, sort=sort,
-                         include_data=False, columns=sql_columns)]
+                         include_data=False, columns=sql_columns,
+                         **kwargs)]
 
         self.columns = list(columns)
 
@@ -1,12 +1,201 @@
 # fmt: off
 
 """Helper functions for Flask WSGI-app."""
-from typing import Dict, List, Optional, Tuple
+import itertools
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
 
-from ase.db.core import Database
+import numpy as np
+
+from ase.db.core import Database, keyset_cursor, parse_selection
+from ase.db.similarity import split_similar_to
+from ase.db.sqlite import ConnectionPool
 from ase.db.table import Table, all_columns
 
 
+def similarity_order(query, columns: List[str],
+                     sort: str) -> Tuple[List[str], str]:
+    """Columns and sort order to use for query.
+
+    Rows similar to a structure (similar_to=<id>) are shown in order of
+    similarity with a similarity column after the first column."""
+    try:
+        _, cmps = parse_selection(query)
+        target, _ = split_similar_to(cmps)
+    except ValueError:
+        return columns, sort  # reported when the rows are counted
+    if target is None:
+        return columns, sort
+    if 'similarity' not in columns:
+        columns = columns[:1] + ['similarity'] + columns[1:]
+    return columns, '-similarity'
+
+
+class SessionStore:
+    """Base class for session storage.
+
+    A store hands out session ids and keeps the state of the sessions
+    until they have not been used for *ttl* seconds or until more than
+    *maxsize* sessions exist (least recently used sessions are
+    forgotten first).
+    """
+
+    def __init__(self, maxsize: int = 2000, ttl: float = 24 * 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    def add(self, session: 'Session') -> int:
+        """Store new session and return its id."""
+        raise NotImplementedError
+
+    def get(self, id: int) -> 'Session':
+        """Return session.  Raises KeyError for unknown or old sessions."""
+        raise NotImplementedError
+
+    def put(self, session: 'Session') -> None:
+        """Save changes to an existing session."""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU store with O(1) lookup and eviction.
+
+    Only usable when all requests are handled by the same process.
+    """
+
+    def __init__(self, maxsize: int = 2000, ttl: float = 24 * 3600):
+        SessionStore.__init__(self, maxsize, ttl)
+        self._sessions: OrderedDict = OrderedDict()  # id -> (atime, session)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        id = next(self._ids)
+        with self._lock:
+            self._sessions[id] = (time.time(), session)
+            self._evict()
+        return id
+
+    def get(self, id):
+        with self._lock:
+            atime, session = self._sessions[id]
+            if time.time() - atime > self.ttl:
+                del self._sessions[id]
+                raise KeyError(id)
+            self._sessions[id] = (time.time(), session)
+            self._sessions.move_to_end(id)
+        return session
+
+    def put(self, session):
+        with self._lock:
+            if session.id in self._sessions:
+                self._sessions[session.id] = (time.time(), session)
+                self._sessions.move_to_end(session.id)
+
+    def _evict(self):
+        sessions = self._sessions
+        while len(sessions) > self.maxsize:
+            sessions.popitem(last=False)
+        oldest = time.time() - self.ttl
+        while sessions and next(iter(sessions.values()))[0] < oldest:
+            sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions stored in an SQLite file shared by several processes.
+
+    Use this when the app is served by more than one worker process, so
+    that ``/update/<sid>/...`` works no matter which worker gets the
+    request.
+    """
+
+    def __init__(self, filename: str, maxsize: int = 2000,
+                 ttl: float = 24 * 3600):
+        SessionStore.__init__(self, maxsize, ttl)
+        self.filename = str(filename)
+        self.pool = ConnectionPool(self._connect)
+        self._nadded = 0
+        con = self._connect()
+        con.execute('PRAGMA journal_mode=WAL')
+        with con:
+            con.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                        'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'atime REAL, '
+                        'state TEXT)')
+            con.execute('CREATE INDEX IF NOT EXISTS atime_index '
+                        'ON sessions(atime)')
+        con.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.filename, timeout=20,
+                               check_same_thread=False)
+
+    @contextmanager
+    def _transaction(self):
+        con = self.pool.acquire()
+        try:
+            with con:
+                yield con
+        finally:
+            self.pool.release(con)
+
+    def _execute(self, sql, args=()):
+        with self._transaction() as con:
+            cur = con.execute(sql, args)
+            return cur.lastrowid, cur.fetchall()
+
+    def add(self, session):
+        id, _ = self._execute(
+            'INSERT INTO sessions (atime, state) VALUES (?, ?)',
+            (time.time(), json.dumps(session.todict())))
+        self._nadded += 1
+        # Amortize the cost of eviction over many new sessions:
+        if self._nadded % max(self.maxsize // 10, 1) == 0:
+            self._evict()
+        return id
+
+    def get(self, id):
+        now = time.time()
+        with self._transaction() as con:
+            row = con.execute(
+                'SELECT state FROM sessions WHERE id=? AND atime>?',
+                (id, now - self.ttl)).fetchone()
+            if row is None:
+                raise KeyError(id)
+            con.execute('UPDATE sessions SET atime=? WHERE id=?', (now, id))
+        return Session.fromdict(id, json.loads(row[0]))
+
+    def put(self, session):
+        self._execute('UPDATE sessions SET atime=?, state=? WHERE id=?',
+                      (time.time(), json.dumps(session.todict()),
+                       session.id))
+
+    def _evict(self):
+        self._execute('DELETE FROM sessions WHERE atime<?',
+                      (time.time() - self.ttl,))
+        self._execute(
+            'DELETE FROM sessions WHERE atime<'
+            '(SELECT atime FROM sessions ORDER BY atime DESC '
+            'LIMIT 1 OFFSET ?)',
+            (self.maxsize - 1,))
+
+    def __len__(self):
+        _, rows = self._execute('SELECT COUNT(*) FROM sessions')
+        return rows[0][0]
+
+
 class Session:
     """Seesion object.
 
@@ -16,20 +205,13 @@ class Session:
         Displaying rows {{ s.row1 }}-{{ s.row2 }} out of {{ s.nrows }}
 
     where *s* is the session object.
+
+    Sessions live in Session.store, which can be replaced by an
+    SQLiteSessionStore when several processes serve the app.
     """
-    next_id = 1
-    sessions: Dict[int, 'Session'] = {}
+    store: SessionStore = MemorySessionStore()
 
     def __init__(self, project_name: str):
-        self.id = Session.next_id
-        Session.next_id += 1
-
-        Session.sessions[self.id] = self
-        if len(Session.sessions) > 2000:
-            # Forget old sessions:
-            for id in sorted(Session.sessions)[:400]:
-                del Session.sessions[id]
-
         self.columns: Optional[List[str]] = None
         self.nrows: Optional[int] = None
         self.nrows_total: Optional[int] = None
@@ -39,12 +221,34 @@ class Session:
         self.query = ''
         self.project_name = project_name
 
+        # Keyset cursors (sort value, id) for the start of pages that
+        # we know about (page number as string -> cursor):
+        self.cursors: Dict[str, Any] = {}
+
+        self.id = Session.store.add(self)
+
     def __str__(self) -> str:
         return str(self.__dict__)
 
+    def todict(self) -> Dict[str, Any]:
+        """State of session (without the id) as JSON-serializable dict."""
+        return {key: value for key, value in self.__dict__.items()
+                if key != 'id'}
+
+    @classmethod
+    def fromdict(cls, id: int, dct: Dict[str, Any]) -> 'Session':
+        session = cls.__new__(cls)
+        session.__dict__.update(dct)
+        session.id = id
+        return session
+
     @staticmethod
     def get(id: int) -> 'Session':
-        return Session.sessions[id]
+        return Session.store.get(id)
+
+    def save(self) -> None:
+        """Write changes back to the session store."""
+        Session.store.put(self)
 
     def update(self,
                what: str,
@@ -89,6 +293,10 @@ class Session:
                 else:
                     self.columns.append(column)
 
+        if what != 'page' and self.page == 0:
+            # Order or selection may have changed:
+            self.cursors = {}
+
     @property
     def row1(self) -> int:
         return self.page * self.limit + 1
@@ -146,13 +354,89 @@ class Session:
                 query = 'id=0'  # this will return no rows
                 self.nrows = 0
 
+        # Use keyset pagination when we know where the page starts, so
+        # that the next page is as cheap as the first one:
+        after = self.cursors.get(str(self.page))
+        offset = 0 if after is not None else self.page * self.limit
+
+        columns, sort = similarity_order(query, self.columns, self.sort)
         table = Table(db, uid_key)
-        table.select(query, self.columns, self.sort,
-                     self.limit, offset=self.page * self.limit,
-                     show_empty_columns=True)
+        table.select(query, columns, sort,
+                     self.limit, offset=offset,
+                     show_empty_columns=True, after=after)
+        if len(table.rows) == self.limit:
+            self.cursors[str(self.page + 1)] = list(
+                keyset_cursor(table.rows[-1].dct, sort))
         table.format()
         assert self.columns is not None
         table.addcolumns = sorted(column for column in
                                   [*all_columns, *keys]
                                   if column not in self.columns)
         return table
+
+
+# JSON API for tables of rows (see rows_json() and static/search.js):
+API_VERSION = 1
+MAX_API_LIMIT = 200
+
+
+def jsonable(value):
+    """Convert value of table cell to something JSON can represent."""
+    if isinstance(value, np.ndarray):
+        return jsonable(value.tolist())
+    if isinstance(value, (list, tuple)):
+        return [jsonable(x) for x in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def decode_cursor(txt: str) -> Tuple[Any, int]:
+    """Cursor from API request (JSON list: [sort value, id])."""
+    cursor = json.loads(txt)
+    if not (isinstance(cursor, list) and len(cursor) == 2 and
+            (cursor[0] is None or
+             isinstance(cursor[0], (str, int, float, bool))) and
+            isinstance(cursor[1], int) and not isinstance(cursor[1], bool)):
+        raise ValueError(f'Bad cursor: {txt}')
+    return tuple(cursor)
+
+
+def rows_json(db: Database,
+              uid_key: str,
+              query: str,
+              columns: List[str],
+              sort: str = 'id',
+              limit: int = 25,
+              offset: int = 0,
+              cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Page of rows as column-oriented dict of raw values.
+
+    Unlike Session.create_table() + table.html, nothing is formatted on
+    the server.  Use the returned cursor to get the next page cheaply.
+    Raises ValueError or KeyError for bad queries or cursors.
+    """
+    if offset < 0:
+        raise ValueError(f'Bad offset: {offset}')
+    after = None if cursor is None else decode_cursor(cursor)
+    columns, sort = similarity_order(query, columns, sort)
+    nrows = db.count(query)
+    table = Table(db, uid_key)
+    table.select(query, columns, sort, limit,
+                 offset=0 if after else offset,
+                 show_empty_columns=True, after=after)
+    next_cursor = None
+    if len(table.rows) == limit:
+        next_cursor = json.dumps(list(keyset_cursor(table.rows[-1].dct,
+                                                    sort)),
+                                 separators=(',', ':'))
+    return {'version': API_VERSION,
+            'nrows': nrows,
+            'nrows_total': db.count(),
+            'columns': table.columns,
+            'uids': [jsonable(row.uid) for row in table.rows],
+            'values': [[jsonable(row.values[i]) for row in table.rows]
+                       for i in range(len(table.columns))],
+            'cursor': next_cursor}
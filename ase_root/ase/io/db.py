@@ -34,6 +34,8 @@ def write_db(filename, images, append=False, **kwargs):
 
 read_json = read_db
 write_json = write_db
+read_jsonl = read_db
+write_jsonl = write_db
 read_postgresql = read_db
 write_postgresql = write_db
 read_mysql = read_db
@@ -439,6 +439,8 @@ F('gromacs', 'Gromacs coordinates', '1F',
 F('gromos', 'Gromos96 geometry file', '1F', ext='g96')
 F('html', 'X3DOM HTML', '1F', module='x3d')
 F('json', 'ASE JSON database file', '+F', ext='json', module='db')
+F('jsonl', 'ASE JSON-lines database file', '+S', ext='jsonl',
+  module='db')
 F('jsv', 'JSV file format', '1F')
 F('lammps-dump-text', 'LAMMPS text dump file', '+F',
   module='lammpsrun', magic_regex=b'.*?^ITEM: TIMESTEP$')
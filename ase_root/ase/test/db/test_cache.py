@@ -0,0 +1,66 @@
+import pytest
+
+from ase import Atoms
+from ase.db import connect
+from ase.db.cache import CachedDatabase, QueryCache
+
+
+@pytest.fixture()
+def db(tmp_path):
+    db = connect(tmp_path / 'test.db')
+    for i in range(10):
+        if i % 3:
+            db.write(Atoms('H' * (i + 1)), x=i, s='abcdefghij'[9 - i])
+        else:
+            db.write(Atoms('H' * (i + 1)))
+    return db
+
+
+@pytest.mark.parametrize('sort', [None, 'id', '-natoms', 'x', '-x', 's'])
+@pytest.mark.parametrize('query', ['', 'x>2', 'H<5', 'x', 'id=0'])
+def test_same_results(db, query, sort):
+    cdb = CachedDatabase(db)
+    assert cdb.count(query) == db.count(query)
+    for offset in [0, 2, 9]:
+        for limit in [None, 3]:
+            expected = [row.id for row in db.select(query, sort=sort,
+                                                    limit=limit,
+                                                    offset=offset)]
+            for _ in range(2):  # uncached and cached
+                rows = list(cdb.select(query, sort=sort, limit=limit,
+                                       offset=offset, columns=['id', 'x'],
+                                       include_data=False))
+                assert [row.id for row in rows] == expected
+
+
+def test_invalidation(db):
+    cdb = CachedDatabase(db)
+    assert cdb.count('x') == 6
+    assert cdb.count('x') == 6
+    assert cdb.cache.hits == 1
+    db.write(Atoms(), x=42)
+    assert cdb.count('x') == 7
+    assert len(list(cdb.select('x'))) == 7
+
+
+def test_data_keys(tmp_path):
+    db = connect(tmp_path / 'data.db')
+    for i in range(4):
+        db.write(Atoms('H'), x=i, data={'a': i, 'b': [i] * 3})
+    cdb = CachedDatabase(db)
+    for _ in range(2):  # uncached and cached
+        rows = list(cdb.select('x>1', sort='-x', data_keys=['a']))
+        assert [row.data for row in rows] == [{'a': 3}, {'a': 2}]
+    assert cdb.cache.hits == 1
+    rows = list(cdb.select('x>1', sort='-x', data_keys=['b', 'c']))
+    assert [list(row.data) for row in rows] == [['b'], ['b']]
+    assert cdb.cache.hits == 2
+
+
+def test_lru():
+    cache = QueryCache(maxsize=2)
+    for i in range(3):
+        cache.put(i, i)
+    assert cache.get(0) is None
+    assert cache.get(2) == 2
+    assert len(cache) == 2
@@ -34,6 +34,39 @@ def test_insert_into(cli, dbfile):
     assert num == 1
 
 
+def test_insert_into_bulk(cli, dbfile):
+    """Test --insert-into --bulk, also continuing after interruption."""
+    out = Path(dbfile).with_name('x2.db')
+    cli.ase(*f'db {dbfile} --limit 2 --insert-into {out} --bulk'.split())
+    txt = cli.ase(*f'db {dbfile} --insert-into {out} --bulk'.split())
+    assert 'Inserted 1 row' in txt
+    assert connect(out).count(carrots=4) == 1
+
+
+def test_insert_into_bulk_strip_data(cli, tmp_path):
+    """Resuming --insert-into --bulk --strip-data skips rows already there."""
+    path = tmp_path / 'data.db'
+    with connect(path) as db:
+        for n in range(3):
+            db.write(Atoms('H'), data={'n': n})
+    out = tmp_path / 'stripped.db'
+    args = f'db {path} --insert-into {out} --bulk --strip-data'
+    cli.ase(*f'{args} --limit 2'.split())
+    txt = cli.ase(*args.split())
+    assert 'Inserted 1 row' in txt
+    db = connect(out)
+    assert db.count() == 3
+    assert all(row.data == {} for row in db.select())
+
+
+def test_insert_into_bulk_not_sqlite(cli, dbfile):
+    """--bulk is only for SQLite targets."""
+    out = Path(dbfile).with_name('x4.json')
+    cli.ase(*f'db {dbfile} --insert-into {out} --bulk'.split(),
+            expect_fail=True)
+    assert not out.exists()
+
+
 def test_analyse(cli, dbfile):
     txt = cli.ase('db', dbfile, '--show-keys')
     print(txt)
@@ -14,7 +14,7 @@ ase -T db -v testase.json natoms=1,Cu=1 --delete --yes &&
 ase -T db -v testase.json "H>0" -k hydro=1,abc=42,foo=bar &&
 ase -T db -v testase.json "H>0" --delete-keys foo"""
 
-dbtypes = ['json', 'db']
+dbtypes = ['json', 'db', 'memory']
 
 
 @pytest.mark.slow()
@@ -24,11 +24,13 @@ def test_db(dbtype, cli, testdir):
         m = len(list(con.select(columns=['id'], *args, **kwargs)))
         assert m == n, (m, n)
 
-    name = f'testase.{dbtype}'
+    name = 'testase.' + ('db' if dbtype == 'memory' else dbtype)
 
     cli.shell(cmd.replace('testase.json', name))
 
-    with connect(name) as con:
+    # (type='memory': in-memory query engine for the SQLite file)
+    kwargs = {'type': 'memory'} if dbtype == 'memory' else {}
+    with connect(name, **kwargs) as con:
         assert con.get_atoms(H=1)[0].magmom == 1
         count(5)
         count(3, 'hydro')
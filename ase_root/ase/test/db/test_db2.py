@@ -5,16 +5,24 @@ import pytest
 from ase import Atoms
 from ase.build import molecule
 from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
 from ase.constraints import FixAtoms, FixBondLength
 from ase.db import connect
 from ase.io import read
 
 
-@pytest.mark.parametrize('dbtype', ['json', 'db'])
+def connect_to(name, dbtype):
+    """Connect to name.dbtype (dbtype='memory': name.db, type='memory')."""
+    if dbtype == 'memory':
+        return connect(f'{name}.db', type='memory')
+    return connect(f'{name}.{dbtype}')
+
+
+@pytest.mark.parametrize('dbtype', ['json', 'jsonl', 'db', 'memory'])
 def test_db2(testdir, dbtype):
-    name = f'testase.{dbtype}'
+    name = 'testase.' + ('db' if dbtype == 'memory' else dbtype)
 
-    c = connect(name)
+    c = connect_to('testase', dbtype)
     print(name, c)
 
     id = c.reserve(abc=7)
@@ -121,3 +129,184 @@ def test_sqlite_user(testdir):
     """Make sure user=someone works.  Is called username in SQLite."""
     db = connect('test_user.db')
     assert list(db.select(user='someone')) == []
+
+
+@pytest.mark.parametrize('dbtype', ['json', 'db', 'memory'])
+@pytest.mark.parametrize('sort', [None, 'id', '-id', 'energy', '-natoms',
+                                  'x', '-x', 's', 'user'])
+def test_keyset_pagination(testdir, dbtype, sort):
+    from ase.db.core import keyset_cursor
+    db = connect_to('keyset', dbtype)
+    for i in range(11):
+        kvp = {'x': i % 4, 's': 'abc'[i % 3]} if i % 5 else {}
+        atoms = Atoms('H' * (i % 3 + 1))
+        if i % 2:
+            atoms.calc = SinglePointCalculator(atoms, energy=(i % 3) * 1.0)
+        db.write(atoms, **kvp)
+
+    expected = [row.id for row in db.select(sort=sort)]
+    ids = []
+    after = None
+    while True:
+        rows = list(db.select(sort=sort, limit=3, after=after))
+        ids += [row.id for row in rows]
+        if len(rows) < 3:
+            break
+        after = keyset_cursor(rows[-1], sort)
+    assert ids == expected
+
+
+@pytest.mark.parametrize('dbtype', ['json', 'db', 'memory'])
+@pytest.mark.parametrize('batch_size', [1, 4])
+def test_streaming_select(testdir, dbtype, batch_size):
+    db = connect_to('stream', dbtype)
+    for i in range(11):
+        kvp = {'x': i % 4} if i % 5 else {}
+        db.write(Atoms('H' * (i % 3 + 1)), data={'i': i}, **kvp)
+
+    for kwargs in [{}, dict(sort='x'), dict(sort='-x', limit=5, offset=4),
+                   dict(selection='x>1', sort='natoms')]:
+        expected = [row.id for row in db.select(**kwargs)]
+        rows = list(db.select(batch_size=batch_size, **kwargs))
+        assert [row.id for row in rows] == expected
+    assert [row.data.i for row in db.select(batch_size=batch_size)] == \
+        list(range(11))
+
+
+@pytest.mark.parametrize('dbtype', ['json', 'db', 'memory'])
+def test_write_many(testdir, dbtype):
+    db = connect_to('many', dbtype)
+    images = []
+    for i in range(7):
+        atoms = Atoms('H' * (i + 1), pbc=i % 2)
+        atoms.calc = SinglePointCalculator(atoms, energy=-i)
+        images.append((atoms, {'i': i, 's': 'abc'[i % 3]}) if i % 2
+                      else atoms)
+    ids = db.write_many(images, key_value_pairs={'x': 1.5},
+                        data={'d': 42}, chunk_size=3)
+    assert ids == list(range(1, 8))
+    for i, id in enumerate(ids):
+        row = db.get(id)
+        assert row.natoms == i + 1
+        assert row.energy == -i
+        assert row.x == 1.5
+        assert row.data.d == 42
+        if i % 2:
+            assert row.i == i and row.s == 'abc'[i % 3]
+    assert db.count(s='b') == 1
+    assert db.count(H=4) == 1
+
+    # Copy rows with their own key-value pairs and data:
+    db2 = connect_to('many2', dbtype)
+    db2.write(Atoms())
+    assert db2.write_many(db.select(), key_value_pairs={'y': 2}) == \
+        list(range(2, 9))
+    assert db2.count('x=1.5,y=2') == 7
+    assert db2.get(3).data.d == 42
+    assert db2.get(5).s == 'a'
+
+    # Mixed Atoms and AtomsRow objects: data replaces the rows' own data
+    row = db2.get(3)
+    db3 = connect_to('many3', dbtype)
+    db3.write_many([Atoms('H'), row])
+    assert db3.get(1).data == {}
+    assert db3.get(2).data.d == 42
+    db3.write_many([Atoms('H'), db2.get(4)], data={'e': 1})
+    assert db3.get(3).data == {'e': 1}
+    assert db3.get(4).data == {'e': 1}
+
+
+@pytest.mark.parametrize('dbtype, lookup', [('json', True), ('db', True),
+                                            ('db', False), ('memory', True)])
+def test_select_columns(testdir, monkeypatch, dbtype, lookup):
+    if not lookup:
+        # Read whole columns instead of looking up rows by id:
+        monkeypatch.setattr('ase.db.sqlite.max_lookup_ids', 0)
+    db = connect_to('columns', dbtype)
+    images = []
+    for i in range(30):
+        atoms = Atoms('H' * (i % 4 + 1))
+        if i % 3:
+            atoms.calc = SinglePointCalculator(atoms, energy=-0.5 * i)
+        kvp = {'i': i, 'x': 0.25 * i, 's': 'abc'[i % 3]}
+        if i % 5 == 0:
+            kvp['mixed'] = 'text' if i % 2 else i
+        images.append((atoms, kvp))
+    db.write_many(images)
+
+    keys = ['natoms', 'energy', 'i', 'x', 's', 'mixed', 'missing']
+    for selection, sort, limit, offset in [(None, None, None, 0),
+                                           ('natoms>1', '-x', None, 0),
+                                           ('s=b', 'energy', 3, 1),
+                                           ('i>1000000', None, None, 0)]:
+        rows = list(db.select(selection, sort=sort, limit=limit,
+                              offset=offset))
+        columns = db.select_columns(keys, selection, sort=sort,
+                                    limit=limit, offset=offset)
+        assert list(columns) == ['id'] + keys
+        assert columns['id'].tolist() == [row.id for row in rows]
+        for key in keys:
+            assert columns[key].tolist() == [row.get(key) for row in rows]
+        if rows:
+            assert columns['i'].dtype == np.int64
+            assert columns['x'].dtype == np.float64
+            assert columns['s'].dtype == object
+
+
+@pytest.mark.parametrize('dbtype', ['json', 'db', 'memory'])
+def test_update_many(testdir, dbtype):
+    dbs = []
+    for name in ['loop', 'many']:
+        db = connect_to(name, dbtype)
+        for i in range(6):
+            db.write(Atoms('H' * (i + 1)), a=i, b='x' * (i % 2 + 1))
+        dbs.append(db)
+
+    loop, many = dbs
+    M = N = 0
+    for row in loop.select('H>2'):
+        m, n = loop.update(row.id, delete_keys=['b', 'c'], a=-1, c='new',
+                           d=True)
+        M += m
+        N += n
+    assert many.update_many('H>2', delete_keys=['b', 'c'], a=-1, c='new',
+                            d=True) == (M, N) == (8, 4)
+    assert many.update_many('c=new', delete_keys=['d']) == (0, 4)
+
+    for row in many.select():
+        expected = loop.get(row.id).key_value_pairs
+        expected.pop('d', None)
+        assert row.key_value_pairs == expected
+    for query in ['a=-1', 'b=x', 'c=new', 'd', 'a>0', 'c']:
+        assert many.count(query) == loop.count(query) - (query == 'd') * 4
+
+
+@pytest.mark.parametrize('dbtype', ['json', 'db', 'memory'])
+def test_data_keys(testdir, dbtype):
+    db = connect_to('data', dbtype)
+    dos = np.linspace(0, 1, 7)
+    db.write(Atoms('H'), data={'dos': dos, 'phonons': {'q': np.eye(3)},
+                               'n': 5, 'z': 1 + 2j})
+    db.write(Atoms('H'))
+
+    row = db.get(id=1)
+    assert sorted(row.data) == ['dos', 'n', 'phonons', 'z']
+    assert (row.data.dos == dos).all()
+    assert (row.data.phonons.q == np.eye(3)).all()
+    assert row.data['z'] == 1 + 2j
+
+    rows = list(db.select(data_keys=['dos', 'n', 'missing']))
+    assert list(rows[0].data) == ['dos', 'n']
+    assert (rows[0].data['dos'] == dos).all()
+    assert rows[0].data.n == 5
+    assert rows[1].data == {}
+    rows = list(db.select(data_keys=['dos'], include_data=False))
+    assert rows[0].data == {}
+
+    # Copying rows keeps all of the data:
+    db2 = connect_to('copy', dbtype)
+    db2.write_many(db.select())
+    assert db2.get(id=1).data.phonons.q.shape == (3, 3)
+    db2.update(1, data={'extra': 1})
+    assert sorted(db2.get(id=1).data) == ['dos', 'extra', 'n', 'phonons',
+                                          'z']
@@ -1,5 +1,6 @@
 # fmt: off
 import io
+import re
 
 import pytest
 
@@ -8,7 +9,7 @@ from ase.calculators.calculator import compare_atoms
 from ase.db import connect
 from ase.db.app import DatabaseProject
 from ase.db.cli import check_jsmol
-from ase.db.web import Session
+from ase.db.web import MemorySessionStore, Session, SQLiteSessionStore
 from ase.io import read
 
 projectname = 'db-web-test-project'
@@ -80,7 +81,7 @@ def test_db_web(client):
     c = client
 
     page = c.get('/').data.decode()
-    sid = Session.next_id - 1
+    sid = int(re.search(r'data-session-id="(\d+)"', page).group(1))
     assert 'foo' in page
     for url in [f'/update/{sid}/query/bla/?query=id=1',
                 f'/{projectname}/row/1']:
@@ -132,5 +133,310 @@ def test_paging(database):
     assert session.nrows_total == 2
 
 
+def test_create_app(database):
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+
+    app = create_app(database.filename)
+    app.testing = True
+    client = app.test_client()
+    assert client.get('/test').data == b'hello, world!'
+    name = 'test'  # project is named after the file
+    resp = client.get(f'/atoms/{name}/1/xyz')
+    assert resp.status_code == 200
+    assert 'Lattice' in resp.data.decode()
+
+
+@pytest.mark.parametrize('storetype', ['memory', 'sqlite'])
+def test_session_store(storetype, tmp_path, monkeypatch):
+    if storetype == 'memory':
+        store = MemorySessionStore(maxsize=3)
+    else:
+        store = SQLiteSessionStore(tmp_path / 'sessions.sqlite', maxsize=3)
+    monkeypatch.setattr(Session, 'store', store)
+
+    sessions = [Session('name') for _ in range(3)]
+    assert len({s.id for s in sessions}) == 3
+
+    session = Session.get(sessions[0].id)
+    session.page = 7
+    session.save()
+    assert Session.get(sessions[0].id).page == 7
+
+    # Least recently used session (number 2) is forgotten first:
+    for _ in range(5):
+        Session('name')
+    if storetype == 'memory':
+        assert len(store) == 3
+        with pytest.raises(KeyError):
+            Session.get(sessions[1].id)
+    else:
+        # Eviction is amortized.
+        assert len(store) <= 8
+
+    store.ttl = -1.0
+    with pytest.raises(KeyError):
+        Session.get(sessions[0].id)
+
+
+@pytest.fixture(scope='module')
+def lego_database(tmp_path_factory):
+    """Database with the keys shown in the default columns."""
+    db = connect(tmp_path_factory.mktemp('dbtest') / 'test.db')
+    db.write(get_atoms(), space_group_number=1, pearson_symbol='aP3',
+             mace_energy=-1.0, ff_energy=-1.1, vasp_energy=-1.2,
+             topology='abc', remark='none')
+    return db
+
+
+def test_shared_sessions(lego_database, tmp_path, monkeypatch):
+    """Two apps (workers) sharing a session file."""
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+
+    monkeypatch.setattr(Session, 'store', Session.store)
+    filename = tmp_path / 'sessions.sqlite'
+    clients = []
+    for _ in range(2):
+        app = create_app(lego_database.filename, sessions=filename)
+        app.testing = True
+        clients.append(app.test_client())
+
+    page = clients[0].get('/test/').data.decode()
+    sid = int(re.search(r'data-session-id="(\d+)"', page).group(1))
+    # Second worker can handle update request for session from the first:
+    Session.store = SQLiteSessionStore(filename)
+    resp = clients[1].get(f'/update/{sid}/limit/1/')
+    assert resp.status_code == 200
+    assert Session.get(sid).limit == 1
+
+
+def test_keyset_paging(database):
+    pytest.importorskip('flask')
+
+    session = Session('name')
+    project = DatabaseProject.dummyproject(default_columns=['bar'])
+    session.update('query', '', {'query': ''}, project)
+    session.update('limit', '1', {}, project)
+    table = session.create_table(database, 'id', ['foo'])
+    assert [row.uid for row in table.rows] == [1]
+    assert session.cursors == {'1': [1, 1]}
+
+    session.update('page', '1', {}, project)
+    table = session.create_table(database, 'id', ['foo'])
+    assert [row.uid for row in table.rows] == [2]
+
+    session.update('sort', 'id', {}, project)
+    assert session.page == 0 and session.cursors == {}
+
+
 def test_check_jsmol():
     check_jsmol()
+
+
+def test_static_files(client, tmp_path):
+    import gzip
+
+    from flask import Flask
+
+    from ase.db.httpcache import IMMUTABLE, StaticFiles
+
+    page = client.get('/').data.decode()
+    url = re.search(r'"(/static/style.css\?v=\w+)"', page).group(1)
+    resp = client.get(url)
+    assert resp.headers['Cache-Control'] == IMMUTABLE
+    assert resp.headers['Content-Type'].startswith('text/css')
+    # Wrong or no hash:
+    resp = client.get('/static/style.css?v=123')
+    assert 'immutable' not in resp.headers['Cache-Control']
+    assert client.get('/static/../app.py').status_code == 404
+
+    (tmp_path / 'x.js').write_text('var x = 1;\n' * 1000)
+    static = StaticFiles(tmp_path)
+    app = Flask('test', static_folder=None)
+    app.add_url_rule('/static/<path:filename>', 'static', static.response)
+    c = app.test_client()
+    resp = c.get('/static/x.js', headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(resp.data) == (tmp_path / 'x.js').read_bytes()
+    assert (tmp_path / 'x.js.gz').is_file()
+    etag = resp.headers['ETag']
+    resp = c.get('/static/x.js', headers={'Accept-Encoding': 'gzip',
+                                          'If-None-Match': etag})
+    assert resp.status_code == 304 and resp.data == b''
+    resp = c.get('/static/x.js', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert 'Content-Encoding' not in resp.headers
+
+    # Changed file gets a new hash:
+    (tmp_path / 'x.js').write_text('var x = 2;\n' * 1000)
+    resp = c.get('/static/x.js', headers={'Accept-Encoding': 'gzip',
+                                          'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert gzip.decompress(resp.data).startswith(b'var x = 2;')
+
+
+def test_etags(lego_database, tmp_path):
+    pytest.importorskip('flask')
+    import shutil
+
+    from ase.db.app import create_app
+
+    filename = tmp_path / 'etag.db'
+    shutil.copyfile(lego_database.filename, filename)
+    app = create_app(filename, immutable=False)
+    app.testing = True
+    c = app.test_client()
+
+    page = c.get('/etag/').data.decode()
+    sid = int(re.search(r'data-session-id="(\d+)"', page).group(1))
+    for url in ['/etag/row/1', '/atoms/etag/1/cif', '/atoms/etag/1/xyz',
+                f'/update/{sid}/limit/1/']:
+        resp = c.get(url)
+        assert resp.status_code == 200
+        etag = resp.headers['ETag']
+        assert resp.headers['Cache-Control'] == 'no-cache'
+        resp = c.get(url, headers={'If-None-Match': etag})
+        assert resp.status_code == 304, url
+        assert resp.data == b''
+
+        # New ETag when the row changes:
+        connect(filename).update(1, remark=url)
+        resp = c.get(url, headers={'If-None-Match': etag})
+        assert resp.status_code == 200
+        assert resp.headers['ETag'] != etag
+
+    # Other page of table:
+    etag = resp.headers['ETag']
+    resp = c.get(f'/update/{sid}/page/1/', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+
+
+def test_export(database):
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+
+    app = create_app(database.filename, max_export_rows=1)
+    app.testing = True
+    c = app.test_client()
+    resp = c.get('/export/test?query=id=1&format=xyz')
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert 'test.xyz' in resp.headers['Content-Disposition']
+    atoms = read(io.StringIO(resp.data.decode()), format='extxyz')
+    assert atoms.info['foo'] == 42.0
+    assert not compare_atoms(atoms, get_atoms(), 1e-10)
+
+    assert c.get('/export/test?query=&format=cif').status_code == 413
+    resp = c.get('/export/test?query=&format=cif&limit=1')
+    assert resp.headers['Content-Type'] == 'application/zip'
+    assert c.get('/export/test?format=abc').status_code == 400
+    assert c.get('/export/test?query=H>a&format=xyz').status_code == 400
+
+
+def test_export_bad_query_args(database, monkeypatch):
+    """Errors with non-str args are reported, not turned into a 500."""
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+
+    def count(self, query):
+        raise KeyError(1)
+
+    monkeypatch.setattr(type(database), 'count', count)
+    app = create_app(database.filename)
+    app.testing = True
+    resp = app.test_client().get('/export/test?query=x=1&format=xyz')
+    assert resp.status_code == 400
+    assert resp.data == b'Bad query, 1\n'
+
+
+def test_api(lego_database):
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+
+    app = create_app(lego_database.filename)
+    app.testing = True
+    c = app.test_client()
+    page = c.get('/test/').data.decode()
+    assert 'init_table("test"' in page
+
+    url = '/api/v1/test/rows?query=&columns=id,formula,pbc,mace_energy,x'
+    dct = c.get(url).json
+    assert dct['version'] == 1
+    assert dct['nrows'] == dct['nrows_total'] == 1
+    assert dct['columns'] == ['id', 'formula', 'pbc', 'mace_energy', 'x']
+    assert dct['values'] == [[1], ['H2O'], ['TTT'], [-1.0], [None]]
+    assert dct['uids'] == [1]
+    assert dct['cursor'] is None
+    # Same as the HTML table:
+    assert c.get('/api/test/rows?query=').json['columns'] == list(
+        DatabaseProject.load_db_as_ase_project('test', lego_database)
+        .default_columns)
+
+    resp = c.get('/api/v1/test/rows?query=H>a')
+    assert resp.status_code == 400
+    assert resp.json['error'].startswith('Bad query')
+    for bad in ['cursor=[1]', 'cursor=[[1],1]', 'cursor={"a":1}',
+                'cursor=[{"a":1},1]', 'cursor=[1,true]', 'cursor=[1',
+                'offset=-1']:
+        assert c.get('/api/v1/test/rows?' + bad).status_code == 400, bad
+
+
+def test_api_paging(database):
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+    from ase.db.web import rows_json
+
+    # Cursor continues where the previous page stopped:
+    dct = rows_json(database, 'id', '', ['id', 'foo'], sort='-foo', limit=1)
+    assert dct['values'] == [[1], [42.0]]
+    assert dct['cursor'] == '[42.0,1]'
+    dct = rows_json(database, 'id', '', ['id', 'foo'], sort='-foo',
+                    limit=1, cursor=dct['cursor'])
+    assert dct['values'] == [[2], [None]]
+    assert dct['cursor'] == '[null,2]'
+    assert rows_json(database, 'id', '', ['id'], limit=1,
+                     offset=1)['values'] == [[2]]
+
+    app = create_app(database.filename)
+    app.testing = True
+    c = app.test_client()
+    resp = c.get('/api/v1/test/rows?columns=id&limit=1&cursor=[1,1]')
+    assert resp.json['values'] == [[2]]
+    etag = resp.headers['ETag']
+    resp = c.get('/api/v1/test/rows?columns=id&limit=1&cursor=[1,1]',
+                 headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+
+
+def test_similar_to(lego_database, tmp_path):
+    pytest.importorskip('flask')
+    from ase.db.app import create_app
+
+    db = connect(tmp_path / 'similar.db')
+    for row in lego_database.select():
+        atoms = row.toatoms()
+        db.write(atoms, **row.key_value_pairs)
+        atoms.positions *= 1.1
+        db.write(atoms, **row.key_value_pairs)
+    app = create_app(db.filename)
+    app.testing = True
+    c = app.test_client()
+    assert b'?query=similar_to=1' in c.get('/similar/row/1').data
+
+    dct = c.get('/api/v1/similar/rows?query=similar_to=2&sort=id'
+                '&columns=id,formula&limit=1').json
+    assert dct['columns'] == ['id', 'similarity', 'formula']
+    assert dct['values'][:2] == [[2], [pytest.approx(1)]]
+    dct = c.get('/api/v1/similar/rows?query=similar_to=2&columns=id'
+                '&limit=1&cursor=' + dct['cursor']).json
+    assert dct['values'][0] == [1]
+
+    page = c.get('/similar/?query=similar_to=2').data.decode()
+    sid = int(re.search(r'data-session-id="(\d+)"', page).group(1))
+    html = c.get(f'/update/{sid}/query/0/?query=similar_to=2').data.decode()
+    assert html.index('/similar/row/2') < html.index('/similar/row/1')
+
+    xyz = c.get('/export/similar?query=similar_to=2&sort=id').data.decode()
+    assert xyz.index('id=2') < xyz.index('id=1')
@@ -0,0 +1,56 @@
+import io
+import zipfile
+
+import pytest
+
+from ase import Atoms
+from ase.db import connect
+from ase.db.export import export
+from ase.io import read
+
+
+@pytest.fixture()
+def db(testdir):
+    db = connect('x.db')
+    for n in range(1, 6):
+        atoms = Atoms('H' * n, [(0, 0, 0.5 * i) for i in range(n)],
+                      cell=[3, 3, 3], pbc=True)
+        db.write(atoms, n=n, name=f'h{n}', data={'abc': [1, n]})
+    return db
+
+
+def test_formats(db):
+    rows = list(db.select('n>1'))
+    chunks = list(export(rows, 'xyz', chunk_size=1))
+    assert len(chunks) == 5  # one per row and a last empty one
+    images = read(io.StringIO(b''.join(chunks).decode()), ':',
+                  format='extxyz')
+    assert [atoms.info['n'] for atoms in images] == [2, 3, 4, 5]
+    assert images[0].info['id'] == 2
+    assert images[0].info['name'] == 'h2'
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(export(rows, 'cif',
+                                                    'x')))) as zf:
+        assert zf.namelist() == [f'x-{id}.cif' for id in [2, 3, 4, 5]]
+        atoms = read(io.BytesIO(zf.read('x-5.cif')), format='cif')
+        assert atoms.get_chemical_formula() == 'H5'
+
+    with pytest.raises(ValueError):
+        list(export(rows, 'pdb'))
+
+
+def test_cli(cli, db):
+    cli.ase('db', 'x.db', 'n<4', '--export', 'y.jsonl')
+    rows = list(connect('y.jsonl').select())
+    assert [row.id for row in rows] == [1, 2, 3]
+    row = rows[2]
+    old = db.get(3)
+    assert row.name == 'h3'
+    assert row.data.abc == [1, 3]
+    assert (row.mtime, row.unique_id) == (old.mtime, old.unique_id)
+
+    cli.ase('db', 'x.db', '--export', 'y.xyz', '--sort=n-', '--limit=2')
+    assert [atoms.info['n'] for atoms in read('y.xyz', ':')] == [5, 4]
+    cli.ase('db', 'x.db', '--export', 'y.zip')
+    with zipfile.ZipFile('y.zip') as zf:
+        assert len(zf.namelist()) == 5
@@ -0,0 +1,69 @@
+import pytest
+
+from ase import Atoms
+from ase.db import connect
+from ase.db.core import keyset_cursor
+from ase.db.federated import FederatedDatabase, id_stride, sort_key
+
+
+@pytest.fixture()
+def names(tmp_path):
+    names = [tmp_path / 'a.db', tmp_path / 'b.json', tmp_path / 'c.db']
+    for n, name in enumerate(names):
+        db = connect(name)
+        for i in range(8):
+            kvp = {'i': 10 * n + i}
+            if (i + n) % 3:
+                kvp['x'] = (i + n) % 4
+                kvp['s'] = 'abc'[(i * n) % 3]
+            db.write(Atoms('H' * (i % 3 + 1)), **kvp)
+    return names
+
+
+@pytest.mark.parametrize('sort', [None, 'id', '-id', 'x', '-x', 's', '-s',
+                                  'natoms', '-natoms'])
+def test_merged_select(names, sort):
+    db = connect(names)
+    assert isinstance(db, FederatedDatabase)
+    rows = list(db.select(sort=sort))
+    assert len(rows) == db.count() == 24
+    ids = [row.id for row in rows]
+
+    if sort:
+        # Sorted with rows without the key last and ties by id:
+        keys = [sort_key(row, sort) for row in rows]
+        assert keys == sorted(keys)
+
+    for offset, limit in [(0, 5), (3, 7), (20, 10)]:
+        page = db.select(sort=sort, limit=limit, offset=offset)
+        assert [row.id for row in page] == ids[offset:offset + limit]
+
+    pages = []
+    after = None
+    while True:
+        page = list(db.select(sort=sort, limit=5, after=after))
+        pages += [row.id for row in page]
+        if len(page) < 5:
+            break
+        after = keyset_cursor(page[-1], sort)
+    assert pages == ids
+
+
+def test_namespaced_ids(names):
+    db = connect(str(names[0].parent / '*'))
+    assert len(db.shards) == 3
+    row = db.get(id=id_stride + 3)
+    assert row.i == 12
+    assert db.count(f'id>{id_stride}') == 16
+    assert db.count('x>1,H<3') == connect(names[0]).count('x>1,H<3') + \
+        connect(names[1]).count('x>1,H<3') + \
+        connect(names[2]).count('x>1,H<3')
+    db.update(2 * id_stride + 1, y=7)
+    assert connect(names[2]).get(1).y == 7
+    del db[2 * id_stride + 1]
+    assert db.count() == 23
+    assert db.update_many('i<12', z=1) == (10, 0)
+    assert db.count('z=1') == 10
+    assert db.get_all_key_names() == {'i', 's', 'x', 'z'}
+    with pytest.raises(NotImplementedError):
+        db.write(Atoms())
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from ase import Atoms
+from ase.db import connect
+from ase.db.jsonl import JSONLinesDatabase
+
+
+@pytest.fixture()
+def db(testdir):
+    db = connect('x.jsonl')
+    assert isinstance(db, JSONLinesDatabase)
+    db.write_many([(Atoms('H' * n), {'n': n}) for n in range(1, 6)])
+    return db
+
+
+def test_append_only(db):
+    size = os.path.getsize('x.jsonl')
+    db.update(2, n=22, data={'a': 1})
+    del db[3]
+    db.metadata = {'title': 'test'}
+    with open('x.jsonl', 'rb') as fd:
+        lines = fd.readlines()
+    # Old lines are untouched:
+    assert sum(len(line) for line in lines[:6]) == size
+    assert len(lines) == 9
+    assert db.count() == 4
+    assert db.get(2).n == 22
+    assert db.get(2).data == {'a': 1}
+    assert [row.id for row in db.select('n>1', sort='-n')] == [2, 5, 4]
+    with pytest.raises(KeyError):
+        db.get(3)
+    with pytest.raises(KeyError):
+        del db[3]
+    assert db.write(Atoms()) == 6
+
+
+def test_index(db):
+    db.update(1, n=11)
+    # Another connection reads the index and appends to it:
+    db2 = connect('x.jsonl')
+    assert db2.get(1).n == 11
+    db2.write(Atoms('He'), n=6)
+    assert db.get(6).n == 6
+
+    # Lines that are not in the index are read when opening:
+    with open('x.jsonl', 'ab') as fd:
+        fd.write(b'{"id": 4, "deleted": true}\n')
+        fd.write(b'{"id": 2, "row"')  # interrupted write
+    assert connect('x.jsonl').count() == 5
+
+    # The index is rebuilt if it does not fit the file:
+    os.remove('x.jsonl.index')
+    db3 = connect('x.jsonl')
+    assert db3.count() == 5
+    assert db3.write(Atoms()) == 7
+    assert os.path.getsize('x.jsonl.index') == 16 * 10
+    with open('x.jsonl', 'rb') as fd:
+        assert fd.read().count(b'\n') == 10
+
+
+def test_vacuum(cli, db):
+    for i in range(3):
+        db.update(1, i=i)
+    db.delete([2, 5])
+    db.metadata = {'x': 1}
+    db.metadata = {'x': 2}
+    size = os.path.getsize('x.jsonl')
+    rows = [row.toatoms() for row in db.select()]
+    cli.ase('db', 'x.jsonl', '--compact')
+    assert os.path.getsize('x.jsonl') < size
+    with open('x.jsonl', 'rb') as fd:
+        assert len(fd.readlines()) == 5
+    assert [row.toatoms() for row in db.select()] == rows
+    assert db.get(1).i == 2
+    assert connect('x.jsonl').metadata == {'x': 2}
+    # Ids of deleted rows are not used again:
+    assert db.write(Atoms()) == 6
+
+
+def test_convert(cli, db):
+    db.update(1, x=0.5, data={'abc': [1, 2]})
+    cli.ase('db', 'x.jsonl', '--insert-into', 'y.json')
+    cli.ase('db', 'y.json', '--insert-into', 'z.jsonl')
+    rows = list(connect('z.jsonl').select())
+    assert [row.n for row in rows] == [1, 2, 3, 4, 5]
+    assert rows[0].x == 0.5
+    assert rows[0].data.abc == [1, 2]
@@ -0,0 +1,57 @@
+import pytest
+
+from ase import Atoms
+from ase.db import connect
+
+
+def add_keys(row):
+    if row.natoms == 2:
+        return None
+    return {'n2': 2 * row.natoms, 's': 'x' * row.natoms}
+
+
+def sum_natoms(n, row):
+    return n + row.natoms
+
+
+@pytest.fixture(params=['db', 'json', 'memory'])
+def db(tmp_path, request):
+    if request.param == 'memory':
+        db = connect(tmp_path / 'test.db', type='memory')
+    else:
+        db = connect(tmp_path / f'test.{request.param}')
+    for i in range(10):
+        db.write(Atoms('H' * (i % 3 + 1)), i=i, s='a')
+    return db
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_map(db, processes):
+    assert db.map(add_keys, 'i>2', processes=processes, chunksize=3) == 5
+    for row in db.select():
+        if row.i > 2 and row.natoms != 2:
+            assert row.n2 == 2 * row.natoms
+            assert row.s == 'x' * row.natoms
+        else:
+            assert 'n2' not in row
+            assert row.s == 'a'
+    assert db.count('n2=2') == 3
+    assert db.count('s=a') == 5
+    assert db.count('s=xxx') == 2
+
+    assert db.reduce(sum_natoms, processes=processes, chunksize=4) == 19
+    assert db.reduce(sum_natoms, 'i<3', initial=100, processes=processes,
+                     combine=max) == 106
+
+
+def test_map_marker(db):
+    done = []
+
+    def progress(n, total):
+        done.append((n, total))
+
+    assert db.map(add_keys, marker='done', processes=1, chunksize=4,
+                  progress=progress) == 10
+    assert done == [(4, 10), (8, 10), (10, 10)]
+    assert db.count('done') == 10
+    assert db.map(add_keys, marker='done', processes=1) == 0
@@ -0,0 +1,91 @@
+import pytest
+
+from ase import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.db import connect
+from ase.db.core import keyset_cursor
+
+queries = ['', 'x>2', 'H<3', 'O=0', 'O', 'x', '-x', 's=b', 's<c', 'energy',
+           'energy<-0.2', 'pbc=TTT', 'H2O', 'x!=3', 'm', 'm=q', 'natoms>=3,s',
+           'id=0']
+sorts = [None, 'id', '-id', 'x', '-x', 's', '-s', 'energy', '-energy',
+         'natoms', 'm', '-m', 'user', 'calculator', 'pbc']
+
+
+def write_rows(db):
+    for i in range(30):
+        atoms = Atoms('H' * (i % 4 + 1) + 'O' * (i % 3),
+                      cell=[i % 5 + 1] * 3, pbc=i % 2)
+        if i % 3:
+            atoms.calc = SinglePointCalculator(atoms, energy=-0.1 * (i % 7))
+        kvp = {}
+        if i % 2:
+            kvp['x'] = i % 6
+        if i % 5:
+            kvp['s'] = 'abcd'[i % 4]
+        if i % 7 == 0:
+            kvp['m'] = 'q' if i % 2 else 1.5
+        db.write(atoms, **kvp)
+
+
+@pytest.fixture(scope='module')
+def dbs(tmp_path_factory):
+    name = tmp_path_factory.mktemp('memory') / 'test.db'
+    db = connect(name)
+    write_rows(db)
+    return db, connect(name, type='memory')
+
+
+@pytest.mark.parametrize('sort', sorts)
+def test_same_results_as_sqlite(dbs, sort):
+    db, mdb = dbs
+    keys = ['x', 's', 'm', 'energy', 'natoms', 'user']
+    for query in queries:
+        assert mdb.count(query) == db.count(query)
+        for offset, limit in [(0, None), (2, None), (3, 5), (0, 1)]:
+            expected = [row.id for row in db.select(query, sort=sort,
+                                                    limit=limit,
+                                                    offset=offset)]
+            rows = mdb.select(query, sort=sort, limit=limit, offset=offset)
+            assert [row.id for row in rows] == expected
+
+        for row in list(db.select(query, sort=sort))[::4]:
+            after = keyset_cursor(row, sort)
+            expected = [row.id for row in db.select(query, sort=sort,
+                                                    limit=5, after=after)]
+            rows = mdb.select(query, sort=sort, limit=5, after=after)
+            assert [row.id for row in rows] == expected
+
+        expected = db.select_columns(keys, query, sort=sort)
+        columns = mdb.select_columns(keys, query, sort=sort)
+        for key, values in expected.items():
+            assert columns[key].dtype == values.dtype
+            assert columns[key].tolist() == values.tolist()
+
+
+def test_json_source(tmp_path):
+    db = connect(tmp_path / 'test.db')
+    write_rows(db)
+    jdb = connect(tmp_path / 'test.json')
+    write_rows(jdb)
+    mdb = connect(tmp_path / 'test.db', type='memory')
+    mjdb = connect(tmp_path / 'test.json', type='memory')
+    for query in queries:
+        for sort in sorts:
+            assert ([row.id for row in mjdb.select(query, sort=sort)] ==
+                    [row.id for row in mdb.select(query, sort=sort)])
+
+
+def test_write_through(tmp_path):
+    mdb = connect(tmp_path / 'test.db', type='memory')
+    assert mdb.count() == 0
+    id = mdb.write(Atoms('H2'), x=1)
+    assert mdb.count('x=1') == 1
+    mdb.update(id, x=2, y='a')
+    assert mdb.count('x=1') == 0
+    assert mdb.get(y='a').x == 2
+    mdb.write_many([Atoms('H'), Atoms('O')])
+    assert mdb.count('H') == 2
+    del mdb[id]
+    assert mdb.count('H') == 1
+    assert mdb.get_all_key_names() == set()
@@ -16,10 +16,13 @@ plot = {'a': [0, 1, 2],
                    'ylabel': 'Answers'}}
 
 
-@pytest.mark.parametrize('name', ['md.json', 'md.db'])
-def test_metadata(name, testdir):
-    print(name)
-    db = connect(name)
+@pytest.mark.parametrize('name, type', [('md.json', 'json'),
+                                        ('md.jsonl', 'jsonl'),
+                                        ('md.db', 'db'),
+                                        ('md.db', 'memory')])
+def test_metadata(name, type, testdir):
+    print(name, type)
+    db = connect(name, type=type)
     db.write(Atoms('H'), answer=42, kind='atom', foo=True)
     db.write(Atoms('H2O'), answer=117, kind='molecule', foo=False, data=plot)
     db.metadata = {'test': 'ok'}
@@ -29,10 +32,10 @@ def test_metadata(name, testdir):
             'kind': ('Type', 'Type of system', ''),
             'answer': ('Answer', 'Answer to question', 'eV')}}
 
-    db = connect(name)
+    db = connect(name, type=type)
     md = db.metadata
     assert 'formula' in md['default_columns']
     md['title'] = 'TEST'
     db.metadata = md
 
-    assert connect(name).metadata['title'] == 'TEST'
+    assert connect(name, type=type).metadata['title'] == 'TEST'
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+from ase import Atoms
+from ase.db import connect, metrics
+from ase.db.metrics import normalize_sql
+
+
+@pytest.fixture
+def recorder():
+    slow_log = io.StringIO()
+    yield metrics.enable(slow_query_time=0.0, slow_query_log=slow_log)
+    metrics.disable()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(tmp_path / 'test.db')
+    for n in range(1, 6):
+        db.write(Atoms(f'H{n}'), n=n)
+    return db
+
+
+def test_normalize_sql():
+    assert (normalize_sql('SELECT id FROM systems WHERE id IN (?, ?, ?)\n'
+                          'LIMIT 25\nOFFSET 50') ==
+            'SELECT id FROM systems WHERE id IN (...) LIMIT ? OFFSET ?')
+
+
+def test_disabled(db):
+    assert metrics.recorder is None
+    assert db.count() == 5
+
+
+def test_queries(db, recorder):
+    assert db.count('n>2') == 3
+    assert len(list(db.select(limit=2))) == 2
+    assert len(list(db.select(limit=3))) == 3
+    assert len(db.select_columns(['n'])['n']) == 5
+    queries = recorder.queries.values
+    rows = recorder.query_rows.values
+    selects = [sql for sql, in queries
+               if sql.startswith('SELECT systems.id,') and 'LIMIT ?' in sql]
+    assert len(selects) == 1
+    assert queries[(selects[0],)] == 2
+    assert rows[(selects[0],)] == 5
+    counts = [sql for sql, in queries if sql.startswith('SELECT COUNT(*)')]
+    assert rows[(counts[0],)] == 1
+    assert recorder.query_latency.values[()][0][-1] == 0  # none > 10 s
+
+    log = recorder.slow_query_log.getvalue()
+    assert 'args: ' in log
+    assert 'plan:' in log
+
+
+def test_web(db, recorder):
+    pytest.importorskip('flask')
+    from ase.db.app import DBApp
+
+    dbapp = DBApp()
+    dbapp.add_project('abc', db)
+    client = dbapp.flask.test_client()
+    assert client.get('/api/abc/rows?query=n>1').status_code == 200
+    assert client.get('/api/abc/rows?query=n>1').status_code == 200
+    assert client.get('/abc/row/1').status_code == 200
+    txt = client.get('/metrics').data.decode()
+    assert ('ase_db_request_seconds_bucket{route="api_rows",le="+Inf"} 2'
+            in txt)
+    assert 'ase_db_responses_total{route="row",status="200"} 1' in txt
+    assert ('ase_db_render_seconds_count'
+            '{template="ase/db/templates/row.html"} 1' in txt)
+    assert 'ase_db_query_cache_hits_total{project="abc"} ' in txt
+    assert '\nase_db_sessions ' in txt
+    assert '# TYPE ase_db_sql_queries_total counter' in txt
+
+
+def test_no_metrics_route(db):
+    pytest.importorskip('flask')
+    from ase.db.app import DBApp
+
+    dbapp = DBApp()
+    dbapp.add_project('abc', db)
+    assert 'metrics_page' not in dbapp.flask.view_functions
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from ase.build import bulk, molecule
+from ase.db import connect
+from ase.db.cache import CachedDatabase
+from ase.db.core import keyset_cursor
+from ase.db.memory import MemoryDatabase
+from ase.db.similarity import (SimilarityIndex, fingerprint,
+                               pair_distances, parameters)
+from ase.neighborlist import neighbor_list
+
+
+def structures():
+    yield bulk('C', 'diamond', a=3.57), 'dia'
+    yield bulk('C', 'diamond', a=3.57).repeat(2), 'dia222'
+    yield bulk('Si', 'diamond', a=3.64), 'strained'
+    yield bulk('Cu', 'fcc', a=3.6), 'fcc'
+    yield bulk('Fe', 'bcc', a=2.87), 'bcc'
+    yield bulk('Cu', 'fcc', a=3.6, cubic=True), 'fcc4'
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(tmp_path / 'test.db')
+    for atoms, name in structures():
+        db.write(atoms, name=name)
+    return db
+
+
+@pytest.mark.parametrize('atoms', [bulk('Cu', 'fcc', a=3.6),
+                                   bulk('Si', 'diamond', a=5.43) * (5, 5, 5),
+                                   molecule('CH3CH2OH', vacuum=2.0, pbc=True),
+                                   molecule('C6H6', vacuum=1.0, pbc=[1, 1, 0]),
+                                   molecule('C60')])
+def test_pair_distances(atoms):
+    # Small systems in one go, large ones with neighbor_list():
+    assert np.allclose(np.sort(pair_distances(atoms, 6.4)),
+                       np.sort(neighbor_list('d', atoms, 6.4)))
+
+
+def test_fingerprint():
+    fps = [fingerprint(atoms) for atoms, _ in structures()]
+    for fp in fps:
+        assert fp.dtype == np.float32
+        assert np.linalg.norm(fp) == pytest.approx(1, abs=1e-6)
+    # Same structure, different cells:
+    assert fps[0] @ fps[1] == pytest.approx(1, abs=1e-5)
+    assert fps[3] @ fps[5] == pytest.approx(1, abs=1e-5)
+    assert 0.8 < fps[0] @ fps[2] < 0.99
+    assert fps[0] @ fps[4] < 0.8
+
+
+def test_index_search():
+    index = SimilarityIndex([1, 2, 5, 7],
+                            np.eye(4, dtype=np.float32)[[0, 1, 0, 2]])
+    vector = np.array([1, 0.5, 0, 0], np.float32)
+    assert index.search(vector)[0].tolist() == [1, 5, 2, 7]
+    assert index.search(vector, limit=1)[0].tolist() == [1]
+    assert index.search(vector, ids=[2, 5, 8])[0].tolist() == [5, 2]
+    assert index.search(vector, after=(1.0, 1))[0].tolist() == [5, 2, 7]
+    assert index.get(5).tolist() == [1, 0, 0, 0]
+    assert index.get(3) is None
+
+
+@pytest.mark.parametrize('wrap', [None, CachedDatabase, MemoryDatabase])
+def test_select(db, wrap):
+    if wrap:
+        db = wrap(db)
+    rows = list(db.select('similar_to=1'))
+    assert [row.name for row in rows[:3]] == ['dia', 'dia222', 'strained']
+    assert rows[0].similarity == pytest.approx(1)
+    assert all(r1.similarity >= r2.similarity
+               for r1, r2 in zip(rows, rows[1:]))
+    assert db.count('similar_to=1') == 6
+    assert db.count(similar_to=1, name='fcc') == 1
+
+    # Paging:
+    ids = [row.id for row in rows]
+    assert [row.id for row in db.select(similar_to=1, limit=2,
+                                        offset=3)] == ids[3:5]
+    after = keyset_cursor(rows[2], '-similarity')
+    assert [row.id for row in db.select(similar_to=1, limit=2,
+                                        sort='-similarity',
+                                        after=after)] == ids[3:5]
+
+    # Combined with other criteria:
+    assert [row.name for row in db.select('similar_to=4,Cu')] == ['fcc',
+                                                                  'fcc4']
+    columns = db.select_columns(['name'], 'similar_to=4,Cu')
+    assert columns['name'].tolist() == ['fcc', 'fcc4']
+
+    with pytest.raises(ValueError):
+        list(db.select(similar_to=1, sort='name'))
+    with pytest.raises(KeyError):
+        list(db.select(similar_to=42))
+
+
+def test_stored(db):
+    db.similarity_index()
+    readonly = connect(db.filename, readonly=True)
+    ids, vectors = readonly._read_fingerprints(parameters)
+    assert ids.tolist() == [1, 2, 3, 4, 5, 6]
+    assert vectors.shape == (6, 60)
+
+    # Triggers remove fingerprints of deleted and changed rows:
+    db.delete([2])
+    db.update(3, atoms=bulk('C', 'diamond', a=3.57))
+    with db.managed_connection() as con:
+        stored = [id for id, in con.execute('SELECT id FROM fingerprints')]
+    assert stored == [1, 4, 5, 6]
+    rows = list(db.select('similar_to=1', limit=2))
+    assert [row.id for row in rows] == [1, 3]
+    assert rows[1].similarity == pytest.approx(1)
+
+
+@pytest.mark.parametrize('ext', ['json', 'jsonl'])
+def test_other_backends(tmp_path, ext):
+    db = connect(tmp_path / f'test.{ext}')
+    for atoms, name in structures():
+        db.write(atoms, name=name)
+    names = [row.name for row in db.select(similar_to=4, limit=2)]
+    assert names == ['fcc', 'fcc4']
@@ -164,3 +164,39 @@ def test_external_table_upon_update_with_float(testdir):
     atoms = Atoms('Pb', positions=[[0, 0, 0]])
     uid = db.write(atoms)
     db.update(uid, external_tables={'float_table': ext_table})
+
+
+def test_select_reads_external_tables_in_batches(testdir):
+    with connect('test.db') as db:
+        for i in range(10):
+            db.write(Atoms(), external_tables={
+                "tab1": {"a": float(i)},
+                "tab2": {"b": i, "c": -i}})
+        db.write(Atoms())
+
+        statements = []
+        db.connection.set_trace_callback(statements.append)
+        rows = list(db.select())
+        db.connection.set_trace_callback(None)
+
+    assert [row.get('tab1', {}).get('a') for row in rows] == [
+        float(i) for i in range(10)] + [None]
+    assert rows[3]['tab2'] == {'b': 3, 'c': -3}
+    assert rows[10]['tab2'] == {}
+    # One select from systems and one from each external table:
+    assert len([sql for sql in statements
+                if sql.lstrip().upper().startswith('SELECT')]) <= 4
+
+
+def test_write_many_external_tables(testdir):
+    db = connect('test.db')
+    ids = db.write_many(
+        [(Atoms(), {'external_tables': {'tab1': {'a': float(i)}}, 'i': i})
+         for i in range(5)], chunk_size=2)
+    assert [db.get(id)['tab1'] for id in ids] == [{'a': float(i)}
+                                                  for i in range(5)]
+    # Rows keep their values in the external tables of the new database:
+    db2 = connect('test2.db')
+    db2._create_table_if_not_exists('tab1', 'REAL')
+    ids = db2.write_many(db.select('i<2'))
+    assert [db2.get(id)['tab1'] for id in ids] == [{'a': 0.0}, {'a': 1.0}]
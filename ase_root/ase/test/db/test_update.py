@@ -7,10 +7,13 @@ import ase.db
 from ase import Atoms
 
 
-@pytest.mark.parametrize('name', ['x.json', 'x.db'])
-def test_db(name, testdir):
-    print(name)
-    db = ase.db.connect(name, append=False)
+@pytest.mark.parametrize('name, type', [('x.json', 'json'),
+                                        ('x.jsonl', 'jsonl'),
+                                        ('x.db', 'db'),
+                                        ('x.db', 'memory')])
+def test_db(name, type, testdir):
+    print(name, type)
+    db = ase.db.connect(name, type=type, append=False)
     db.write(Atoms(), x=1, data={'a': 1})
     db.update(1, y=2, data={'b': 2})
     db.update(1, delete_keys=['x'])
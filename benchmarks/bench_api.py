@@ -0,0 +1,94 @@
+"""Table updates: JSON API versus server-rendered HTML fragments.
+
+    $ python benchmarks/bench_api.py --rows 100000
+
+Replays what a user does on the search page (search, page forward a few
+times, sort by an energy, page again, add a column) against the old
+/update/<sid>/<what>/<x>/ route (Table + Row.format() + table.html) and
+against /api/v1/<project>/rows (what static/search.js uses now), and
+reports payload size and server CPU time per table update.
+"""
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import database_name, make_lego_db, parser
+
+from ase.db.table import all_columns
+
+
+def html_updates(client, project, query):
+    page = client.get(f'/{project}/').data.decode()
+    sid = int(re.search(r'data-session-id="(\d+)"', page).group(1))
+    urls = [f'/update/{sid}/query/0/?query={query}']
+    urls += [f'/update/{sid}/page/{p}/' for p in range(1, 6)]
+    urls += [f'/update/{sid}/sort/mace_energy/']
+    urls += [f'/update/{sid}/page/{p}/' for p in range(1, 4)]
+    urls += [f'/update/{sid}/toggle/natoms/']
+    for url in urls:
+        yield lambda url=url: client.get(url).data
+
+
+def api_updates(client, project, query):
+    base = f'/api/v1/{project}/rows?query={query}&limit=25'
+    columns = ','.join(all_columns)
+    state = {'cursor': None}
+
+    def get(sort, columns=columns, next=True):
+        url = f'{base}&sort={sort}&columns={columns}'
+        if next and state['cursor']:
+            url += '&cursor=' + state['cursor']
+        resp = client.get(url)
+        state['cursor'] = resp.json['cursor']
+        return resp.data
+
+    yield lambda: get('id', next=False)
+    for _ in range(5):
+        yield lambda: get('id')
+    yield lambda: get('mace_energy', next=False)
+    for _ in range(3):
+        yield lambda: get('mace_energy')
+    yield lambda: get('mace_energy', columns + ',natoms', next=False)
+
+
+def measure(updates):
+    sizes = []
+    times = []
+    for update in updates:
+        t0 = time.process_time()
+        data = update()
+        times.append(time.process_time() - t0)
+        sizes.append(len(data))
+    return np.mean(sizes), np.mean(times)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--repeat', type=int, default=20,
+                   help='Number of times to replay (default: 20).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+
+    from ase.db.app import create_app
+    app = create_app(filename)
+    client = app.test_client()
+    project = Path(filename).stem
+
+    print(f'{"":22} {"kB/update":>10} {"ms/update":>10}')
+    for name, updates in [('HTML (/update/)', html_updates),
+                          ('JSON (/api/v1/)', api_updates)]:
+        results = []
+        for i in range(args.repeat + 1):
+            # Different queries, so that pages are not served from caches:
+            query = f'mace_energy<{-8 + i * 0.01:.2f}'
+            result = measure(updates(client, project, query))
+            if i > 0:  # first one is warm up
+                results.append(result)
+        size, cpu = np.mean(results, axis=0)
+        print(f'{name:22} {size / 1e3:10.1f} {cpu * 1e3:10.2f}')
+
+
+if __name__ == '__main__':
+    main()
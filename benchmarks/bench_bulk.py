@@ -0,0 +1,37 @@
+"""Import time for a large database: default mode versus bulk load mode.
+
+Both runs use write_many().  The bulk run includes end_bulk_load(),
+which builds the indices and runs ANALYZE::
+
+    $ python benchmarks/bench_bulk.py --rows 500000
+"""
+import tempfile
+from pathlib import Path
+
+from common import Timer, lego_rows, parser
+
+from ase.db import connect
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=500_000)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for bulk in [False, True]:
+            filename = Path(tmp) / f'bulk-{bulk}.db'
+            db = connect(filename, use_lock_file=False, bulk=bulk)
+            with Timer() as t:
+                db.write_many(lego_rows(args.rows))
+            with Timer() as t2:
+                if bulk:
+                    db.end_bulk_load()
+            total = t.elapsed + t2.elapsed
+            assert connect(filename).count('mace_energy<-9') > 0
+            print(f'bulk={bulk!s:5}  insert {t.elapsed:8.1f} s   '
+                  f'indices {t2.elapsed:6.1f} s   total {total:8.1f} s   '
+                  f'{args.rows / total:8.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark of the query-result cache used by the web app.
+
+Simulates a user clicking through the pages of a query result, with and
+without ase.db.cache.CachedDatabase::
+
+    $ python benchmarks/bench_cache.py --rows 100000 --pages 20
+"""
+import time
+
+from common import database_name, make_lego_db, parser, report
+
+from ase.db import connect
+from ase.db.cache import CachedDatabase
+from ase.db.project import DatabaseProject
+from ase.db.table import all_columns
+from ase.db.web import Session
+
+QUERIES = ['', 'mace_energy<-8.5', 'pearson_symbol=hP4', 'natoms<10']
+
+
+def clicks(db, pages):
+    """Yield a list of timings for each query."""
+    project = DatabaseProject.dummyproject(default_columns=all_columns)
+    for query in QUERIES:
+        session = Session('bench')
+        session.update('query', '', {'query': query}, project)
+        times = []
+        actions = ([('page', str(page)) for page in range(pages)] +
+                   [('sort', 'mace_energy'), ('sort', 'mace_energy')] +
+                   [('page', str(page)) for page in range(pages)])
+        for what, x in [('query', '')] + actions:
+            if what != 'query':
+                session.update(what, x, {}, project)
+            t0 = time.perf_counter()
+            session.create_table(db, 'id', keys=[])
+            times.append(time.perf_counter() - t0)
+        yield query, times
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--pages', type=int, default=20,
+                   help='Number of pages to click through (default: 20).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+
+    for label, db in [('plain', connect(filename)),
+                      ('cached', CachedDatabase(connect(filename)))]:
+        print(f'\n{label}:')
+        for query, times in clicks(db, args.pages):
+            report(f'{query or "(all)"}: first', times[:1])
+            report(f'{query or "(all)"}: later clicks', times[1:])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Columnar reads with select_columns() versus iterating over rows.
+
+Reads the values of a few keys for all selected rows, either by
+collecting them from select() rows (what "ase db --plot" and
+"--show-values" used to do) or as NumPy arrays with select_columns()::
+
+    $ python benchmarks/bench_columns.py --rows 1000000
+"""
+from common import Timer, database_name, make_lego_db, parser, rss_mb
+
+from ase.db import connect
+
+KEYS = ['natoms', 'volume', 'mace_energy', 'space_group_number', 'topology']
+QUERIES = [(None, None), ('space_group_number>100', 'mace_energy')]
+
+
+def rows(db, selection, sort):
+    columns = {key: [] for key in KEYS}
+    for row in db.select(selection, sort=sort, include_data=False):
+        for key, values in columns.items():
+            values.append(row.get(key))
+    return columns
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=1_000_000)
+    p.add_argument('--repeat', type=int, default=3)
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+    db = connect(filename, readonly=True)
+
+    print(f'{"query":24} {"sort":12} {"rows":>8} {"select [s]":>11} '
+          f'{"columns [s]":>12} {"speedup":>8}')
+    for selection, sort in QUERIES:
+        times = []
+        for read in [rows, lambda db, selection, sort:
+                     db.select_columns(KEYS, selection, sort=sort)]:
+            best = float('inf')
+            for _ in range(args.repeat):
+                with Timer() as t:
+                    columns = read(db, selection, sort)
+                best = min(best, t.elapsed)
+            times.append(best)
+        n = len(columns['natoms'])
+        print(f'{selection or "(all)":24} {sort or "(id)":12} {n:8} '
+              f'{times[0]:11.2f} {times[1]:12.2f} '
+              f'{times[0] / times[1]:7.1f}x')
+    print(f'peak RSS {rss_mb():.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
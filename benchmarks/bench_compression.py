@@ -0,0 +1,77 @@
+"""File size and read/write throughput of compressed blobs.
+
+    $ python benchmarks/bench_compression.py --rows 500
+
+The rows are frames of an EMT molecular dynamics run of a 500-atom Cu
+cell at 800 K with positions, momenta, forces and stress, which is what
+databases built from trajectories look like.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from common import Timer, parser
+
+from ase import units
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.db import connect
+from ase.md.velocitydistribution import MaxwellBoltzmannDistribution
+from ase.md.verlet import VelocityVerlet
+
+CODECS = [None,
+          'zlib',
+          'shuffle+zlib',
+          'shuffle+lzma',
+          {'default': 'shuffle+zlib',
+           'momenta': 'float32+shuffle+zlib',
+           'forces': 'float32+shuffle+zlib'}]
+
+
+def md_frames(nframes):
+    atoms = bulk('Cu', cubic=True) * (5, 5, 5)
+    atoms.calc = EMT()
+    MaxwellBoltzmannDistribution(atoms, temperature_K=800,
+                                 rng=np.random.default_rng(0))
+    dyn = VelocityVerlet(atoms, 5 * units.fs)
+    frames = []
+    for _ in range(nframes):
+        dyn.run(2)
+        frame = atoms.copy()
+        frame.calc = SinglePointCalculator(
+            frame, energy=atoms.get_potential_energy(),
+            forces=atoms.get_forces(), stress=atoms.get_stress())
+        frames.append(frame)
+    return frames
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=500)
+    args = p.parse_args()
+    with Timer() as t:
+        frames = md_frames(args.rows)
+    print(f'{args.rows} MD frames of {len(frames[0])} atoms '
+          f'in {t.elapsed:.1f} s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, codec in enumerate(CODECS):
+            filename = Path(tmp) / f'{i}.db'
+            db = connect(filename, compression=codec)
+            with Timer() as write:
+                db.write_many(frames)
+            size = os.path.getsize(filename) / 1e6
+            db = connect(filename, readonly=True)
+            with Timer() as read:
+                for row in db.select():
+                    row.positions, row.forces, row.momenta
+            name = codec if isinstance(codec, str) else (
+                'float32 forces/momenta' if codec else 'none')
+            print(f'{name:24} {size:8.1f} MB   '
+                  f'write {args.rows / write.elapsed:7.0f} rows/s   '
+                  f'read {args.rows / read.elapsed:7.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Latency of reading one data entry from rows with large arrays.
+
+    $ python benchmarks/bench_data.py --rows 2000
+
+Each row carries a small DOS array and a large phonon array (by default
+2 MB).  The rows are read in three ways:
+
+* select() and decode everything with bytes_to_object() (what
+  row.data used to do),
+* select() and only look at row.data['dos'] (lazy decoding),
+* select(data_keys=['dos']) (only the needed parts of the blob are
+  read from the file).
+"""
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from common import Timer, lego_rows, parser, report
+
+from ase.db import connect
+from ase.db.core import bytes_to_object
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=2000)
+    p.add_argument('--phonon-size', type=int, default=250_000,
+                   help='Number of floats in the phonon array.')
+    p.add_argument('--repeat', type=int, default=5)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(0)
+    phonons = rng.random(args.phonon_size)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = Path(tmp) / 'data.db'
+        db = connect(filename, use_lock_file=False)
+        db.write_many(((atoms, kvp) for atoms, kvp in lego_rows(args.rows)),
+                      data={'dos': rng.random(500), 'phonons': phonons})
+
+        def full():
+            return sum(bytes_to_object(row._data)['dos'].sum()
+                       for row in db.select())
+
+        def lazy():
+            return sum(row.data['dos'].sum() for row in db.select())
+
+        def data_keys():
+            return sum(row.data['dos'].sum()
+                       for row in db.select(data_keys=['dos']))
+
+        for name, func in [('full decode', full),
+                           ('lazy row.data', lazy),
+                           ('select(data_keys=...)', data_keys)]:
+            times = []
+            for _ in range(args.repeat):
+                with Timer() as t:
+                    func()
+                times.append(t.elapsed / args.rows)
+            report(f'{name} (per row)', times)
+
+
+if __name__ == '__main__':
+    main()
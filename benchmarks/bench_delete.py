@@ -0,0 +1,51 @@
+"""Latency of deleting a few rows from a large file.
+
+    $ python benchmarks/bench_delete.py --rows 100000
+
+Compares delete() on a file with incremental auto-vacuum with
+delete() followed by a full VACUUM, which is what delete() used to do.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from common import Timer, database_name, make_lego_db, parser, report
+
+from ase.db import connect
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--delete', type=int, default=10,
+                   help='Number of rows to delete each time (default: 10).')
+    p.add_argument('--repeat', type=int, default=5)
+    args = p.parse_args()
+    original = make_lego_db(database_name(args), args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = Path(tmp) / 'copy.db'
+        shutil.copy(original, filename)
+        db = connect(filename, use_lock_file=False)
+        with Timer() as t:
+            db.vacuum()  # switch to incremental auto-vacuum
+        size = os.path.getsize(filename) / 1e6
+        print(f'{size:.0f} MB file, vacuum() took {t.elapsed:.2f} s')
+
+        ids = [row.id for row in db.select(columns=['id'],
+                                           include_data=False)]
+        for name, vacuum in [('delete()', False),
+                             ('delete() + VACUUM', True)]:
+            times = []
+            for _ in range(args.repeat):
+                chunk, ids = ids[:args.delete], ids[args.delete:]
+                with Timer() as t:
+                    db.delete(chunk)
+                    if vacuum:
+                        db.vacuum()
+                times.append(t.elapsed)
+            report(f'{name} ({args.delete} rows)', times)
+
+
+if __name__ == '__main__':
+    main()
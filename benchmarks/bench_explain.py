@@ -0,0 +1,99 @@
+"""Query plans and timings for the query forms of parse_selection().
+
+Runs "ase db --explain" for every kind of selection (key present/absent,
+numeric and text comparisons, species counts, systems columns) and every
+kind of sort, checks that the key-value and species tables are only
+searched through their indices and that sorting on a key-value pair does
+not need a temporary B-tree, and then times the queries::
+
+    $ python benchmarks/bench_explain.py --rows 100000
+"""
+import contextlib
+import io
+import sys
+
+from common import Timer, database_name, make_lego_db, parser, report
+
+from ase.cli.main import main as ase_main
+from ase.db import connect
+
+SIDE_TABLES = ['keys', 'species', 'text_key_values', 'number_key_values']
+
+# (selection, sort)
+QUERIES = [
+    ('remark', 'id'),  # key present
+    ('-remark', 'id'),  # key absent
+    ('mace_energy<-9.5', 'id'),
+    ('mace_energy>=-7.0', 'id'),
+    ('space_group_number=227', 'id'),
+    ('space_group_number!=227', 'id'),
+    ('pearson_symbol=cF8', 'id'),
+    ('topology<dia', 'id'),
+    ('remark=new,mace_energy<-9', 'id'),
+    ('C>20', 'id'),  # species
+    ('C=8', 'id'),
+    ('H=0', 'id'),  # "not in" form
+    ('C8', 'id'),  # formula
+    ('natoms>20', 'id'),  # systems column
+    ('', 'mace_energy'),
+    ('', '-mace_energy'),
+    ('', 'pearson_symbol'),
+    ('', '-topology'),
+    ('mace_energy<-9.5', 'vasp_energy'),
+    ('pearson_symbol=cF8', '-ff_energy'),
+]
+
+
+def explain(filename, selection, sort):
+    """Query plan as printed by "ase db --explain"."""
+    args = ['db', '--explain', f'--sort={sort}', '--', str(filename)]
+    if selection:
+        args.append(selection)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        ase_main(args=args)
+    return out.getvalue()
+
+
+def check(plan, selection, sort):
+    problems = [f'full scan of {table}' for table in SIDE_TABLES
+                if f'SCAN {table}' in plan]
+    if (sort != 'id' and not selection and
+            'TEMP B-TREE FOR ORDER BY' in plan):
+        problems.append('sorting in temporary B-tree')
+    return problems
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('-v', '--verbose', action='store_true',
+                   help='Print query plans.')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+    db = connect(filename, readonly=True)
+
+    failed = 0
+    for selection, sort in QUERIES:
+        plan = explain(filename, selection, sort)
+        problems = check(plan, selection, sort)
+        failed += bool(problems)
+        if args.verbose or problems:
+            print(plan)
+        times = []
+        for _ in range(args.repeat):
+            with Timer() as t:
+                list(db.select(selection, sort=sort, limit=25,
+                               include_data=False))
+            times.append(t.elapsed)
+        name = f'{selection or "all"} ({sort})'
+        report(name, times)
+        for problem in problems:
+            print(f'    FAIL: {problem}')
+
+    if failed:
+        sys.exit(f'{failed} queries did not use the indices')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Bulk export throughput: /export/ versus one /atoms/ request per row.
+
+    $ python benchmarks/bench_export.py --rows 100000 --export-rows 10000
+
+Structures per second for the streamed /export/<project> response in each
+format (read through Flask's test client) and for "ase db --export",
+compared with fetching the same structures one at a time from
+/atoms/<project>/<id>/<type> as scripts had to do before.  Also shows
+the peak Python memory while exporting (should not grow with the number
+of rows).
+"""
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from common import Timer, database_name, make_lego_db, parser
+
+from ase.db import connect
+
+
+def stream(client, url):
+    resp = client.get(url)
+    assert resp.status_code == 200, resp.data
+    nbytes = 0
+    for chunk in resp.response:
+        nbytes += len(chunk)
+    return nbytes
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--export-rows', type=int, default=10000,
+                   help='Rows to export (default: 10000).')
+    p.add_argument('--single-rows', type=int, default=500,
+                   help='Rows fetched one at a time (default: 500).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+    n = args.export_rows
+
+    from ase.db.app import create_app
+    app = create_app(filename, max_export_rows=n)
+    client = app.test_client()
+    project = Path(filename).stem
+    query = f'id<={n}'
+
+    print(f'{"":22} {"rows/s":>10} {"MB":>8}')
+    for type in ['xyz', 'cif']:
+        m = args.single_rows
+        with Timer() as t:
+            nbytes = sum(stream(client, f'/atoms/{project}/{id}/{type}')
+                         for id in range(1, m + 1))
+        print(f'/atoms/ {type:14} {m / t.elapsed:10.0f} '
+              f'{nbytes / m * n / 1e6:8.1f}')
+
+    for format in ['xyz', 'jsonl', 'cif']:
+        with Timer() as t:
+            nbytes = stream(client, f'/export/{project}?query={query}'
+                            f'&format={format}')
+        print(f'/export/ {format:13} {n / t.elapsed:10.0f} '
+              f'{nbytes / 1e6:8.1f}')
+
+    db = connect(filename, readonly=True)
+    from ase.db.export import export
+    with tempfile.TemporaryDirectory() as tmp:
+        for format, ext in [('xyz', 'xyz'), ('jsonl', 'jsonl'),
+                            ('cif', 'zip')]:
+            out = Path(tmp) / f'export.{ext}'
+            with Timer() as t:
+                with open(out, 'wb') as fd:
+                    for chunk in export(db.select(query, batch_size=1000),
+                                        format):
+                        fd.write(chunk)
+            print(f'ase db --export .{ext:6} {n / t.elapsed:10.0f} '
+                  f'{out.stat().st_size / 1e6:8.1f}')
+
+    print('Peak Python memory for jsonl export:')
+    for m in [n, min(5 * n, args.rows)]:
+        tracemalloc.start()
+        for chunk in export(db.select(f'id<={m}', batch_size=1000),
+                            'jsonl'):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'  {m:8} rows: {peak / 1e6:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
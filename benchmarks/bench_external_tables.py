@@ -0,0 +1,63 @@
+"""Throughput of select() with 0, 1 and 5 external tables.
+
+Every row of the test databases has an entry in each external table
+(a handful of REAL values per row)::
+
+    $ python benchmarks/bench_external_tables.py --rows 20000
+"""
+from pathlib import Path
+
+import numpy as np
+from common import Timer, lego_rows, parser, report
+
+from ase.db import connect
+
+
+def make_db(filename, nrows, ntables):
+    filename = Path(filename)
+    if filename.is_file():
+        with connect(filename) as db:
+            if db.count() == nrows:
+                return filename
+        filename.unlink()
+    rng = np.random.default_rng(7)
+    with connect(filename, use_lock_file=False) as db:
+        for atoms, kvp in lego_rows(nrows):
+            tables = {f'tab{t}': {f'x{i}': float(rng.normal())
+                                  for i in range(4)}
+                      for t in range(ntables)}
+            db.write(atoms, key_value_pairs=kvp, external_tables=tables)
+    return filename
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=20_000)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--page', type=int, default=25,
+                   help='Rows per page for the paged selects.')
+    args = p.parse_args()
+
+    for ntables in [0, 1, 5]:
+        filename = make_db(f'bench-ext{ntables}-{args.rows}.db',
+                           args.rows, ntables)
+        db = connect(filename, readonly=True)
+        times = []
+        for _ in range(args.repeat):
+            with Timer() as t:
+                n = sum(1 for _ in db.select(include_data=False))
+            times.append(t.elapsed)
+        assert n == args.rows
+        best = min(times)
+        print(f'{ntables} external tables: '
+              f'{n / best:10.0f} rows/s (full select)')
+        times = []
+        for offset in range(0, min(args.rows, 100 * args.page), args.page):
+            with Timer() as t:
+                list(db.select(limit=args.page, offset=offset,
+                               include_data=False))
+            times.append(t.elapsed)
+        report(f'  pages of {args.page}', times)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Count and sorted-page latency of a federated database versus shards.
+
+The same number of rows is split over 1, 4 and 16 SQLite files that are
+queried as one with connect('bench-<rows>-<shards>/*.db')::
+
+    $ python benchmarks/bench_federated.py --rows 100000
+"""
+from pathlib import Path
+
+from common import Timer, make_lego_db, parser, report
+
+from ase.db import connect
+
+QUERIES = [('', '-mace_energy'),
+           ('space_group_number>100', 'mace_energy'),
+           ('topology=sql', 'natoms')]
+
+
+def make_shards(rows, nshards):
+    folder = Path(f'bench-{rows}-{nshards}')
+    folder.mkdir(exist_ok=True)
+    for i in range(nshards):
+        n = rows // nshards + (i < rows % nshards)
+        make_lego_db(folder / f'shard-{i:02}.db', n, seed=i)
+    return folder
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--shards', default='1,4,16',
+                   help='Numbers of shards (default: 1,4,16).')
+    p.add_argument('--repeat', type=int, default=10)
+    p.add_argument('--offset', type=int, default=1000,
+                   help='Offset of the deep page (default: 1000).')
+    args = p.parse_args()
+
+    for nshards in map(int, args.shards.split(',')):
+        folder = make_shards(args.rows, nshards)
+        db = connect(f'{folder}/*.db', readonly=True)
+        assert db.count() == args.rows
+        print(f'{nshards} shards:')
+        for query, sort in QUERIES:
+            times = []
+            for _ in range(args.repeat):
+                with Timer() as t:
+                    db.count(query)
+                times.append(t.elapsed)
+            report(f'  count {query or "(all)"}', times)
+            for offset in [0, args.offset]:
+                times = []
+                for _ in range(args.repeat):
+                    with Timer() as t:
+                        rows = list(db.select(query, sort=sort, limit=25,
+                                              offset=offset,
+                                              include_data=False))
+                    times.append(t.elapsed)
+                assert len(rows) == 25
+                report(f'  page {sort} +{offset}', times)
+
+
+if __name__ == '__main__':
+    main()
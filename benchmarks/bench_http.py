@@ -0,0 +1,127 @@
+"""Bytes transferred and server CPU per row page view of the web app.
+
+    $ python benchmarks/bench_http.py --rows 100000 --views 50
+
+A page view is what a browser fetches for /<project>/row/<id>: the page,
+the files it links to, the files JSmol loads itself (the j2s core files)
+and the cif file shown in JSmol.  A small browser cache is emulated on
+top of Flask's test client:
+
+cold:     empty cache
+reload:   the same page again; cached responses are revalidated with
+          If-None-Match unless marked immutable
+next row: another row with a warm cache
+
+Needs jsmol in ase/db/static/jsmol (a temporary link to ../jsmol is made
+if it is missing).  Works with versions of the app without HTTP caching
+too, so that numbers from before and after can be compared.
+"""
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import database_name, make_lego_db, parser
+
+import ase.db
+
+STATIC = Path(ase.db.__file__).parent / 'static'
+JSMOL = Path(__file__).parent.parent / 'jsmol'
+
+# Loaded by JSmol from j2sPath when showing a structure:
+J2S = ['jsmol/j2s/core/package.js',
+       'jsmol/j2s/core/corejmol.z.js',
+       'jsmol/j2s/core/coremenu.z.js']
+
+
+class Browser:
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}  # url -> etag, immutable
+        self.bytes = 0
+        self.requests = 0
+
+    def get(self, url):
+        headers = {'Accept-Encoding': 'br, gzip'}
+        if url in self.cache:
+            etag, immutable = self.cache[url]
+            if immutable:
+                return
+            if etag:
+                headers['If-None-Match'] = etag
+        resp = self.client.get(url, headers=headers)
+        assert resp.status_code in [200, 304], (url, resp.status_code)
+        self.requests += 1
+        self.bytes += len(resp.get_data()) + sum(
+            len(key) + len(value) + 4 for key, value in resp.headers)
+        cache_control = resp.headers.get('Cache-Control', '')
+        self.cache[url] = (resp.headers.get('ETag'),
+                           'immutable' in cache_control)
+        return resp
+
+    def view(self, project, id):
+        page = self.get(f'/{project}/row/{id}')
+        if page is not None and page.status_code == 200:
+            html = page.get_data(as_text=True)
+            self.links = re.findall(r'(?:src|href)="(/static/[^"]+)"', html)
+        for url in self.links:
+            self.get(url.replace('&amp;', '&'))
+        for name in J2S:
+            self.get(f'/static/{name}')
+        self.get(f'/atoms/{project}/{id}/cif')
+
+
+def measure(browser, project, ids):
+    before = (browser.bytes, browser.requests)
+    t0 = time.process_time()
+    for id in ids:
+        browser.view(project, id)
+    cpu = time.process_time() - t0
+    n = len(ids)
+    return ((browser.bytes - before[0]) / n / 1e3,
+            (browser.requests - before[1]) / n,
+            cpu / n * 1e3)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--views', type=int, default=50,
+                   help='Page views of each kind (default: 50).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+
+    link = STATIC / 'jsmol'
+    made_link = not link.exists()
+    if made_link:
+        link.symlink_to(JSMOL)
+    try:
+        from ase.db.app import create_app
+        app = create_app(filename)
+        client = app.test_client()
+        project = Path(filename).stem
+        ids = np.random.default_rng(0).integers(
+            1, args.rows + 1, 2 * args.views).tolist()
+        # Warm up (server side caches, compressed copies):
+        Browser(client).view(project, ids[0])
+
+        print(f'{"":10} {"kB/view":>10} {"requests":>9} {"CPU ms/view":>12}')
+        rows = {'cold': [], 'reload': [], 'next row': []}
+        for id in ids[:args.views]:
+            browser = Browser(client)
+            rows['cold'].append(measure(browser, project, [id]))
+            rows['reload'].append(measure(browser, project, [id]))
+        browser = Browser(client)
+        browser.view(project, ids[0])
+        rows['next row'].append(measure(browser, project,
+                                        ids[args.views:]))
+        for name, results in rows.items():
+            kb, requests, cpu = np.mean(results, axis=0)
+            print(f'{name:10} {kb:10.1f} {requests:9.1f} {cpu:12.2f}')
+    finally:
+        if made_link:
+            link.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Write throughput of the append-only .jsonl backend versus .json.
+
+    $ python benchmarks/bench_jsonl.py --sizes 10000,100000
+
+Rows are written one at a time with write() (how a workflow adds its
+results) and with write_many().  A .json file is rewritten for every row,
+so it is only timed up to --json-rows rows.  Also reported: get(id)
+latency from a fresh connection and the time to compact a file where
+every row was updated once.
+"""
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import Timer, lego_rows, parser, report
+
+from ase.db import connect
+
+
+def write_loop(filename, images):
+    db = connect(filename, use_lock_file=False)
+    for atoms, kvp in images:
+        db.write(atoms, key_value_pairs=kvp)
+
+
+def write_many(filename, images):
+    db = connect(filename, use_lock_file=False)
+    db.write_many(images)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--sizes', default='10000,100000',
+                   help='Numbers of rows (default: 10000,100000).')
+    p.add_argument('--json-rows', type=int, default=500,
+                   help='Largest .json file to time (default: 500).')
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in map(int, args.sizes.split(',')):
+            images = list(lego_rows(rows))
+            print(f'{rows} rows:')
+            for suffix, func in [('.json', write_loop),
+                                 ('.jsonl', write_loop),
+                                 ('.jsonl', write_many)]:
+                if suffix == '.json' and rows > args.json_rows:
+                    continue
+                filename = Path(tmp) / f'{rows}-{func.__name__}{suffix}'
+                with Timer() as t:
+                    func(filename, images)
+                print(f'  {suffix:7} {func.__name__:12} '
+                      f'{rows / t.elapsed:10.0f} rows/s')
+
+            db = connect(filename, use_lock_file=False)
+            assert db.count() == rows
+            ids = np.random.default_rng(0).integers(1, rows + 1, 1000)
+            times = []
+            for id in ids.tolist():
+                with Timer() as t:
+                    db.get(id)
+                times.append(t.elapsed)
+            report('  get(id)', times)
+
+            for id in range(1, rows + 1):
+                db.update(id, checked=True)
+            size = filename.stat().st_size
+            with Timer() as t:
+                db.vacuum()
+            print(f'  vacuum: {size / 1e6:.1f} MB -> '
+                  f'{filename.stat().st_size / 1e6:.1f} MB '
+                  f'in {t.elapsed:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Key names and statistics from the key catalogue versus scanning.
+
+    $ python benchmarks/bench_keys.py --rows 100000
+
+Times get_all_key_names() (done by the web app for every project at
+startup), "ase db --show-keys" and the first page sorted by a key, with
+the catalogue and with the queries that were used before it.  Also
+reports the one-off cost of adding the catalogue to an existing file and
+write_many() throughput with and without the triggers that maintain it.
+"""
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from common import Timer, database_name, lego_rows, make_lego_db, parser
+
+from ase.db import connect
+from ase.db.core import key_catalogue, key_stats
+
+
+def drop_catalogue(filename):
+    con = sqlite3.connect(filename)
+    con.execute('DROP TABLE IF EXISTS key_catalogue')
+    for type in ['number', 'text']:
+        for event in ['insert', 'delete']:
+            con.execute(f'DROP TRIGGER IF EXISTS {type}_key_{event}')
+    con.commit()
+    con.close()
+
+
+def best(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        with Timer() as t:
+            func()
+        times.append(t.elapsed)
+    return min(times)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--write-rows', type=int, default=10000,
+                   help='Rows for the write_many() test (default: 10000).')
+    args = p.parse_args()
+    source = make_lego_db(database_name(args), args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = Path(tmp) / 'keys.db'
+        shutil.copyfile(source, filename)
+        drop_catalogue(filename)
+
+        old = connect(filename, readonly=True)
+        con = sqlite3.connect(filename)
+        t1 = best(lambda: con.execute(
+            'SELECT DISTINCT key FROM keys').fetchall())
+        t2 = best(lambda: key_catalogue(key_stats(old.select())), 1)
+        t3 = best(lambda: list(old.select(sort='-mace_energy', limit=25,
+                                          include_data=False)))
+
+        with Timer() as t:
+            connect(filename).count()
+        print(f'Adding the catalogue to {args.rows} rows: '
+              f'{t.elapsed:.2f} s')
+
+        db = connect(filename, readonly=True)
+        assert db.get_key_catalogue() == key_catalogue(
+            key_stats(old.select()))
+        for name, before, func in [
+                ('get_all_key_names()', t1, db.get_all_key_names),
+                ('--show-keys', t2, db.get_key_catalogue),
+                ('sorted page', t3,
+                 lambda: list(db.select(sort='-mace_energy', limit=25,
+                                        include_data=False)))]:
+            after = best(func)
+            print(f'{name:20} {before * 1e3:10.2f} ms -> '
+                  f'{after * 1e3:8.2f} ms')
+
+        images = list(lego_rows(args.write_rows))
+        for triggers in [False, True]:
+            name = Path(tmp) / f'write-{triggers}.db'
+            db = connect(name)
+            db.count()  # creates the file
+            if not triggers:
+                # (db is initialized and will not add them again)
+                drop_catalogue(name)
+                db._has_key_catalogue = False
+            with Timer() as t:
+                db.write_many(images)
+            print(f'write_many() {"with" if triggers else "without"} '
+                  f'triggers: {args.write_rows / t.elapsed:8.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
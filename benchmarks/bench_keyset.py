@@ -0,0 +1,53 @@
+"""Benchmark of LIMIT/OFFSET versus keyset (seek) pagination.
+
+Times fetching page 1 and a deep page (default: page 4000 with 25 rows
+per page) with Database.select(offset=...) and with
+Database.select(after=...)::
+
+    $ python benchmarks/bench_keyset.py --rows 100000 --page 4000
+"""
+from common import Timer, database_name, make_lego_db, parser
+
+from ase.db import connect
+from ase.db.core import keyset_cursor
+
+SORTS = [None, '-natoms', 'mace_energy', 'pearson_symbol']
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--page', type=int, default=4000,
+                   help='Deep page to fetch (default: 4000).')
+    p.add_argument('--limit', type=int, default=25,
+                   help='Rows per page (default: 25).')
+    p.add_argument('--repeat', type=int, default=5)
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+    db = connect(filename, readonly=True)
+    limit = args.limit
+    page = min(args.page, args.rows // limit - 1)
+
+    print(f'{"sort":16} {"page":>6} {"offset [ms]":>12} {"keyset [ms]":>12}')
+    for sort in SORTS:
+        # Cursor of last row on the page before (not timed):
+        last, = db.select(sort=sort, limit=1,
+                          offset=(page - 1) * limit, include_data=False)
+        after = keyset_cursor(last, sort)
+        for n, cursor in [(1, None), (page + 1, after)]:
+            offset = (n - 1) * limit
+            times = []
+            for kwargs in [dict(offset=offset), dict(after=cursor)]:
+                best = float('inf')
+                for _ in range(args.repeat):
+                    with Timer() as t:
+                        rows = list(db.select(sort=sort, limit=limit,
+                                              include_data=False, **kwargs))
+                    best = min(best, t.elapsed)
+                assert len(rows) == limit
+                times.append(best)
+            print(f'{sort or "(id)":16} {n:6} '
+                  f'{times[0] * 1e3:12.3f} {times[1] * 1e3:12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Throughput of computing a derived key: update() loop versus map().
+
+    $ python benchmarks/bench_map.py --rows 20000
+
+The update() loop is run inside "with db:", which is how
+"ase db -k key=value" updates rows.  The descriptor (density and
+mean C-C bond length) needs the positions, so every row is read in full.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from common import Timer, make_lego_db, parser
+
+from ase.db import connect
+
+
+def descriptors(row):
+    atoms = row.toatoms()
+    d = atoms.get_all_distances(mic=True)
+    d[d == 0.0] = np.inf
+    return {'density': row.natoms / row.volume,
+            'bond_length': float(d.min(axis=1).mean())}
+
+
+def update_loop(filename):
+    db = connect(filename, use_lock_file=False)
+    with db:
+        for row in db.select():
+            db.update(row.id, **descriptors(row))
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=20_000)
+    default = ','.join(str(n) for n in sorted({1, os.cpu_count()}))
+    p.add_argument('--processes', default=default,
+                   help='Numbers of processes for map() '
+                   '(default: 1,<number of CPUs>).')
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = make_lego_db(Path(tmp) / 'lego.db', args.rows)
+        runs = [('update() loop', update_loop)]
+        for n in map(int, args.processes.split(',')):
+            runs.append((f'map(processes={n})',
+                         lambda f, n=n: connect(f, use_lock_file=False).map(
+                             descriptors, processes=n)))
+        for i, (name, func) in enumerate(runs):
+            filename = Path(tmp) / f'{i}.db'
+            shutil.copy(original, filename)
+            with Timer() as t:
+                func(filename)
+            assert connect(filename).count('density>0') == args.rows
+            print(f'{name:30} {args.rows / t.elapsed:10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark of filtering and sorting on materialized key columns.
+
+Runs the same queries against a plain copy of the synthetic LEGO-sp2
+database and against a copy where the table's keys have been promoted
+to indexed columns with SQLite3Database.materialize_keys()::
+
+    $ python benchmarks/bench_materialized.py --rows 100000
+"""
+import shutil
+
+from common import Timer, database_name, make_lego_db, parser, report
+
+from ase.db import connect
+
+KEYS = ['space_group_number', 'pearson_symbol', 'mace_energy',
+        'ff_energy', 'vasp_energy', 'topology']
+
+QUERIES = [
+    ('mace_energy<-9.5', None),
+    ('mace_energy<-9.5', 'mace_energy'),
+    ('space_group_number=227', None),
+    ('pearson_symbol=cF8,topology=dia', '-vasp_energy'),
+    ('', 'ff_energy'),
+    ('', '-pearson_symbol'),
+]
+
+
+def run(db, repeat):
+    for query, sort in QUERIES:
+        times = []
+        for _ in range(repeat):
+            with Timer() as t:
+                db.count(query)
+                list(db.select(query, sort=sort, limit=25,
+                               include_data=False))
+            times.append(t.elapsed)
+        report(f'{query or "all"} ({sort or "id"})', times)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--repeat', type=int, default=10)
+    args = p.parse_args()
+    plain = make_lego_db(database_name(args), args.rows)
+    materialized = plain.with_name(plain.stem + '-materialized.db')
+    shutil.copyfile(plain, materialized)
+    with Timer() as t:
+        connect(materialized).materialize_keys(KEYS)
+    print(f'materialize_keys(): {t.elapsed:.2f} s')
+
+    for name, filename in [('plain', plain),
+                           ('materialized', materialized)]:
+        print(f'\n{name}:')
+        run(connect(filename, readonly=True), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
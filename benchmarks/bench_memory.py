@@ -0,0 +1,53 @@
+"""Filter, sort and page latency of the in-memory backend versus SQLite.
+
+Runs typical web-table queries (count + one page of 25 rows) against
+connect(name) and connect(name, type='memory')::
+
+    $ python benchmarks/bench_memory.py --rows 100000
+"""
+from common import Timer, database_name, make_lego_db, parser, report
+
+from ase.db import connect
+
+QUERIES = [('', None),
+           ('', '-mace_energy'),
+           ('space_group_number>100', 'mace_energy'),
+           ('topology=sql,natoms<10', '-volume'),
+           ('pearson_symbol=hP4,mace_energy<-8.5', 'pearson_symbol'),
+           ('C>12', 'natoms')]
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--repeat', type=int, default=20)
+    p.add_argument('--offset', type=int, default=1000,
+                   help='Offset of the deep page (default: 1000).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+
+    db = connect(filename, readonly=True)
+    with Timer() as t:
+        mdb = connect(filename, type='memory', readonly=True)
+        n = len(mdb.snapshot)
+    print(f'Loaded {n} rows into memory in {t.elapsed:.2f} s')
+
+    for query, sort in QUERIES:
+        for offset in [0, args.offset]:
+            print(f'{query or "(all)"}  sort={sort}  offset={offset}')
+            for name, d in [('  sqlite', db), ('  memory', mdb)]:
+                times = []
+                for _ in range(args.repeat):
+                    with Timer() as t:
+                        d.count(query)
+                        rows = list(d.select(query, sort=sort, limit=25,
+                                             offset=offset,
+                                             include_data=False))
+                    times.append(t.elapsed)
+                report(name, times)
+            assert ([row.id for row in rows] ==
+                    [row.id for row in db.select(query, sort=sort, limit=25,
+                                                 offset=offset)])
+
+
+if __name__ == '__main__':
+    main()
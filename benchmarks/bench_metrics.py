@@ -0,0 +1,113 @@
+"""Cost of request and SQL query metrics (ase.db.metrics).
+
+    $ python benchmarks/bench_metrics.py --rows 100000
+
+First the SQL helper on its own: time per query for a trivial SELECT run
+with cur.execute() + fetchall() directly and through
+ase.db.sqlite.execute() with metrics off and on.  Then whole operations
+(db.count(), db.get(), db.select(limit=25) and an uncached /api/ request)
+with metrics off, on, and on with every query written to the slow query
+log together with its EXPLAIN QUERY PLAN.  Best of --repeat rounds.
+"""
+import io
+import itertools
+import time
+
+import numpy as np
+
+from common import database_name, make_lego_db, parser
+
+from ase.db import connect, metrics
+from ase.db.sqlite import execute
+
+
+def best(func, n, repeat):
+    """Smallest mean time per call of func() over repeat rounds."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(n):
+            func(i)
+        times.append((time.perf_counter() - t0) / n)
+    return min(times)
+
+
+def modes():
+    yield 'off', metrics.disable
+    yield 'on', metrics.enable
+    yield 'on + slow log', lambda: metrics.enable(0.0, io.StringIO())
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--repeat', type=int, default=5,
+                   help='Number of rounds (default: 5).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+    nrows = args.rows
+    n = 2000
+
+    db = connect(filename)
+    with db.managed_connection() as con:
+        cur = con.cursor()
+        sql = 'SELECT id FROM systems WHERE id=?'
+
+        def direct(i):
+            cur.execute(sql, (i + 1,))
+            cur.fetchall()
+
+        def wrapped(i):
+            for _ in execute(cur, sql, (i + 1,)):
+                pass
+
+        print(f'{"one SELECT":24} {"us/query":>10}')
+        t = best(direct, n * 10, args.repeat)
+        print(f'{"cur.execute()":24} {t * 1e6:10.2f}')
+        for mode, enable in modes():
+            if mode == 'on + slow log':
+                continue
+            enable()
+            t = best(wrapped, n * 10, args.repeat)
+            print(f'{"execute(), " + mode:24} {t * 1e6:10.2f}')
+        metrics.disable()
+
+    from ase.db.app import DBApp
+    clients = {}
+    for mode, enable in modes():
+        # The app is instrumented if metrics are on when it is made:
+        enable()
+        dbapp = DBApp()
+        dbapp.add_project('bench', db)
+        clients[mode] = dbapp.flask.test_client()
+    metrics.disable()
+
+    queries = itertools.count()
+
+    def api(i):
+        # New query each time, so that the query cache does not answer:
+        resp = clients[mode].get(
+            f'/api/bench/rows?query=id>{next(queries) % nrows}&limit=25')
+        assert resp.status_code == 200
+
+    operations = [
+        ('db.count(id=i)', lambda i: db.count(f'id={i % nrows + 1}'), n),
+        ('db.get(i)', lambda i: db.get(i % nrows + 1), n),
+        ('db.select(limit=25)',
+         lambda i: list(db.select(f'id>{i % nrows}', limit=25)), n // 4),
+        ('/api/ (uncached)', api, n // 200)]
+
+    print()
+    print(f'{"":24}' + ''.join(f'{mode:>16}' for mode, _ in modes()) +
+          '   (us/call)')
+    for name, func, m in operations:
+        results = []
+        for mode, enable in modes():
+            enable()
+            results.append(best(func, m, args.repeat))
+        metrics.disable()
+        results = np.array(results)
+        print(f'{name:24}' + ''.join(f'{t * 1e6:16.1f}' for t in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Micro-benchmark for web session lookup and eviction.
+
+Compares the old class-level dict (sort all ids once more than 2000
+sessions exist) with MemorySessionStore and SQLiteSessionStore::
+
+    $ python benchmarks/bench_sessions.py --sessions 100000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from common import report
+
+from ase.db.web import MemorySessionStore, Session, SQLiteSessionStore
+
+
+class LegacySessionStore:
+    """The original Session.sessions dict with sort-based eviction."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.next_id = 1
+
+    def add(self, session):
+        id = self.next_id
+        self.next_id += 1
+        self.sessions[id] = session
+        if len(self.sessions) > 2000:
+            for old in sorted(self.sessions)[:400]:
+                del self.sessions[old]
+        return id
+
+    def get(self, id):
+        return self.sessions[id]
+
+    def put(self, session):
+        pass
+
+
+def bench(name, store, nsessions, nlookups, seed=0):
+    Session.store = store
+    times = []
+    ids = []
+    for _ in range(nsessions):
+        t0 = time.perf_counter()
+        ids.append(Session('bench').id)
+        times.append(time.perf_counter() - t0)
+    report(f'{name}: new session', times)
+
+    # Look up (and save) recent sessions like the /update/ route does:
+    rng = np.random.default_rng(seed)
+    recent = ids[-500:]
+    times = []
+    for i in rng.integers(0, len(recent), nlookups):
+        t0 = time.perf_counter()
+        session = Session.get(recent[i])
+        session.save()
+        times.append(time.perf_counter() - t0)
+    report(f'{name}: get + save', times)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--sessions', type=int, default=100_000,
+                   help='Number of sessions to create (default: 100000).')
+    p.add_argument('--lookups', type=int, default=10_000,
+                   help='Number of lookups (default: 10000).')
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, store in [
+                ('legacy dict', LegacySessionStore()),
+                ('memory LRU', MemorySessionStore()),
+                ('sqlite file', SQLiteSessionStore(
+                    Path(tmp) / 'sessions.sqlite'))]:
+            bench(name, store, args.sessions, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Structure-similarity search with similar_to=<id> (ase.db.similarity).
+
+    $ python benchmarks/bench_similarity.py --rows 100000
+
+Works on a copy of the database, since the fingerprints are stored in it.
+Times building the index (computing and storing all fingerprints) and
+loading it again from the fingerprints table in a fresh connection.
+Then the latency of db.select(similar_to=<id>, limit=25) on its own, with
+a key-value filter and for the next page (keyset cursor), and of an
+uncached /api/ request.  The baseline is what a search without an index
+has to do: read every row, make the Atoms object and its fingerprint;
+it is timed on --sample rows and scaled up to the whole table.
+"""
+import shutil
+import time
+
+import numpy as np
+
+from common import Timer, database_name, make_lego_db, parser, report
+
+from ase.db import connect
+from ase.db.core import keyset_cursor
+from ase.db.similarity import fingerprint, parameters
+
+
+def latencies(func, n, rng, nrows):
+    times = []
+    for _ in range(n):
+        id = int(rng.integers(1, nrows + 1))
+        t0 = time.perf_counter()
+        func(id)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--queries', type=int, default=200,
+                   help='Number of queries per test (default: 200).')
+    p.add_argument('--sample', type=int, default=2000,
+                   help='Rows for the brute-force baseline (default: 2000).')
+    args = p.parse_args()
+    filename = make_lego_db(database_name(args), args.rows)
+    nrows = args.rows
+    copy = filename.with_name(filename.stem + '-similarity.db')
+    shutil.copyfile(filename, copy)
+    rng = np.random.default_rng(1)
+
+    try:
+        db = connect(copy)
+        with Timer() as t:
+            index = db.similarity_index()
+        print(f'{"compute + store index":32} {t.elapsed:10.1f} s   '
+              f'({len(index)} rows, '
+              f'{index.vectors.nbytes / 2**20:.1f} MB)')
+        db = connect(copy, readonly=True)
+        with Timer() as t:
+            db.similarity_index()
+        print(f'{"load index":32} {t.elapsed:10.3f} s')
+
+        def select(id):
+            rows = list(db.select(similar_to=id, limit=25))
+            assert rows[0].similarity > 0.999
+
+        def filtered(id):
+            list(db.select(f'similar_to={id},topology=dia', limit=25))
+
+        def next_page(id):
+            rows = list(db.select(similar_to=id, limit=25))
+            after = keyset_cursor(rows[-1], '-similarity')
+            list(db.select(similar_to=id, limit=25, after=after))
+
+        report('select(similar_to, limit=25)',
+               latencies(select, args.queries, rng, nrows))
+        report('+ topology=dia',
+               latencies(filtered, args.queries, rng, nrows))
+        report('two pages (keyset)',
+               latencies(next_page, args.queries, rng, nrows))
+
+        from ase.db.app import DBApp
+        dbapp = DBApp()
+        dbapp.add_project('bench', db)
+        client = dbapp.flask.test_client()
+
+        def api(id):
+            resp = client.get(
+                f'/api/bench/rows?query=similar_to={id}&limit=25')
+            assert resp.status_code == 200
+
+        report('/api/ similar_to (uncached)',
+               latencies(api, args.queries // 4, rng, nrows))
+
+        sample = min(args.sample, nrows)
+        with Timer() as t:
+            vector = index.vectors[0]
+            scores = [fingerprint(row.toatoms(), **parameters) @ vector
+                      for row in db.select(f'id<={sample}')]
+        assert len(scores) == sample
+        print(f'{"brute force, per query":32} '
+              f'{t.elapsed * nrows / sample:10.1f} s   '
+              f'(scaled from {sample} rows)')
+    finally:
+        copy.unlink()
+
+
+if __name__ == '__main__':
+    main()
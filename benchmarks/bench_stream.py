@@ -0,0 +1,51 @@
+"""Peak memory and time to first row for a full select() scan.
+
+Each mode runs in its own process so that the peak RSS is its own::
+
+    $ python benchmarks/bench_stream.py --rows 1000000
+
+Modes: fetchall (batch_size=None, the default) and streaming with
+batch sizes of 100 and 1000.
+"""
+import subprocess
+import sys
+
+from common import Timer, database_name, make_lego_db, parser, rss_mb
+
+from ase.db import connect
+
+
+def scan(filename, batch_size):
+    db = connect(filename, readonly=True)
+    rss0 = rss_mb()
+    with Timer() as total:
+        rows = db.select(batch_size=batch_size)
+        with Timer() as first:
+            next(rows)
+        n = 1 + sum(1 for _ in rows)
+    name = f'batch_size={batch_size}'
+    print(f'{name:16} {n:9} rows   first row {first.elapsed * 1e3:9.1f} ms   '
+          f'total {total.elapsed:7.2f} s   '
+          f'{n / total.elapsed:9.0f} rows/s   '
+          f'peak RSS +{rss_mb() - rss0:7.1f} MB')
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=1_000_000)
+    p.add_argument('--batch-size', type=int,
+                   help='Run one scan with this batch size (0: fetchall).')
+    args = p.parse_args()
+    filename = database_name(args)
+    if args.batch_size is not None:
+        scan(filename, args.batch_size or None)
+        return
+
+    make_lego_db(filename, args.rows)
+    for batch_size in [0, 100, 1000]:
+        subprocess.run([sys.executable, __file__, '--rows', str(args.rows),
+                        '--database', str(filename),
+                        '--batch-size', str(batch_size)], check=True)
+
+
+if __name__ == '__main__':
+    main()
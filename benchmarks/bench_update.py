@@ -0,0 +1,59 @@
+"""Adding and deleting keys for a selection: update() loop versus
+update_many().
+
+    $ python benchmarks/bench_update.py --rows 100000
+
+The update() loop is run inside "with db:", which is how
+"ase db -k key=value --delete-keys key" used to update rows.
+"""
+import shutil
+import tempfile
+from pathlib import Path
+
+from common import Timer, database_name, make_lego_db, parser
+
+from ase.db import connect
+
+QUERIES = ['topology=sql', '']
+CHANGE = dict(delete_keys=['remark'], reviewed=True, batch='2026-10')
+
+
+def update_loop(db, query):
+    ids = [row.id for row in db.select(query, include_data=False)]
+    with db:
+        for id in ids:
+            db.update(id, **CHANGE)
+
+
+def update_many(db, query):
+    db.update_many(query, **CHANGE)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--skip-loop', action='store_true',
+                   help='Only time update_many().')
+    args = p.parse_args()
+    original = make_lego_db(database_name(args), args.rows)
+
+    runs = [('update_many()', update_many)]
+    if not args.skip_loop:
+        runs.insert(0, ('update() loop', update_loop))
+    with tempfile.TemporaryDirectory() as tmp:
+        for query in QUERIES:
+            nrows = connect(original).count(query)
+            print(f'{query or "(all)"}: {nrows} rows')
+            for name, func in runs:
+                filename = Path(tmp) / 'copy.db'
+                shutil.copy(original, filename)
+                db = connect(filename, use_lock_file=False)
+                with Timer() as t:
+                    func(db, query)
+                assert db.count('reviewed,remark') == 0
+                assert db.count('batch=2026-10') == nrows
+                print(f'  {name:28} {t.elapsed:8.2f} s '
+                      f'{nrows / t.elapsed:10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Load benchmark for the database web app.
+
+Measures requests/s and latency percentiles for the search, update and
+row routes, once for the development setup (one sqlite3.connect() per
+request) and once for the production setup from
+ase.db.app.create_app() (read-only, immutable, pooled connections).
+
+By default requests go through Flask's test client from a pool of
+threads, which measures the server side only.  Use --url to load a
+running server over HTTP instead::
+
+    $ python benchmarks/bench_web.py --rows 100000 --threads 8
+    $ python benchmarks/bench_web.py --url http://localhost:5000 \\
+          --project lego-sp2
+"""
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from common import database_name, make_lego_db, parser, report
+
+from ase.db import connect
+from ase.db.app import DBApp, create_app
+
+QUERIES = ['', 'mace_energy<-8.5', 'pearson_symbol=hP4',
+           'space_group_number=191', 'natoms<10,vasp_energy<-9']
+
+
+def dev_app(filename):
+    app = DBApp()
+    app.add_project(filename.stem, connect(filename, use_lock_file=False))
+    return app.flask
+
+
+class TestClientGetter:
+    def __init__(self, wsgiapp):
+        self.wsgiapp = wsgiapp
+
+    def __call__(self, url):
+        client = self.wsgiapp.test_client()
+        resp = client.get(url)
+        assert resp.status_code == 200, (url, resp.status_code)
+        return resp.get_data()
+
+
+class HTTPGetter:
+    def __init__(self, base):
+        self.base = base.rstrip('/')
+
+    def __call__(self, url):
+        with urllib.request.urlopen(self.base + url) as resp:
+            return resp.read()
+
+
+def timed(get, url):
+    t0 = time.perf_counter()
+    data = get(url)
+    return time.perf_counter() - t0, data
+
+
+def run(get, project, nrows, requests, threads, seed=0):
+    rng = np.random.default_rng(seed)
+    with ThreadPoolExecutor(threads) as pool:
+        def load(name, urls):
+            t0 = time.perf_counter()
+            results = list(pool.map(lambda url: timed(get, url), urls))
+            wall = time.perf_counter() - t0
+            report(f'{name} ({threads} threads)',
+                   [t for t, _ in results], wall)
+            return [data for _, data in results]
+
+        # Every search page creates a new session.  Use each of those
+        # sessions for one update request like a real browser would:
+        pages = load('search', [f'/{project}/'] * requests)
+        sids = [int(re.search(rb'update_table\((\d+)', page).group(1))
+                for page in pages]
+        load('update', [f'/update/{sid}/query/0/?query={QUERIES[i % 5]}'
+                        for i, sid in enumerate(sids)])
+        load('row', [f'/{project}/row/{rng.integers(1, nrows + 1)}'
+                     for _ in range(requests)])
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument('--requests', type=int, default=500,
+                   help='Requests per route (default: 500).')
+    p.add_argument('--threads', type=int, default=8,
+                   help='Concurrent clients (default: 8).')
+    p.add_argument('--url', help='Benchmark a running server.')
+    p.add_argument('--project', default='default',
+                   help='Project name when using --url.')
+    args = p.parse_args()
+
+    if args.url:
+        run(HTTPGetter(args.url), args.project, args.rows,
+            args.requests, args.threads)
+        return
+
+    filename = make_lego_db(database_name(args), args.rows)
+    for label, wsgiapp in [('development', dev_app(filename)),
+                           ('production', create_app(filename))]:
+        print(f'\n{label}:')
+        run(TestClientGetter(wsgiapp), filename.stem, args.rows,
+            args.requests, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Write throughput: write() one row at a time versus write_many().
+
+    $ python benchmarks/bench_write.py --rows 20000
+
+The write() loop is run inside "with db:" (one transaction per 5000
+rows), which is how "ase db --insert-into" used to write rows.
+"""
+import tempfile
+from pathlib import Path
+
+from common import Timer, lego_rows, parser
+
+from ase.db import connect
+
+
+def write_loop(filename, images):
+    with connect(filename, use_lock_file=False) as db:
+        for atoms, kvp in images:
+            db.write(atoms, key_value_pairs=kvp)
+
+
+def write_many(filename, images, chunk_size):
+    db = connect(filename, use_lock_file=False)
+    db.write_many(images, chunk_size=chunk_size)
+
+
+def main():
+    p = parser(__doc__.splitlines()[0], nrows=20_000)
+    args = p.parse_args()
+    images = list(lego_rows(args.rows))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (name, func) in enumerate([
+                ('write() loop', write_loop),
+                ('write_many(chunk_size=100)',
+                 lambda f, i: write_many(f, i, 100)),
+                ('write_many(chunk_size=1000)',
+                 lambda f, i: write_many(f, i, 1000))]):
+            filename = Path(tmp) / f'{n}.db'
+            with Timer() as t:
+                func(filename, images)
+            assert connect(filename).count() == args.rows
+            print(f'{name:30} {args.rows / t.elapsed:10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
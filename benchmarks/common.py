@@ -0,0 +1,114 @@
+"""Shared helpers for the database benchmarks.
+
+The benchmarks run against a synthetic catalogue that looks like
+LEGO-sp2: small periodic carbon structures with the same key-value
+pairs as the production table (space group, Pearson symbol, three
+energies, a topology label and a remark).
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ase import Atoms
+from ase.db import connect
+
+PEARSON = ['cF8', 'hP4', 'hP8', 'oC8', 'oC16', 'tI8', 'mC16', 'cI16']
+TOPOLOGY = ['sql', 'hcb', 'dia', 'cds', 'ths', 'srs', 'lon', 'bto']
+
+
+def lego_atoms(rng):
+    """Random periodic carbon structure."""
+    n = int(rng.integers(2, 25))
+    cell = np.diag(rng.uniform(3.0, 9.0, 3))
+    positions = rng.uniform(0, 1, (n, 3)) @ cell
+    return Atoms(f'C{n}', positions=positions, cell=cell, pbc=True)
+
+
+def lego_key_value_pairs(rng):
+    energy = rng.normal(-8.5, 0.6)
+    return dict(space_group_number=int(rng.integers(1, 231)),
+                pearson_symbol=str(rng.choice(PEARSON)),
+                mace_energy=float(energy + rng.normal(0, 0.05)),
+                ff_energy=float(energy + rng.normal(0, 0.2)),
+                vasp_energy=float(energy),
+                topology=str(rng.choice(TOPOLOGY)),
+                remark=str(rng.choice(['new', 'known', 'hypothetical'])))
+
+
+def lego_rows(nrows, seed=42):
+    """Yield (atoms, key_value_pairs) tuples."""
+    rng = np.random.default_rng(seed)
+    for _ in range(nrows):
+        yield lego_atoms(rng), lego_key_value_pairs(rng)
+
+
+def make_lego_db(filename, nrows, seed=42):
+    """Create (or reuse) a synthetic LEGO-sp2 database with nrows rows."""
+    filename = Path(filename)
+    if filename.is_file():
+        with connect(filename) as db:
+            if db.count() == nrows:
+                return filename
+        filename.unlink()
+    t0 = time.perf_counter()
+    with connect(filename, use_lock_file=False) as db:
+        for atoms, kvp in lego_rows(nrows, seed):
+            db.write(atoms, key_value_pairs=kvp)
+    print(f'Created {filename} with {nrows} rows '
+          f'in {time.perf_counter() - t0:.1f} s')
+    return filename
+
+
+def parser(description, nrows=100_000):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument('--rows', type=int, default=nrows,
+                   help=f'Number of rows in the test database '
+                   f'(default: {nrows}).')
+    p.add_argument('--database', metavar='FILE',
+                   help='Database file to create or reuse '
+                   '(default: bench-<rows>.db in the current directory).')
+    return p
+
+
+def database_name(args, suffix='.db'):
+    return Path(args.database or f'bench-{args.rows}{suffix}')
+
+
+def percentile(times, p):
+    return float(np.percentile(np.asarray(times), p))
+
+
+def report(name, times, wall=None):
+    """Print throughput and latency summary for a list of timings.
+
+    Throughput is len(times) / wall, where wall defaults to the sum of
+    the timings (serial execution).
+    """
+    times = np.asarray(times)
+    if wall is None:
+        wall = times.sum()
+    print(f'{name:32} {len(times) / wall:10.1f} /s   '
+          f'p50 {percentile(times, 50) * 1e3:8.3f} ms   '
+          f'p99 {percentile(times, 99) * 1e3:8.3f} ms   '
+          f'max {times.max() * 1e3:8.3f} ms')
+
+
+class Timer:
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.t0
+
+
+def rss_mb():
+    """Peak resident set size of this process in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname().sysname == 'Darwin':
+        return peak / 2**20
+    return peak / 2**10
@@ -15,6 +15,15 @@ if [ ! -L "$TARGET_LINK" ]; then
     ln -s "$PWD/jsmol" "$TARGET_LINK"
 fi
 
-# 3. Start the ASE web server
+# 3. Make compressed copies of the static files (only changed files are
+#    compressed again)
+python -m ase.db.httpcache
+
+# 4. Compute fingerprints for similarity search (only new rows are done;
+#    the server opens the database read-only)
+ase db lego-sp2.db --index-fingerprints
+
+# 5. Start the ASE web server (read-only, pooled connections, gunicorn)
 echo "Starting ASE web server..."
-ase db lego-sp2.db -w
+ase db lego-sp2.db -w --serve --port "${PORT:-5000}" \
+    --workers "${WEB_WORKERS:-1}" --threads "${WEB_THREADS:-8}"